@@ -0,0 +1,78 @@
+"""
+Chunking throughput on multi-MB texts: the original word-list chunker vs TextChunker
+
+Usage:
+    python -m benchmarks.bench_chunking --mb 4 8
+"""
+import argparse
+import random
+import time
+
+from utils.chunking import TextChunker
+
+SENTENCES = [
+    "We talked for hours about what we both need from this relationship.",
+    "Sometimes I feel unheard when plans change at the last minute!",
+    "Do you think setting a weekly check-in would help us?",
+    "My partner's love language is acts of service, mine is quality time.",
+    "It took a while, but we learned to pause before reacting.",
+]
+
+
+def make_text(n_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    while size < n_bytes:
+        paragraph = " ".join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 8)))
+        parts.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def legacy_chunk_text(text: str, chunk_size: int = 1000):
+    """The original KnowledgeBaseManager._chunk_text"""
+    words = text.split()
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    for word in words:
+        current_size += len(word) + 1  # +1 for space
+        if current_size > chunk_size:
+            chunks.append(" ".join(current_chunk))
+            current_chunk = [word]
+            current_size = len(word)
+        else:
+            current_chunk.append(word)
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+
+def measure(fn, text):
+    start = time.perf_counter()
+    chunks = fn(text)
+    return time.perf_counter() - start, len(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--mb", type=float, nargs="+", default=[4, 8])
+    args = parser.parse_args()
+
+    candidates = [
+        ("legacy (words)", legacy_chunk_text),
+        ("chars", TextChunker(1000).chunk),
+        ("chars + overlap", TextChunker(1000, overlap=150).chunk),
+        ("tokens + overlap", TextChunker(250, overlap=40, unit="tokens").chunk),
+    ]
+    print(f"{'size':>6} {'chunker':<18} {'seconds':>8} {'MB/s':>8} {'chunks':>8}")
+    for mb in args.mb:
+        text = make_text(int(mb * 1024 * 1024))
+        for name, fn in candidates:
+            elapsed, n_chunks = measure(fn, text)
+            print(f"{mb:>5}M {name:<18} {elapsed:>8.3f} {mb / elapsed:>8.1f} {n_chunks:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Microbenchmark for ContentFilter: per-term substring scan vs the compiled matcher
+
+Usage:
+    python -m benchmarks.bench_content_filter
+"""
+import random
+import string
+import time
+
+from utils.content_filter import ContentFilter
+
+MESSAGES = [
+    "My partner and I keep arguing about chores, how do we talk about it calmly?",
+    "I feel like we don't spend enough quality time together anymore.",
+    "She said something explicitly hurtful during our last fight and I can't let it go.",
+    "How do I tell him I need more words of affirmation without sounding needy?",
+] * 25
+
+
+def make_terms(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    terms = set()
+    while len(terms) < n:
+        terms.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))))
+    return terms
+
+
+def substring_scan(blocked_words, content):
+    """The original is_safe loop"""
+    content_lower = content.lower()
+    for word in blocked_words:
+        if word in content_lower:
+            return False
+    return True
+
+
+def time_per_message(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in MESSAGES:
+            fn(message)
+        best = min(best, time.perf_counter() - start)
+    return best / len(MESSAGES)
+
+
+def main():
+    print(f"{'terms':>8} {'build':>10} {'scan/msg':>12} {'matcher/msg':>12} {'speedup':>8}")
+    for n in (10, 1_000, 50_000):
+        terms = make_terms(n)
+        start = time.perf_counter()
+        content_filter = ContentFilter()
+        content_filter.add_terms(terms)
+        build = time.perf_counter() - start
+        blocked = content_filter.blocked_words
+        scan = time_per_message(lambda message: substring_scan(blocked, message))
+        matcher = time_per_message(content_filter.is_safe)
+        print(f"{n:>8} {build * 1000:>8.1f}ms {scan * 1e6:>10.1f}us {matcher * 1e6:>10.1f}us {scan / matcher:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+End-to-end latency, throughput and memory of the app's hot paths at several knowledge-base sizes
+
+The knowledge base grows in place through each size in --sizes. At every
+size the benchmark times ingestion of the new chunks, KB search, a full
+chat turn (retrieval, background web enrichment, streamed reply) and a
+story continuation. Groq and DuckDuckGo are replaced by tests.fakes, and
+embeddings come from a hashing embedder unless --embedding local is given,
+so no network access is needed. Results are written as JSON; pass a
+previous run as --baseline to flag p95 regressions (exit code 1).
+
+Usage:
+    python -m benchmarks.bench_e2e --sizes 1000,100000 --out results.json
+    python -m benchmarks.bench_e2e --sizes 1000 --baseline results.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from streamlit import config as streamlit_config
+
+from tests.fakes import FakeDDGS, FakeGroq, HashEmbeddingFunction
+from utils.chat import ChatManager
+from utils.knowledge_base import KnowledgeBaseManager
+from utils.llm_client import TokenBucket
+from utils.story import StoryManager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SYLLABLES = "ka lo mi ren sa tor vel zu quin dar yo gre nix pa bel".split()
+THEMES = [
+    "trust", "communication", "conflict", "apology", "boundaries", "jealousy",
+    "long distance", "money", "family", "intimacy", "gratitude", "listening",
+]
+QUESTIONS = [
+    "How do I rebuild {theme} after an argument about {word}?",
+    "My partner never talks about {theme}, what should I do?",
+    "Is it normal to struggle with {theme} in the first year?",
+    "What does the {word} approach say about {theme}?",
+]
+STORY = (
+    "We met at a friend's wedding and moved in together after a year. Lately we argue "
+    "about small things, like whose turn it is to cook, and I don't know how to bring "
+    "up that I feel taken for granted."
+)
+PERSONALITY = {"love_language": "Quality Time", "conflict_style": "Avoidant", "social_style": "Introvert"}
+
+
+def make_vocabulary(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def make_chunks(start: int, count: int, vocabulary, seed: int = 0):
+    """Synthetic single-chunk notes; word frequencies follow a Zipf-like curve like real text"""
+    rng = random.Random(seed + start)
+    weights = [1.0 / rank for rank in range(1, len(vocabulary) + 1)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    for i in range(start, start + count):
+        theme = THEMES[i % len(THEMES)]
+        words = " ".join(rng.choices(vocabulary, cum_weights=cumulative, k=30))
+        yield f"Note {i} on {theme}: {words}."
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(latencies, seconds: float, units: int = None) -> dict:
+    """Stats for one phase; latencies in seconds, units = items processed (defaults to ops)"""
+    ops = len(latencies)
+    units = ops if units is None else units
+    return {
+        "ops": ops,
+        "seconds": round(seconds, 4),
+        "throughput": round(units / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else 0.0,
+        "rss_mb": round(rss_mb(), 1),
+    }
+
+
+def bench_ingest(kb, start: int, count: int, vocabulary, batch: int) -> dict:
+    latencies = []
+    begin = time.perf_counter()
+    texts = []
+    for text in make_chunks(start, count, vocabulary):
+        texts.append(text)
+        if len(texts) == batch:
+            t0 = time.perf_counter()
+            kb.ingest_documents(texts=texts)
+            latencies.append(time.perf_counter() - t0)
+            texts = []
+    if texts:
+        t0 = time.perf_counter()
+        kb.ingest_documents(texts=texts)
+        latencies.append(time.perf_counter() - t0)
+    stats = summarize(latencies, time.perf_counter() - begin, units=count)
+    stats["unit"] = "chunks/s"
+    return stats
+
+
+def make_queries(n: int, vocabulary, seed: int):
+    rng = random.Random(seed)
+    return [rng.choice(QUESTIONS).format(theme=rng.choice(THEMES), word=rng.choice(vocabulary[:500]))
+            for _ in range(n)]
+
+
+def bench_search(kb, queries) -> dict:
+    latencies = []
+    begin = time.perf_counter()
+    for query in queries:
+        # Every query goes to the index, not the result cache
+        kb.result_cache.clear()
+        t0 = time.perf_counter()
+        kb.search_similar(query)
+        latencies.append(time.perf_counter() - t0)
+    stats = summarize(latencies, time.perf_counter() - begin)
+    stats["unit"] = "queries/s"
+    return stats
+
+
+def bench_chat(kb, chat_manager, queries) -> dict:
+    latencies = []
+    first_tokens = []
+    history = []
+    decisions = []
+    begin = time.perf_counter()
+    for query in queries:
+        t0 = time.perf_counter()
+        context = kb.get_relevant_documents([query], report=decisions)
+        first = None
+        response = ""
+        for token in chat_manager.stream_response(query, history, context, use_cache=False):
+            if first is None:
+                first = time.perf_counter() - t0
+            response += token
+        latencies.append(time.perf_counter() - t0)
+        first_tokens.append(first or latencies[-1])
+        history = (history + [{"role": "user", "content": query},
+                              {"role": "assistant", "content": response}])[-10:]
+    seconds = time.perf_counter() - begin
+    enrichment_start = time.perf_counter()
+    kb.flush_enrichment(timeout=300)
+    stats = summarize(latencies, seconds)
+    stats["unit"] = "turns/s"
+    stats["ttft_p50_ms"] = round(percentile(first_tokens, 50) * 1000, 3)
+    stats["ttft_p95_ms"] = round(percentile(first_tokens, 95) * 1000, 3)
+    stats["enrichment_drain_seconds"] = round(time.perf_counter() - enrichment_start, 4)
+    # Share of turns whose local results were too weak, sending them to the web
+    stats["web_search_rate"] = round(sum(d["web_search"] for d in decisions) / len(decisions), 3) if decisions else 0.0
+    return stats
+
+
+def bench_story(kb, story_manager, n: int) -> dict:
+    latencies = []
+    history = []
+    begin = time.perf_counter()
+    for i in range(n):
+        # Every continuation searches for the same terms; measure the search, not the cache
+        kb.result_cache.clear()
+        t0 = time.perf_counter()
+        continuation = story_manager.continue_user_story(f"{STORY} (take {i})", history, PERSONALITY,
+                                                         kb, use_cache=False)
+        latencies.append(time.perf_counter() - t0)
+        history = (history + [{"role": "assistant", "content": continuation}])[-6:]
+    stats = summarize(latencies, time.perf_counter() - begin)
+    stats["unit"] = "continuations/s"
+    return stats
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """(size, phase, baseline p95, current p95) for phases whose p95 grew by more than tolerance"""
+    previous = {(run["kb_size"], phase): stats
+                for run in baseline.get("results", []) for phase, stats in run["phases"].items()}
+    regressions = []
+    for run in results["results"]:
+        for phase, stats in run["phases"].items():
+            old = previous.get((run["kb_size"], phase))
+            if old and old["p95_ms"] and stats["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+                regressions.append((run["kb_size"], phase, old["p95_ms"], stats["p95_ms"]))
+    return regressions
+
+
+def quiet_streamlit():
+    """ChatManager reads st.session_state, which warns on every call outside `streamlit run`"""
+    # Streamlit resets its loggers' levels when it parses its config, so parse it first
+    streamlit_config.get_config_options()
+    for name in ("streamlit.runtime.scriptrunner_utils.script_run_context",
+                 "streamlit.runtime.state.session_state_proxy"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+
+def log(message: str):
+    print(message, file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000",
+                        help="Comma-separated KB sizes in chunks, grown in order")
+    parser.add_argument("--queries", type=int, default=200, help="Searches per size")
+    parser.add_argument("--turns", type=int, default=50, help="Chat turns per size")
+    parser.add_argument("--stories", type=int, default=20, help="Story continuations per size")
+    parser.add_argument("--ingest-batch", type=int, default=1000, help="Chunks per ingest_documents call")
+    parser.add_argument("--batch-size", type=int, default=256, help="KnowledgeBaseManager batch_size")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--embedding", choices=["hash", "local"], default="hash",
+                        help="hash = offline hashing embedder; local = the app's MiniLM model")
+    parser.add_argument("--backend", choices=["chroma", "quantized"], default="chroma",
+                        help="KnowledgeBaseManager vector_backend")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fake model time to first token (s)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Fake model delay between tokens (s)")
+    parser.add_argument("--web-latency", type=float, default=0.0, help="Fake web search latency (s)")
+    parser.add_argument("--web-rps", type=float, default=1000.0,
+                        help="Web search rate limit; the app's default of 1/s would dominate enrichment")
+    parser.add_argument("--workdir", help="Keep the knowledge base here instead of a temporary directory")
+    parser.add_argument("--out", help="Write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    quiet_streamlit()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    vocabulary = make_vocabulary(args.vocabulary)
+    results = {
+        "config": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": [],
+    }
+
+    chat_manager = ChatManager()
+    chat_manager.set_client(FakeGroq(first_token_delay=args.llm_latency, token_delay=args.token_delay))
+    story_manager = StoryManager()
+    story_manager.set_client(FakeGroq(first_token_delay=args.llm_latency, token_delay=args.token_delay))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = args.workdir or tmpdir
+        kb = KnowledgeBaseManager(
+            persist_directory=workdir,
+            batch_size=args.batch_size,
+            embedding_function=HashEmbeddingFunction() if args.embedding == "hash" else None,
+            warmup_embeddings=args.embedding == "local",
+            ddgs_factory=lambda: FakeDDGS(latency=args.web_latency),
+            web_search_limiter=TokenBucket(args.web_rps, burst=max(1, int(args.web_rps))),
+            vector_backend=args.backend
+        )
+        stored = kb.collection.count()
+        for size in sizes:
+            log(f"kb_size {size}: ingesting {max(0, size - stored)} chunks")
+            phases = {}
+            rss_before = rss_mb()
+            phases["ingest"] = bench_ingest(kb, stored, max(0, size - stored), vocabulary, args.ingest_batch)
+            stored = kb.collection.count()
+
+            # The BM25 index is built on first search; time that separately from steady-state queries
+            t0 = time.perf_counter()
+            kb._lexical()
+            lexical_build = time.perf_counter() - t0
+
+            log(f"kb_size {size}: search, chat and story")
+            phases["search"] = bench_search(kb, make_queries(args.queries, vocabulary, seed=size))
+            phases["chat_turn"] = bench_chat(kb, chat_manager, make_queries(args.turns, vocabulary, seed=size + 1))
+            phases["story"] = bench_story(kb, story_manager, args.stories)
+            results["results"].append({
+                "kb_size": size,
+                "chunks": kb.collection.count(),
+                "lexical_build_seconds": round(lexical_build, 4),
+                "memory": {
+                    "rss_before_mb": round(rss_before, 1),
+                    "rss_after_mb": round(rss_mb(), 1),
+                    "peak_rss_mb": round(peak_rss_mb(), 1),
+                },
+                "phases": phases,
+            })
+            for phase, stats in phases.items():
+                log(f"  {phase:<10} {stats['throughput']:>10.1f} {stats['unit']:<16} "
+                    f"p50 {stats['p50_ms']:>9.2f} ms  p95 {stats['p95_ms']:>9.2f} ms  rss {stats['rss_mb']:.0f} MB")
+        kb.enrichment_queue.shutdown()
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for size, phase, old, new in regressions:
+            log(f"REGRESSION kb_size {size} {phase}: p95 {old:.2f} ms -> {new:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        log("no p95 regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compare per-chunk ingestion with batched ingestion into a fresh Chroma collection
+
+Usage:
+    python -m benchmarks.bench_ingestion --docs 50 --doc-chars 20000 --batch-size 64
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from utils.knowledge_base import KnowledgeBaseManager
+
+WORDS = (
+    "love trust partner communication listen feelings conflict respect time "
+    "together apology boundary support honest relationship quality attention"
+).split()
+
+
+def make_corpus(n_docs: int, doc_chars: int, seed: int = 0):
+    rng = random.Random(seed)
+    docs = []
+    for _ in range(n_docs):
+        words = []
+        size = 0
+        while size < doc_chars:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        docs.append(" ".join(words))
+    return docs
+
+
+def bench_per_chunk(docs, workdir):
+    """The original add_document loop: one collection.add per chunk"""
+    kb = KnowledgeBaseManager(persist_directory=workdir)
+    start = time.perf_counter()
+    for n, text in enumerate(docs):
+        chunks = kb._chunk_text(text)
+        for i, chunk in enumerate(chunks):
+            kb.collection.add(
+                documents=[chunk],
+                metadatas=[{"chunk_index": i, "total_chunks": len(chunks)}],
+                ids=[f"doc{n}_chunk_{i}"]
+            )
+    return time.perf_counter() - start
+
+
+def bench_batched(docs, workdir, batch_size):
+    kb = KnowledgeBaseManager(persist_directory=workdir, batch_size=batch_size)
+    start = time.perf_counter()
+    kb.add_documents(texts=docs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50)
+    parser.add_argument("--doc-chars", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    docs = make_corpus(args.docs, args.doc_chars)
+    with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+        # Warm the embedding model so neither run pays for loading it
+        KnowledgeBaseManager(persist_directory=a).collection.add(documents=["warmup"], ids=["warmup"])
+        per_chunk = bench_per_chunk(docs, b)
+        batched = bench_batched(docs, a, args.batch_size)
+
+    print(f"documents:  {args.docs} x {args.doc_chars} chars")
+    print(f"per-chunk:  {per_chunk:.2f}s  {args.docs / per_chunk:.2f} docs/sec")
+    print(f"batched:    {batched:.2f}s  {args.docs / batched:.2f} docs/sec  (batch_size={args.batch_size})")
+    print(f"speedup:    {per_chunk / batched:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Offline relevance and latency of vector-only vs hybrid (BM25 + vector) retrieval
+
+Each synthetic document describes one made-up technique with a rare name.
+Keyword queries ask for the name, and only that document is relevant;
+paraphrase queries describe the idea without it, and every document about
+the same idea is relevant.
+
+Usage:
+    python -m benchmarks.bench_retrieval --docs 500 --queries 100
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from utils.knowledge_base import KnowledgeBaseManager
+
+SYLLABLES = "ka lo mi ren sa tor vel zu quin dar ph yo gre nix".split()
+TOPICS = [
+    ("a check-in ritual where partners share one worry each evening",
+     "sharing a small concern with your partner every night"),
+    ("a pause rule that stops arguments after ten minutes of raised voices",
+     "taking a break when a fight gets too heated"),
+    ("a gratitude journal both partners write in on weekends",
+     "writing down what you appreciate about each other"),
+    ("a budgeting conversation held on the first day of each month",
+     "talking about money together regularly"),
+    ("a repair attempt that uses humour to soften criticism",
+     "making a joke to calm things down after a harsh remark"),
+    ("a listening exercise where one partner repeats back what they heard",
+     "paraphrasing your partner to show you understood"),
+]
+FILLER = [
+    "Couples who practise it report feeling closer.",
+    "It works best when both people agree to it in advance.",
+    "Therapists often suggest starting small.",
+    "Consistency matters more than doing it perfectly.",
+]
+
+
+def make_name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(4)).capitalize()
+
+
+def make_corpus(n_docs: int, seed: int = 0):
+    rng = random.Random(seed)
+    docs = []
+    names = set()
+    for _ in range(n_docs):
+        name = make_name(rng)
+        while name in names:
+            name = make_name(rng)
+        names.add(name)
+        description, paraphrase = rng.choice(TOPICS)
+        text = f"The {name} method is {description}. " + " ".join(rng.sample(FILLER, 2))
+        docs.append({"name": name, "text": text, "topic": description, "paraphrase": paraphrase})
+    return docs
+
+
+def evaluate(kb, queries, n_results: int):
+    """
+    queries: [(query, relevant doc_ids)]
+    Returns: (share of queries with a relevant hit, MRR, latencies in ms)
+    """
+    hits = 0
+    reciprocal_ranks = []
+    latencies = []
+    for query, relevant in queries:
+        kb.result_cache.clear()
+        start = time.perf_counter()
+        results = kb.search_similar(query, n_results=n_results)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids = [result["metadata"].get("doc_id") for result in results]
+        ranks = [rank for rank, doc_id in enumerate(ids, 1) if doc_id in relevant]
+        hits += bool(ranks)
+        reciprocal_ranks.append(1.0 / ranks[0] if ranks else 0.0)
+    return hits / len(queries), statistics.mean(reciprocal_ranks), latencies
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--n-results", type=int, default=3)
+    args = parser.parse_args()
+
+    docs = make_corpus(args.docs)
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        kb = KnowledgeBaseManager(persist_directory=workdir, hybrid_search=True)
+        doc_ids = kb.add_documents(texts=[doc["text"] for doc in docs])
+        sample = rng.sample(range(len(docs)), min(args.queries, len(docs)))
+        by_topic = {}
+        for doc, doc_id in zip(docs, doc_ids):
+            by_topic.setdefault(doc["topic"], set()).add(doc_id)
+        query_sets = {
+            "keyword": [(f"what is the {docs[i]['name']} method", {doc_ids[i]}) for i in sample],
+            "paraphrase": [(docs[i]["paraphrase"], by_topic[docs[i]["topic"]]) for i in sample],
+        }
+        # Same collection, searched with and without the BM25 side
+        kb._lexical()
+        lexical_index = kb.lexical_index
+
+        print(f"documents: {args.docs}  queries per set: {len(sample)}  n_results: {args.n_results}")
+        print(f"{'mode':<8} {'queries':<11} {'recall':>7} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}")
+        for mode in ("vector", "hybrid"):
+            kb.lexical_index = lexical_index if mode == "hybrid" else None
+            for name, queries in query_sets.items():
+                recall, mrr, latencies = evaluate(kb, queries, args.n_results)
+                print(f"{mode:<8} {name:<11} {recall:>7.2f} {mrr:>6.2f} "
+                      f"{percentile(latencies, 50):>8.2f} {percentile(latencies, 95):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Build time, memory, disk, recall@k and query latency of the quantized vector index against Chroma
+
+Both backends index the same synthetic clustered, normalized vectors (the
+shape of MiniLM sentence embeddings) and answer the same queries. Each
+backend runs in its own process so RSS reflects that backend alone.
+Recall@k is measured against exact brute-force neighbours computed in the
+parent. Results are written as JSON.
+
+Usage:
+    python -m benchmarks.bench_vector_index --size 100000 --out vector_index.json
+    python -m benchmarks.bench_vector_index --size 1000000 --backends quantized --nprobe 32
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def make_vectors(start: int, count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """Rows start..start+count of a deterministic clustered dataset, generated batch by batch"""
+    centers = np.random.default_rng(seed).normal(size=(clusters, dim)).astype(np.float32)
+    rng = np.random.default_rng((seed, start))
+    vectors = centers[rng.integers(0, clusters, count)] + rng.normal(scale=0.6, size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    # Same clusters, different noise (a row range no dataset reaches), so
+    # queries are near the data but not in it
+    return make_vectors(2 ** 40, count, dim, clusters, seed)
+
+
+def batches(size: int, batch: int):
+    for start in range(0, size, batch):
+        yield start, min(batch, size - start)
+
+
+def exact_neighbours(queries: np.ndarray, size: int, args) -> np.ndarray:
+    """Indices of the k nearest vectors per query by streaming brute force"""
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    best_dist = np.empty((len(queries), 0), dtype=np.float32)
+    query_norms = (queries ** 2).sum(axis=1)[:, None]
+    for start, count in batches(size, args.batch):
+        vectors = make_vectors(start, count, args.dim, args.clusters)
+        dist = query_norms - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)[None, :]
+        ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + count), dist.shape)], axis=1)
+        dist = np.concatenate([best_dist, dist], axis=1)
+        top = np.argpartition(dist, args.k - 1, axis=1)[:, :args.k]
+        best_ids = np.take_along_axis(ids, top, axis=1)
+        best_dist = np.take_along_axis(dist, top, axis=1)
+    return best_ids
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def disk_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            # Allocated blocks, since the quantized index preallocates sparse files
+            stat = os.stat(os.path.join(root, name))
+            total += getattr(stat, "st_blocks", stat.st_size // 512) * 512
+    return total / 2 ** 20
+
+
+def open_backend(backend: str, path: str, args):
+    if backend == "chroma":
+        import chromadb
+        client = chromadb.PersistentClient(path=path)
+        collection = client.get_or_create_collection(name="bench", metadata={"hnsw:space": "l2"},
+                                                     embedding_function=None)
+        return collection, min(args.batch, client.get_max_batch_size())
+    from utils.vector_index import QuantizedCollection
+    return QuantizedCollection(path, nprobe=args.nprobe, rerank=args.rerank,
+                               train_threshold=args.train_threshold), args.batch
+
+
+def run_backend(backend: str, args, queries: np.ndarray) -> dict:
+    """Runs in a fresh process: build the index, then time the queries"""
+    with tempfile.TemporaryDirectory() as workdir:
+        rss_start = rss_mb()
+        collection, batch = open_backend(backend, workdir, args)
+        t0 = time.perf_counter()
+        for start, count in batches(args.size, batch):
+            collection.add(ids=[str(i) for i in range(start, start + count)],
+                           embeddings=make_vectors(start, count, args.dim, args.clusters))
+        build = time.perf_counter() - t0
+        rss_built = rss_mb()
+
+        latencies, found = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            result = collection.query(query_embeddings=[query.tolist()], n_results=args.k)
+            latencies.append(time.perf_counter() - t0)
+            found.append([int(chunk_id) for chunk_id in result["ids"][0]])
+        return {
+            "build_seconds": round(build, 3),
+            "vectors_per_second": round(args.size / build, 1) if build else 0.0,
+            "rss_after_build_mb": round(rss_built - rss_start, 1),
+            "rss_after_queries_mb": round(rss_mb() - rss_start, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "disk_mb": round(disk_mb(workdir), 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+            "found": found,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=int, default=100000, help="Vectors indexed")
+    parser.add_argument("--dim", type=int, default=384, help="Vector dimension (MiniLM is 384)")
+    parser.add_argument("--clusters", type=int, default=1000, help="Topic clusters in the synthetic data")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10, help="Neighbours per query (recall@k)")
+    parser.add_argument("--batch", type=int, default=5000, help="Vectors per add() call")
+    parser.add_argument("--backends", default="chroma,quantized", help="Comma-separated backends to compare")
+    parser.add_argument("--nprobe", type=int, default=16, help="Quantized index: inverted lists scanned per query")
+    parser.add_argument("--rerank", type=int, default=8, help="Quantized index: candidates re-ranked, times k")
+    parser.add_argument("--train-threshold", type=int, default=20000,
+                        help="Quantized index: vectors before the IVF is trained")
+    parser.add_argument("--out", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries, args.dim, args.clusters)
+    print(f"Computing exact neighbours for {args.queries} queries over {args.size} vectors", file=sys.stderr)
+    truth = exact_neighbours(queries, args.size, args)
+    results = {
+        "config": vars(args),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for backend in args.backends.split(","):
+        print(f"Benchmarking {backend}", file=sys.stderr)
+        with context.Pool(1) as pool:
+            stats = pool.apply(run_backend, (backend, args, queries))
+        found = stats.pop("found")
+        hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth.tolist()))
+        stats[f"recall_at_{args.k}"] = round(hits / (len(truth) * args.k), 4)
+        results["results"][backend] = stats
+        print(f"  build {stats['build_seconds']:.1f}s  rss {stats['rss_after_build_mb']:.0f} MB  "
+              f"disk {stats['disk_mb']:.0f} MB  p50 {stats['p50_ms']:.2f} ms  p95 {stats['p95_ms']:.2f} ms  "
+              f"recall@{args.k} {stats[f'recall_at_{args.k}']:.3f}", file=sys.stderr)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Load test for the SQLite session store: many concurrent sessions across
+several replica processes sharing one database file
+
+Usage:
+    python -m benchmarks.load_sessions --replicas 4 --sessions 200 --turns 20
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import uuid
+from multiprocessing import Pool
+
+from utils.session import SessionManager, SQLiteSessionBackend
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_replica(args):
+    """One app replica: a thread per session, each chatting then reconnecting"""
+    path, n_sessions, turns = args
+    backend = SQLiteSessionBackend(path)
+    manager = SessionManager(backend=backend)
+    restore_times = []
+    errors = []
+    lock = threading.Lock()
+
+    def session():
+        user_id = str(uuid.uuid4())
+        try:
+            history, _ = manager.restore(user_id)
+            for turn in range(turns):
+                history.append({"role": "user", "content": f"Question {turn} from {user_id}"})
+                history.append({"role": "assistant", "content": f"Answer {turn} for {user_id}. " * 5})
+            manager.save_state(user_id, "quiz_insights", {"love_language": "Quality Time"})
+            # Simulate a reconnect landing on this replica
+            start = time.perf_counter()
+            restored, state = manager.restore(user_id)
+            elapsed = time.perf_counter() - start
+            if len(restored) != min(turns * 2, manager.max_history) or "quiz_insights" not in state:
+                raise AssertionError(f"incomplete restore for {user_id}")
+            with lock:
+                restore_times.append(elapsed)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=session) for _ in range(n_sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    backend.close()
+    return restore_times, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=200, help="Sessions per replica")
+    parser.add_argument("--turns", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "sessions.db")
+        SQLiteSessionBackend(path).close()  # create the schema once up front
+        start = time.perf_counter()
+        with Pool(args.replicas) as pool:
+            results = pool.map(run_replica, [(path, args.sessions, args.turns)] * args.replicas)
+        elapsed = time.perf_counter() - start
+
+    restore_times = [t for times, _ in results for t in times]
+    errors = [e for _, errs in results for e in errs]
+    messages = args.replicas * args.sessions * args.turns * 2
+    print(f"sessions:  {args.replicas * args.sessions} across {args.replicas} replicas")
+    print(f"messages:  {messages} in {elapsed:.2f}s ({messages / elapsed:.0f} msg/s)")
+    print(f"restore:   p50 {percentile(restore_times, 50) * 1000:.1f}ms  "
+          f"p95 {percentile(restore_times, 95) * 1000:.1f}ms")
+    print(f"errors:    {len(errors)}")
+    for error in errors[:5]:
+        print(f"  {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+LoveBot maintenance commands
+
+The vector index backend defaults to LOVEBOT_VECTOR_BACKEND (chroma), as in the app.
+
+Usage:
+    python cli.py compact [--path ./knowledge_base] [--backend chroma|quantized]
+    python cli.py maintain [--path ./knowledge_base] [--max-age-days 30] [--max-idle-days N]
+                           [--max-web-mb N] [--max-web-chunks N] [--no-vacuum]
+                           [--backend chroma|quantized]
+    python cli.py profile-startup [--path ./knowledge_base] [--warmup] [--backend chroma|quantized]
+    python cli.py ingest DIRECTORY [--path ./knowledge_base] [--workers N] [--batch-chunks 2048]
+                         [--manifest FILE] [--backend chroma|quantized]
+    python cli.py rechunk [--path ./knowledge_base] [--backend chroma|quantized]
+"""
+import argparse
+import os
+import time
+
+
+def cmd_compact(args):
+    from utils.knowledge_base import KnowledgeBaseManager
+    kb = KnowledgeBaseManager(persist_directory=args.path, vector_backend=args.backend)
+    result = kb.compact()
+    print(f"Scanned {result['scanned']} chunks, removed {result['removed']} duplicates")
+
+
+def cmd_maintain(args):
+    from utils.knowledge_base import KnowledgeBaseManager
+    kb = KnowledgeBaseManager(
+        persist_directory=args.path,
+        vector_backend=args.backend,
+        web_max_age=args.max_age_days * 86400 if args.max_age_days else None,
+        web_max_idle=args.max_idle_days * 86400 if args.max_idle_days else None,
+        web_max_bytes=int(args.max_web_mb * 2 ** 20) if args.max_web_mb else None,
+        web_max_chunks=args.max_web_chunks
+    )
+    report = kb.run_maintenance(vacuum=not args.no_vacuum)
+    print(f"Scanned {report['scanned']} web chunks, evicted {report['evicted_age']} by age, "
+          f"{report['evicted_idle']} idle and {report['evicted_size']} over the size cap")
+    print(f"Removed {report['duplicates_removed']} duplicates; "
+          f"{report['web_chunks']} web chunks ({report['web_bytes'] / 2 ** 20:.1f} MB of text) remain")
+    print(f"Disk: {report['bytes_before'] / 2 ** 20:.1f} MB -> {report['bytes_after'] / 2 ** 20:.1f} MB, "
+          f"reclaimed {report['reclaimed_bytes'] / 2 ** 20:.1f} MB"
+          + ("" if report["vacuumed"] else " (not vacuumed)"))
+
+
+def cmd_profile_startup(args):
+    from utils.startup_profile import MODES, interpreter_baseline, profile_import, profile_managers
+
+    print("Import time (fresh interpreter per module)")
+    baseline = interpreter_baseline()
+    for mode, modules in MODES.items():
+        for module in modules:
+            result = profile_import(module, baseline=baseline)
+            if "error" in result:
+                print(f"  {mode:<15} {module:<25} failed: {result['error']}")
+                continue
+            heaviest = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in result["heaviest"])
+            print(f"  {mode:<15} {module:<25} {result['seconds']:6.2f}s  {heaviest}")
+
+    print("\nManager startup (in process, cheapest first)")
+    total = 0.0
+    for step, seconds in profile_managers(args.path, warmup=args.warmup, vector_backend=args.backend):
+        total += seconds
+        print(f"  {step:<22} {seconds:6.2f}s  (cumulative {total:.2f}s)")
+
+
+def cmd_ingest(args):
+    from utils.bulk_ingest import ingest_directory
+    from utils.knowledge_base import KnowledgeBaseManager
+    kb = KnowledgeBaseManager(persist_directory=args.path, vector_backend=args.backend)
+    last_report = 0.0
+
+    def report_progress(stats):
+        nonlocal last_report
+        if time.monotonic() - last_report >= 5:
+            last_report = time.monotonic()
+            print(f"  {stats['files_done'] + stats['files_empty'] + stats['files_failed']} files, "
+                  f"{stats['pages']} pages, {stats['chunks']} chunks "
+                  f"({stats['pages_per_second']:.1f} pages/s, {stats['chunks_per_second']:.1f} chunks/s)")
+
+    try:
+        stats = ingest_directory(kb, args.directory, workers=args.workers, manifest_path=args.manifest,
+                                 batch_chunks=args.batch_chunks, progress_callback=report_progress)
+    finally:
+        kb.enrichment_queue.shutdown()
+    print(f"Ingested {stats['files_done']} of {stats['files']} files in {stats['seconds']:.1f}s "
+          f"({stats['files_skipped']} already done, {stats['files_empty']} empty, {stats['files_failed']} failed)")
+    print(f"{stats['pages']} pages, {stats['chunks']} chunks ({stats['added']} new, {stats['duplicates']} duplicates)")
+    print(f"Throughput: {stats['pages_per_second']:.1f} pages/s, {stats['chunks_per_second']:.1f} chunks/s, "
+          f"{stats['files_per_second']:.1f} files/s")
+
+
+def cmd_rechunk(args):
+    from utils.knowledge_base import KnowledgeBaseManager
+    kb = KnowledgeBaseManager(persist_directory=args.path, vector_backend=args.backend)
+    try:
+        result = kb.rechunk()
+    finally:
+        kb.enrichment_queue.shutdown()
+    print(f"Scanned {result['scanned']} chunks, re-chunked {result['documents']} documents "
+          f"({result['added']} chunks added, {result['removed']} removed)")
+
+
+def add_backend_argument(parser):
+    parser.add_argument("--backend", choices=["chroma", "quantized"],
+                        default=os.environ.get("LOVEBOT_VECTOR_BACKEND", "chroma"), help="Vector index backend")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LoveBot maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compact = subparsers.add_parser("compact", help="Remove duplicate chunks from the knowledge base")
+    compact.add_argument("--path", default="./knowledge_base", help="Chroma persistence directory")
+    add_backend_argument(compact)
+    compact.set_defaults(func=cmd_compact)
+
+    maintain = subparsers.add_parser(
+        "maintain", help="Evict old or unused web chunks, remove duplicates and vacuum the store"
+    )
+    maintain.add_argument("--path", default="./knowledge_base", help="Chroma persistence directory")
+    maintain.add_argument("--max-age-days", type=float, default=30, help="Evict web chunks older than this (0 = keep)")
+    maintain.add_argument("--max-idle-days", type=float, help="Evict web chunks unused for this long")
+    maintain.add_argument("--max-web-mb", type=float, help="Cap on web chunk text, least recently used evicted first")
+    maintain.add_argument("--max-web-chunks", type=int, help="Cap on the number of web chunks")
+    maintain.add_argument("--no-vacuum", action="store_true", help="Skip vacuuming the store")
+    add_backend_argument(maintain)
+    maintain.set_defaults(func=cmd_maintain)
+
+    profile = subparsers.add_parser(
+        "profile-startup", help="Report import and startup time of each subsystem"
+    )
+    profile.add_argument("--path", default="./knowledge_base", help="Chroma persistence directory")
+    profile.add_argument("--warmup", action="store_true", help="Also time loading the embedding model")
+    add_backend_argument(profile)
+    profile.set_defaults(func=cmd_profile_startup)
+
+    ingest = subparsers.add_parser(
+        "ingest", help="Bulk-load a directory tree of PDF, TXT and MD files, resuming an interrupted run"
+    )
+    ingest.add_argument("directory", help="Directory to ingest recursively")
+    ingest.add_argument("--path", default="./knowledge_base", help="Chroma persistence directory")
+    ingest.add_argument("--workers", type=int, help="Extraction processes (default: CPU count)")
+    ingest.add_argument("--batch-chunks", type=int, default=2048, help="Chunks buffered per write")
+    ingest.add_argument("--manifest", help="Checkpoint manifest (default: ingest_manifest.jsonl under --path)")
+    add_backend_argument(ingest)
+    ingest.set_defaults(func=cmd_ingest)
+
+    rechunk = subparsers.add_parser(
+        "rechunk", help="Re-chunk documents stored with other chunking settings, e.g. before an upgrade"
+    )
+    rechunk.add_argument("--path", default="./knowledge_base", help="Chroma persistence directory")
+    add_backend_argument(rechunk)
+    rechunk.set_defaults(func=cmd_rechunk)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 import streamlit as st
 import uuid
 import os
-from utils.chat import ChatManager
+import hashlib
+import re
+import secrets
 from utils.content_filter import ContentFilter
-from utils.session import SessionManager
+from utils.session import SessionManager, SQLiteSessionBackend
 from utils.quiz import QuizManager
-from utils.knowledge_base import KnowledgeBaseManager
-from utils.story import StoryManager
+from utils.metrics import REGISTRY, configure_logging, request_id_var, start_metrics_server
 import time
 
 # Page configuration
@@ -21,17 +22,105 @@ def load_css():
     with open("styles/chat.css") as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
 
-# Initialize managers
+# Initialize managers. Only the lightweight ones are created up front; the
+# chat, story and knowledge base managers (Groq, Chroma, the embedding model)
+# are imported and built the first time a mode needs them
 @st.cache_resource
 def init_managers():
-    chat_manager = ChatManager()
+    session_backend = SQLiteSessionBackend(os.environ.get("LOVEBOT_SESSION_DB", "./sessions.db"))
     return (
-        chat_manager,
-        ContentFilter(),
-        SessionManager(),
-        QuizManager(),
-        KnowledgeBaseManager(),
-        StoryManager()
+        ContentFilter(blocklist_path=os.environ.get("LOVEBOT_BLOCKLIST")),
+        SessionManager(backend=session_backend),
+        QuizManager()
+    )
+
+@st.cache_resource
+def init_observability():
+    """
+    JSON logs to stderr, plus a Prometheus /metrics endpoint when LOVEBOT_METRICS_PORT
+    is set, on localhost unless LOVEBOT_METRICS_HOST names another interface
+    """
+    configure_logging(os.environ.get("LOVEBOT_LOG_LEVEL", "INFO"))
+    port = os.environ.get("LOVEBOT_METRICS_PORT")
+    # Streamlit can't serve extra routes, so metrics get their own small server
+    if not port:
+        return None
+    return start_metrics_server(int(port), host=os.environ.get("LOVEBOT_METRICS_HOST", "127.0.0.1"))
+
+@st.cache_resource
+def get_response_cache():
+    """
+    Shared LLM response cache, off unless LOVEBOT_RESPONSE_CACHE names a file.
+    Chat and story sample at temperature 0.7, so a hit replays the same answer
+    where the model would have varied it.
+    """
+    path = os.environ.get("LOVEBOT_RESPONSE_CACHE", "off")
+    if path == "off":
+        return None
+    from utils.response_cache import ResponseCache
+    return ResponseCache(path, ttl=float(os.environ.get("LOVEBOT_RESPONSE_CACHE_TTL", "86400")))
+
+@st.cache_resource
+def get_chat_manager():
+    from utils.chat import ChatManager
+    return ChatManager(response_cache=get_response_cache())
+
+def _env_days(name, default=None):
+    """Days from the environment as seconds; unset or 0 means no limit"""
+    days = float(os.environ.get(name) or default or 0)
+    return days * 86400 if days else None
+
+@st.cache_resource
+def get_kb_manager():
+    from utils.knowledge_base import KnowledgeBaseManager
+    return KnowledgeBaseManager(
+        embedding_threads=int(os.environ["LOVEBOT_EMBEDDING_THREADS"]) if os.environ.get("LOVEBOT_EMBEDDING_THREADS") else None,
+        warmup_embeddings=os.environ.get("LOVEBOT_WARMUP_EMBEDDINGS", "1") != "0",
+        web_search_ttl=float(os.environ.get("LOVEBOT_WEB_SEARCH_TTL", "86400")),
+        web_search_threshold=float(os.environ.get("LOVEBOT_WEB_SEARCH_THRESHOLD", "0.5")),
+        min_relevance=float(os.environ.get("LOVEBOT_MIN_RELEVANCE", "0.3")),
+        # Web chunk retention, enforced by a background job (uploads are kept)
+        web_max_age=_env_days("LOVEBOT_WEB_MAX_AGE_DAYS", "30"),
+        web_max_idle=_env_days("LOVEBOT_WEB_MAX_IDLE_DAYS"),
+        web_max_bytes=int(float(os.environ["LOVEBOT_WEB_MAX_MB"]) * 2 ** 20) if os.environ.get("LOVEBOT_WEB_MAX_MB") else None,
+        web_max_chunks=int(os.environ["LOVEBOT_WEB_MAX_CHUNKS"]) if os.environ.get("LOVEBOT_WEB_MAX_CHUNKS") else None,
+        maintenance_interval=float(os.environ.get("LOVEBOT_MAINTENANCE_INTERVAL", "3600")) or None,
+        vector_backend=os.environ.get("LOVEBOT_VECTOR_BACKEND", "chroma")
+    )
+
+@st.cache_resource
+def get_story_manager():
+    from utils.story import StoryManager
+    return StoryManager(response_cache=get_response_cache())
+
+SESSION_COOKIE = "lovebot_session"
+SESSION_COOKIE_MAX_AGE = 90 * 86400
+
+def _session_user_id():
+    """
+    Storage key for this browser's persisted session. The session token is a
+    bearer secret (whoever holds it can restore the whole conversation
+    history), so it is 256 random bits kept in a SameSite cookie rather than
+    the URL, where it would leak through shared links, browser history and
+    Referer headers. Only its hash is used as the storage key and in logs.
+    """
+    token = st.context.cookies.get(SESSION_COOKIE)
+    if not isinstance(token, str) or not re.fullmatch(r"[A-Za-z0-9_-]{43}", token):
+        token = secrets.token_urlsafe(32)
+        _set_session_cookie(token)
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+def _set_session_cookie(token):
+    # Streamlit can only read cookies, so the browser sets it; the component
+    # iframe shares the app's origin
+    import streamlit.components.v1 as components
+    components.html(
+        "<script>"
+        f"let cookie = '{SESSION_COOKIE}={token}; Max-Age={SESSION_COOKIE_MAX_AGE}; Path=/; SameSite=Strict';"
+        "if (window.parent.location.protocol === 'https:') cookie += '; Secure';"
+        "window.parent.document.cookie = cookie;"
+        "</script>",
+        height=0
     )
 
 def display_quiz():
@@ -62,6 +151,7 @@ def display_quiz():
             if len(st.session_state.quiz_responses) == len(quiz_manager.get_questions()):
                 insights = quiz_manager.analyze_results(st.session_state.quiz_responses)
                 st.session_state.quiz_insights = insights
+                st.session_state.session_manager.save_state(st.session_state.user_id, "quiz_insights", insights)
                 st.session_state.quiz_completed = True
                 st.rerun()
             else:
@@ -90,7 +180,7 @@ def display_knowledge_base():
     """Display knowledge base management interface"""
     st.header("📚 Knowledge Base Management")
 
-    kb_manager = st.session_state.kb_manager
+    kb_manager = get_kb_manager()
 
     # File upload
     uploaded_file = st.file_uploader(
@@ -99,13 +189,31 @@ def display_knowledge_base():
         help="Supported formats: TXT, MD, PDF"
     )
 
+    if "ingested_files" not in st.session_state:
+        st.session_state.ingested_files = {}
+
     if uploaded_file:
-        try:
-            with st.spinner('Processing document...'):
-                doc_id = kb_manager.add_document(file=uploaded_file)
-                st.success(f"Document added successfully! ID: {doc_id}")
-        except Exception as e:
-            st.error(f"Error adding document: {str(e)}")
+        # Streamlit reruns the script on every interaction; only ingest each upload once
+        if uploaded_file.file_id not in st.session_state.ingested_files:
+            progress = st.progress(0.0, text="Processing document...")
+            try:
+                with st.spinner('Processing document...'):
+                    st.session_state.ingested_files[uploaded_file.file_id] = \
+                        kb_manager.ingest_document(
+                            file=uploaded_file,
+                            progress_callback=lambda done, total: progress.progress(
+                                done / total, text=f"Processed page {done} of {total}"
+                            )
+                        )
+            except Exception as e:
+                st.error(f"Error adding document: {str(e)}")
+            progress.empty()
+        result = st.session_state.ingested_files.get(uploaded_file.file_id)
+        if result:
+            st.success(
+                f"Document added successfully! ID: {result['doc_id']} "
+                f"({result['added']} new chunks, {result['skipped']} already stored)"
+            )
 
     # Knowledge base search demo
     st.subheader("Test Knowledge Base")
@@ -123,8 +231,8 @@ def display_story_mode():
     st.header("📖 Story Mode")
     st.markdown("Share your story and get personalized continuations based on your experiences.")
 
-    story_manager = st.session_state.story_manager
-    kb_manager = st.session_state.kb_manager
+    story_manager = get_story_manager()
+    kb_manager = get_kb_manager()
 
     # User story input
     user_story = st.text_area(
@@ -178,21 +286,51 @@ def display_story_mode():
             except Exception as e:
                 st.error(f"Error generating story continuation: {str(e)}")
 
+def display_admin_panel():
+    """Latency percentiles per instrumented call, across all sessions in this process"""
+    with st.expander("📊 Admin: latencies"):
+        rows = REGISTRY.summary()
+        if not rows:
+            st.caption("No requests yet")
+            return
+        st.dataframe([{
+            "span": row["span"],
+            "count": row["count"],
+            "errors": row["errors"],
+            "p50 ms": round(row["p50"] * 1000, 1),
+            "p95 ms": round(row["p95"] * 1000, 1)
+        } for row in rows], hide_index=True)
+        counters = REGISTRY.counters()
+        if counters:
+            st.dataframe([{"event": name, "count": count} for name, count in counters.items()], hide_index=True)
+        if st.button("Reset metrics"):
+            REGISTRY.reset()
+            st.rerun()
+
 def main():
     # Load CSS
     load_css()
+    init_observability()
 
     # Initialize managers
-    chat_manager, content_filter, session_manager, quiz_manager, kb_manager, story_manager = init_managers()
+    content_filter, session_manager, quiz_manager = init_managers()
     st.session_state.quiz_manager = quiz_manager
-    st.session_state.kb_manager = kb_manager
-    st.session_state.story_manager = story_manager
+    st.session_state.session_manager = session_manager
 
-    # Initialize session state
+    # Initialize session state; the session token lives in a cookie so a
+    # reconnect, restart or another replica restores the same session
     if 'user_id' not in st.session_state:
-        st.session_state.user_id = str(uuid.uuid4())
+        st.session_state.user_id = _session_user_id()
+    # Every script run is one request; its spans and log lines carry this ID
+    request_id_var.set(f"{st.session_state.user_id}/{uuid.uuid4().hex[:8]}")
     if 'messages' not in st.session_state:
-        st.session_state.messages = []
+        history, saved_state = session_manager.restore(st.session_state.user_id)
+        st.session_state.messages = history
+        if "quiz_insights" in saved_state:
+            st.session_state.quiz_insights = saved_state["quiz_insights"]
+            st.session_state.quiz_completed = True
+    if 'history_pages' not in st.session_state:
+        st.session_state.history_pages = 1
 
     # Sidebar navigation
     with st.sidebar:
@@ -202,18 +340,31 @@ def main():
         st.markdown("### 🔑 API Keys")
         groq_key = st.text_input("Groq API Key:", type="password")
         anthropic_key = st.text_input("Anthropic API Key:", type="password")
+        openai_key = st.text_input("OpenAI API Key:", type="password")
         
         if groq_key:
             os.environ['GROQ_API_KEY'] = groq_key
-            chat_manager.set_api_key(groq_key)
         
         if anthropic_key:
             os.environ['ANTHROPIC_API_KEY'] = anthropic_key
+
+        if openai_key:
+            os.environ['OPENAI_API_KEY'] = openai_key
             
         st.markdown("---")
         app_mode = st.radio("Choose a mode:", ["Chat", "Story Mode", "Personality Quiz", "Knowledge Base"])
 
+        if os.environ.get("LOVEBOT_ADMIN") == "1":
+            st.markdown("---")
+            display_admin_panel()
+
     if app_mode == "Chat":
+        chat_manager = get_chat_manager()
+        if groq_key or anthropic_key or openai_key:
+            # Requests go to whichever configured provider is currently fastest
+            from utils.llm_backend import get_shared_router
+            chat_manager.set_client(get_shared_router(groq_key, anthropic_key, openai_key))
+
         # Main chat interface
         st.title("💝 LoveBot")
         st.markdown("Your AI-powered relationship assistant")
@@ -226,13 +377,26 @@ def main():
                 st.markdown(f"**Conflict Style:** {insights['conflict_style']}")
                 st.markdown(f"**Social Style:** {insights['social_style']}")
 
-        # Display chat messages
-        for message in st.session_state.messages:
+        # Display only the most recent window of chat messages
+        history = st.session_state.messages
+        visible, has_older = session_manager.visible_messages(history, st.session_state.history_pages)
+        if has_older:
+            if st.button("Load older messages"):
+                st.session_state.history_pages += 1
+                st.rerun()
+        elif history.summary:
+            with st.expander("Earlier conversation (summarized)"):
+                st.markdown(history.summary)
+        for message in visible:
             with st.chat_message(message["role"]):
                 st.write(message["content"])
 
         # Chat input
-        if prompt := st.chat_input("Type your message here..."):
+        prompt = st.chat_input("Type your message here...")
+        # Opened after the page has rendered so first paint doesn't wait on
+        # Chroma; this also starts the embedding warmup before the first question
+        kb_manager = get_kb_manager()
+        if prompt:
             # Add user message
             st.session_state.messages.append({"role": "user", "content": prompt})
             with st.chat_message("user"):
@@ -246,13 +410,25 @@ def main():
                     message_placeholder.markdown("🤔 Thinking...")
 
                     try:
-                        # Get relevant context from knowledge base
-                        context = kb_manager.get_relevant_context(prompt)
-
-                        # Add context to the chat
-                        response = chat_manager.get_response(prompt, st.session_state.messages, context)
+                        # Get relevant snippets from knowledge base; the chat manager
+                        # ranks and packs them into its context budget
+                        retrieval = []
+                        context = kb_manager.get_relevant_documents([prompt], report=retrieval)
+
+                        # Stream the reply into the placeholder as tokens arrive
+                        response = ""
+                        for token in chat_manager.stream_response(prompt, st.session_state.messages, context):
+                            response += token
+                            message_placeholder.markdown(response + "▌")
                         message_placeholder.markdown(response)
                         st.session_state.messages.append({"role": "assistant", "content": response})
+                        if os.environ.get("LOVEBOT_ADMIN") == "1":
+                            for decision in retrieval:
+                                st.caption(
+                                    f"Retrieval: {'web + local' if decision['web_search'] else 'local only'}, "
+                                    f"best relevance {decision['best_relevance']:.2f}, "
+                                    f"{decision['kept']} snippets kept, {decision['dropped']} dropped"
+                                )
                     except Exception as e:
                         message_placeholder.markdown(f"❌ Error: {str(e)}")
             else:
@@ -0,0 +1,29 @@
+import pytest
+from tests.fakes import FakeDDGS, FakeLLMServer, HashEmbeddingFunction
+
+
+@pytest.fixture
+def llm_server():
+    with FakeLLMServer() as server:
+        yield server
+
+
+@pytest.fixture
+def make_kb(tmp_path):
+    """Factory for knowledge bases with hashed embeddings and fake web search, closed after the test"""
+    from utils.knowledge_base import KnowledgeBaseManager
+    from utils.llm_client import TokenBucket
+    managers = []
+
+    def make(**options):
+        options.setdefault("persist_directory", str(tmp_path / "kb"))
+        options.setdefault("embedding_function", HashEmbeddingFunction())
+        options.setdefault("ddgs_factory", FakeDDGS)
+        options.setdefault("web_search_limiter", TokenBucket(1000, burst=1000))
+        kb = KnowledgeBaseManager(**options)
+        managers.append(kb)
+        return kb
+
+    yield make
+    for kb in managers:
+        kb.enrichment_queue.shutdown()
@@ -0,0 +1,281 @@
+"""Offline stand-ins for external services, used by the tests"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import itertools
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterator, List
+import numpy as np
+from utils.llm_backend import Provider
+from utils.llm_client import LLMError
+
+DEFAULT_FAKE_RESPONSE = (
+    "It sounds like you both care about each other a lot. Try setting aside "
+    "some quiet time to talk openly about how you feel, and listen without "
+    "interrupting when it's their turn."
+)
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class _FakeCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, messages: List[Dict], model: str, stream: bool = False, **kwargs):
+        self.owner.calls.append({"messages": messages, "model": model, "stream": stream, **kwargs})
+        if stream:
+            return self._stream()
+        time.sleep(self.owner.first_token_delay + self.owner.token_delay * len(self.owner.tokens))
+        message = SimpleNamespace(content=self.owner.response_text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    def _stream(self) -> Iterator:
+        time.sleep(self.owner.first_token_delay)
+        for token in self.owner.tokens:
+            if self.owner.token_delay:
+                time.sleep(self.owner.token_delay)
+            yield _chunk(token)
+
+
+class FakeGroq:
+    """
+    Drop-in replacement for groq.Groq that answers with a canned response
+    Args:
+        response_text: Text returned (or streamed word by word)
+        first_token_delay: Seconds to wait before the first token
+        token_delay: Seconds to wait between streamed tokens
+    """
+    def __init__(self, response_text: str = DEFAULT_FAKE_RESPONSE,
+                 first_token_delay: float = 0.0, token_delay: float = 0.0):
+        self.response_text = response_text
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.tokens = [word + " " for word in response_text.split(" ")]
+        self.tokens[-1] = self.tokens[-1].rstrip(" ")
+        self.calls = []
+        self.chat = SimpleNamespace(completions=_FakeCompletions(self))
+
+
+class FakeLLMServer:
+    """
+    Local HTTP server speaking OpenAI's POST /chat/completions and Anthropic's
+    POST /messages (streaming or not), for exercising utils.llm_client and
+    utils.llm_backend without network access
+    Args:
+        response_text: Text returned (or streamed word by word as SSE)
+        failures: Status codes to answer with before succeeding, one per request
+        delay: Seconds to wait before answering each request
+        token_delay: Seconds to wait between streamed tokens
+    Usage:
+        with FakeLLMServer(failures=[429, 503]) as server:
+            client = LLMClient(base_url=server.base_url)
+    """
+    def __init__(self, response_text: str = DEFAULT_FAKE_RESPONSE, failures: List[int] = None,
+                 delay: float = 0.0, token_delay: float = 0.0):
+        self.response_text = response_text
+        self.failures = list(failures or [])
+        self.delay = delay
+        self.token_delay = token_delay
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server._lock:
+                    server.requests.append(body)
+                    status = server.failures.pop(0) if server.failures else 200
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                try:
+                    time.sleep(server.delay)
+                    if status != 200:
+                        self._send(status, {"error": {"message": f"fake error {status}"}})
+                    elif self.path.endswith("/messages"):
+                        if body.get("stream"):
+                            self._stream_anthropic()
+                        else:
+                            self._send(200, {"content": [{"type": "text", "text": server.response_text}]})
+                    elif body.get("stream"):
+                        self._stream()
+                    else:
+                        self._send(200, {
+                            "choices": [{"message": {"role": "assistant", "content": server.response_text}}],
+                            "usage": {"completion_tokens": len(server.response_text.split())}
+                        })
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up, e.g. after its timeout
+                    pass
+                finally:
+                    with server._lock:
+                        server.active -= 1
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _events(self, events):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for event in events:
+                    self.wfile.write(f"data: {event}\n\n".encode())
+                    self.wfile.flush()
+                self.close_connection = True
+
+            def _tokens(self):
+                words = server.response_text.split(" ")
+                for i, word in enumerate(words):
+                    if server.token_delay:
+                        time.sleep(server.token_delay)
+                    yield word if i == len(words) - 1 else word + " "
+
+            def _stream(self):
+                events = (json.dumps({"choices": [{"delta": {"content": token}}]}) for token in self._tokens())
+                self._events(itertools.chain(events, ["[DONE]"]))
+
+            def _stream_anthropic(self):
+                events = (json.dumps({"type": "content_block_delta", "index": 0,
+                                      "delta": {"type": "text_delta", "text": token}})
+                          for token in self._tokens())
+                self._events(itertools.chain(events, [json.dumps({"type": "message_stop"})]))
+
+        return Handler
+
+
+class MockProvider(Provider):
+    """
+    utils.llm_backend provider that answers locally, for testing routing and failover
+    Args:
+        name: Provider name reported in router stats
+        response_text: Text returned (or streamed word by word)
+        latency: Seconds before the response (or before the first streamed token)
+        token_delay: Seconds between streamed tokens
+        failures: Number of calls that raise before the provider starts answering
+            (-1 = always fail)
+    """
+    def __init__(self, name: str = "mock", response_text: str = DEFAULT_FAKE_RESPONSE,
+                 latency: float = 0.0, token_delay: float = 0.0, failures: int = 0):
+        self.name = name
+        self.model = f"{name}-model"
+        self.response_text = response_text
+        self.latency = latency
+        self.token_delay = token_delay
+        self.failures = failures
+        self.calls = []
+
+    def _maybe_fail(self):
+        if self.failures:
+            if self.failures > 0:
+                self.failures -= 1
+            raise LLMError(f"{self.name} is unavailable", 503)
+
+    def complete(self, messages: List[Dict], **params) -> str:
+        self.calls.append({"messages": messages, "stream": False, **params})
+        time.sleep(self.latency)
+        self._maybe_fail()
+        return self.response_text
+
+    def stream(self, messages: List[Dict], **params) -> Iterator[str]:
+        self.calls.append({"messages": messages, "stream": True, **params})
+        time.sleep(self.latency)
+        self._maybe_fail()
+        words = self.response_text.split(" ")
+        for i, word in enumerate(words):
+            if self.token_delay and i:
+                time.sleep(self.token_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+class FakeDDGS:
+    """
+    Drop-in replacement for duckduckgo_search.DDGS whose text() returns
+    made-up results for the query
+    Args:
+        latency: Seconds each search takes
+        failures: Number of searches that raise before it starts answering
+    """
+    def __init__(self, latency: float = 0.0, failures: int = 0):
+        self.latency = latency
+        self.failures = failures
+        self.queries = []
+
+    def text(self, query: str, max_results: int = 3, **kwargs) -> List[Dict]:
+        self.queries.append(query)
+        time.sleep(self.latency)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("fake search is unavailable")
+        slug = re.sub(r"\W+", "-", query.lower()).strip("-")
+        return [{
+            "title": f"{query.capitalize()}: advice #{i + 1}",
+            "href": f"https://example.com/{slug}/{i + 1}",
+            "body": (f"Result {i + 1} about {query}. Couples who talk openly about {query} "
+                     "tend to resolve disagreements faster and feel more supported.")
+        } for i in range(max_results)]
+
+
+class HashEmbeddingFunction:
+    """
+    Chroma embedding function that hashes words into a fixed-size vector
+    (the "hashing trick"), so documents sharing words are close. Needs no
+    model download, which keeps tests and benchmarks offline and fast.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        return [self._embed(text) for text in input]
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dim] += 1.0 if digest >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,171 @@
+import io
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import cli
+from utils.bulk_ingest import Manifest, find_documents, ingest_directory
+
+TEXT = ("Repair attempts are small gestures that stop an argument from escalating. "
+        "A joke, a touch or an apology can all work when both partners notice them. ") * 30
+
+
+def write_pdf(path, pages):
+    canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+    pdf = canvas.Canvas(str(path))
+    for page in pages:
+        text = pdf.beginText(40, 800)
+        for line in page.split(". "):
+            text.textLine(line)
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+
+
+def upload(path, mime):
+    data = path.read_bytes()
+    return SimpleNamespace(name=path.name, type=mime, read=io.BytesIO(data).read,
+                           seek=lambda position: None)
+
+
+def stored(kb):
+    result = kb.collection.get(include=["metadatas"])
+    return {chunk_id: {key: value for key, value in metadata.items() if key not in ("ingested_at", "path")}
+            for chunk_id, metadata in zip(result["ids"], result["metadatas"])}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "docs"
+    (root / "guides").mkdir(parents=True)
+    (root / ".cache").mkdir()
+    (root / "notes.txt").write_text(TEXT)
+    (root / "guides" / "repair.md").write_text("# Repair\n\n" + TEXT.replace("Repair", "Mending"))
+    (root / "guides" / "empty.txt").write_text("   \n")
+    (root / "guides" / "image.png").write_bytes(b"\x89PNG")
+    (root / ".hidden.txt").write_text("skip me")
+    (root / ".cache" / "stale.md").write_text("skip me too")
+    return root
+
+
+def test_find_documents_skips_hidden_and_unsupported_files(tree):
+    found = [os.path.relpath(path, tree) for path in find_documents(str(tree))]
+    assert found == ["notes.txt", os.path.join("guides", "empty.txt"), os.path.join("guides", "repair.md")]
+
+
+def test_files_are_chunked_and_labelled(make_kb, tree):
+    kb = make_kb()
+    stats = ingest_directory(kb, str(tree), workers=1)
+    assert (stats["files"], stats["files_done"], stats["files_empty"], stats["files_failed"]) == (3, 2, 1, 0)
+    # Repeated passages chunk identically and are stored once
+    assert stats["added"] + stats["duplicates"] == stats["chunks"]
+    assert stats["added"] == kb.collection.count() > 2
+    metadatas = kb.collection.get(include=["metadatas"])["metadatas"]
+    assert {(m["filename"], m["path"], m["file_type"]) for m in metadatas} == {
+        ("notes.txt", "notes.txt", "text"), ("repair.md", "guides/repair.md", "text")
+    }
+
+
+def test_resumed_run_skips_finished_files(make_kb, tree):
+    kb = make_kb()
+    first = ingest_directory(kb, str(tree), workers=1)
+    second = ingest_directory(kb, str(tree), workers=1)
+    assert second["files_skipped"] == 3
+    assert second["added"] == 0
+    assert kb.collection.count() == first["added"]
+
+
+def test_changed_file_is_processed_again(make_kb, tree):
+    kb = make_kb()
+    ingest_directory(kb, str(tree), workers=1)
+    (tree / "notes.txt").write_text(TEXT + " Gratitude rituals help too.")
+    os.utime(tree / "notes.txt", (1, 1))
+    stats = ingest_directory(kb, str(tree), workers=1)
+    assert stats["files_skipped"] == 2
+    assert stats["files_done"] == 1
+    assert stats["added"] > 0
+
+
+def test_failed_files_are_recorded_and_retried(make_kb, tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "broken.pdf").write_bytes(b"not a pdf")
+    (root / "ok.txt").write_text(TEXT)
+    kb = make_kb()
+    manifest = str(tmp_path / "manifest.jsonl")
+    stats = ingest_directory(kb, str(root), workers=1, manifest_path=manifest)
+    assert stats["files_failed"] == 1
+    assert stats["files_done"] == 1
+    with open(manifest) as f:
+        statuses = {os.path.basename(entry["path"]): entry["status"] for entry in map(json.loads, f)}
+    assert statuses == {"broken.pdf": "failed", "ok.txt": "done"}
+    retry = ingest_directory(kb, str(root), workers=1, manifest_path=manifest)
+    assert retry["files_skipped"] == 1
+    assert retry["files_failed"] == 1
+
+
+def test_manifest_ignores_a_truncated_last_line(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    entry = {"path": "/docs/a.txt", "size": 10, "mtime": 1.0, "status": "done"}
+    path.write_text(json.dumps(entry) + "\n" + '{"path": "/docs/b.t')
+    manifest = Manifest(str(path))
+    assert manifest.is_done("/docs/a.txt", 10, 1.0)
+    assert not manifest.is_done("/docs/a.txt", 11, 1.0)
+    assert not manifest.is_done("/docs/b.txt", 10, 1.0)
+    manifest.close()
+
+
+def test_small_batches_write_every_file(make_kb, tree):
+    kb = make_kb()
+    progress = []
+    stats = ingest_directory(kb, str(tree), workers=1, batch_chunks=1, progress_callback=progress.append)
+    assert len(progress) >= 2
+    assert progress[-1]["added"] == stats["added"] == kb.collection.count()
+
+
+def test_worker_processes_give_the_same_chunks(make_kb, tree, tmp_path):
+    serial = make_kb(persist_directory=str(tmp_path / "serial"))
+    parallel = make_kb(persist_directory=str(tmp_path / "parallel"))
+    ingest_directory(serial, str(tree), workers=1)
+    ingest_directory(parallel, str(tree), workers=2)
+    assert sorted(serial.collection.get()["ids"]) == sorted(parallel.collection.get()["ids"])
+
+
+def test_ingest_command_prints_a_summary(make_kb, tree, tmp_path, capsys, monkeypatch):
+    from utils import knowledge_base
+    monkeypatch.setattr(knowledge_base, "KnowledgeBaseManager", make_kb)
+    cli.main(["ingest", str(tree), "--path", str(tmp_path / "kb"), "--workers", "1"])
+    out = capsys.readouterr().out
+    assert "Ingested 2 of 3 files" in out
+    assert "(0 already done, 1 empty, 0 failed)" in out
+
+
+def test_bulk_ingest_matches_uploads(make_kb, tmp_path):
+    root = tmp_path / "docs"
+    (root / "guides").mkdir(parents=True)
+    (root / "notes.txt").write_text(TEXT)
+    (root / "guides" / "repair.md").write_text("# Repair\n\n" + TEXT)
+    write_pdf(root / "guides" / "handbook.pdf", [TEXT[:900], "", TEXT[900:1800]])
+
+    bulk = make_kb(persist_directory=str(tmp_path / "bulk"))
+    stats = ingest_directory(bulk, str(root), workers=1)
+    assert stats["files_done"] == 3
+
+    uploaded = make_kb(persist_directory=str(tmp_path / "uploaded"))
+    uploaded.ingest_document(file=upload(root / "notes.txt", "text/plain"))
+    uploaded.ingest_document(file=upload(root / "guides" / "repair.md", "text/markdown"))
+    uploaded.ingest_document(file=upload(root / "guides" / "handbook.pdf", "application/pdf"))
+
+    assert stored(bulk) == stored(uploaded)
+    paths = {metadata["path"] for metadata in bulk.collection.get(include=["metadatas"])["metadatas"]}
+    assert paths == {"notes.txt", "guides/repair.md", "guides/handbook.pdf"}
+
+
+def test_undecodable_file_is_recorded_as_failed(make_kb, tmp_path):
+    root = tmp_path / "docs"
+    root.mkdir()
+    (root / "broken.txt").write_bytes(b"\xff\xfe not utf-8 \x80")
+    stats = ingest_directory(make_kb(), str(root), workers=1)
+    assert stats["files_failed"] == 1
@@ -0,0 +1,71 @@
+import pytest
+
+from tests.fakes import DEFAULT_FAKE_RESPONSE, FakeGroq
+from utils.chat import ChatManager
+
+HISTORY = [{"role": "user", "content": "hi"}]
+
+
+def make_chat(**options):
+    chat = ChatManager()
+    client = FakeGroq(**options)
+    chat.set_client(client)
+    return chat, client
+
+
+def test_stream_response_yields_tokens_and_metrics():
+    chat, client = make_chat(first_token_delay=0.05)
+    metrics = {}
+    tokens = list(chat.stream_response("hi", HISTORY, metrics=metrics))
+    assert len(tokens) > 1
+    assert "".join(tokens) == DEFAULT_FAKE_RESPONSE
+    assert metrics["chunks"] == len(tokens)
+    assert 0.05 <= metrics["ttft"] <= metrics["total_time"]
+    assert client.calls[0]["stream"]
+
+
+def test_stream_stats_average_recent_streams():
+    chat, _ = make_chat()
+    assert chat.get_stream_stats()["count"] == 0
+    for _ in range(3):
+        list(chat.stream_response("hi", HISTORY))
+    stats = chat.get_stream_stats()
+    assert stats["count"] == 3
+    assert 0 <= stats["avg_ttft"] <= stats["avg_total_time"]
+
+
+def test_get_response_returns_content():
+    chat, client = make_chat(response_text="Talk it through.")
+    assert chat.get_response("hi", HISTORY) == "Talk it through."
+    assert not client.calls[0]["stream"]
+
+
+def test_streaming_requires_a_client():
+    with pytest.raises(Exception, match="API key not set"):
+        list(ChatManager().stream_response("hi", HISTORY))
+
+
+def test_messages_are_packed_into_the_context_budget():
+    chat = ChatManager(context_tokens=1024 + 200)
+    history = [{"role": "user", "content": "word " * 200}, {"role": "assistant", "content": "ok"},
+               {"role": "user", "content": "latest question"}]
+    snippets = [{"content": "far tip", "distance": 0.9}, {"content": "near tip", "distance": 0.1}]
+    messages = chat._build_messages(history, snippets)
+    assert messages[-1]["content"] == "latest question"
+    assert history[0] not in messages[1:]
+    assert messages[0]["content"].index("near tip") < messages[0]["content"].index("far tip")
+    assert chat.last_context_report["remaining"] >= 0
+
+
+class SummarizedHistory(list):
+    """Message list carrying a summary of evicted turns, like ConversationHistory"""
+    summary = "earlier turn " * 2000
+
+
+def test_long_summary_is_cut_to_the_context_budget():
+    chat = ChatManager(context_tokens=1024 + 200)
+    messages = chat._build_messages(SummarizedHistory([{"role": "user", "content": "latest question"}]))
+    report = chat.last_context_report
+    assert report["required_truncated"]
+    assert report["remaining"] >= 0
+    assert chat.context_builder.counter(messages[0]["content"]) <= report["budget"]
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from utils.chunking import TextChunker
+
+SENTENCES = [f"Sentence number {n} talks about trust." for n in range(40)]
+
+
+def test_chunks_end_on_sentence_boundaries():
+    text = " ".join(SENTENCES)
+    chunks = TextChunker(chunk_size=100).chunk(text)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert all(chunk.endswith("trust.") for chunk in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_sentence_ends_with_quotes_and_brackets():
+    text = 'He said "sorry." She smiled (finally!) Then they talked?! Yes.'
+    assert TextChunker(chunk_size=22).chunk(text) == [
+        'He said "sorry."', "She smiled (finally!)", "Then they talked?!", "Yes."
+    ]
+
+
+def test_paragraph_end_is_preferred_when_it_fills_half_a_chunk():
+    paragraph = "First idea here. Second idea here."
+    text = f"{paragraph}\n\n{paragraph} Third idea here."
+    assert TextChunker(chunk_size=60).chunk(text)[0] == paragraph
+
+
+def test_short_paragraph_does_not_force_a_cut():
+    text = "Hi.\n\nFirst idea here. Second idea here. Third idea here."
+    assert TextChunker(chunk_size=60).chunk(text)[0].startswith("Hi.\n\nFirst idea here.")
+
+
+def test_overlap_repeats_whole_trailing_sentences():
+    chunks = TextChunker(chunk_size=120, overlap=45).chunk(" ".join(SENTENCES))
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.rsplit(". ", 1)[-1]
+        assert current.startswith(last_sentence)
+        assert len(current) <= 120
+
+
+def test_overlap_must_be_smaller_than_chunk():
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=100, overlap=100)
+    with pytest.raises(ValueError):
+        TextChunker(unit="words")
+
+
+def test_long_sentences_are_split_at_whitespace():
+    words = [f"word{n}" for n in range(100)]
+    chunker = TextChunker(chunk_size=50)
+    pieces = list(chunker._split_long(" ".join(words), 0, len(" ".join(words)), True))
+    text = " ".join(words)
+    assert "".join(text[start:end] for start, end, _, _ in pieces) == text
+    assert all(cost <= 50 and cost == end - start for start, end, cost, _ in pieces)
+    assert all(text[start:end].split()[0] in words for start, end, _, _ in pieces)
+    assert [ends for _, _, _, ends in pieces] == [False] * (len(pieces) - 1) + [True]
+
+
+def test_unbroken_text_is_cut_at_the_chunk_size():
+    chunks = TextChunker(chunk_size=10).chunk("x" * 35)
+    assert chunks == ["x" * 10] * 3 + ["x" * 5]
+
+
+def test_token_sizes_use_the_counter():
+    chunker = TextChunker(chunk_size=12, unit="tokens", token_counter=lambda text: len(text.split()))
+    chunks = chunker.chunk(" ".join(SENTENCES[:10]))
+    assert all(len(chunk.split()) <= 12 for chunk in chunks)
+    assert len(chunks) == 5
+
+
+def test_spans_index_into_the_text():
+    text = "  Leading space. " + " ".join(SENTENCES[:5]) + "  \n"
+    chunker = TextChunker(chunk_size=80)
+    spans = list(chunker.spans(text))
+    assert [text[start:end] for start, end in spans] == chunker.chunk(text)
+    assert all(not text[start].isspace() and not text[end - 1].isspace() for start, end in spans)
+
+
+@pytest.mark.parametrize("overlap", [0, 60])
+def test_streamed_pieces_give_the_same_chunks(overlap):
+    rng = random.Random(7)
+    pages = []
+    for _ in range(30):
+        sentences = rng.sample(SENTENCES, rng.randint(1, 12))
+        pages.append(("\n\n" if rng.random() < 0.3 else " ").join(sentences))
+    chunker = TextChunker(chunk_size=200, overlap=overlap)
+    assert list(chunker.chunk_stream(pages)) == chunker.chunk("\n".join(pages))
+
+
+def test_signature_names_the_settings():
+    assert TextChunker(chunk_size=500, overlap=50).signature == "sentences:chars:500:50"
+    chunker = TextChunker(chunk_size=64, unit="tokens", token_counter=len)
+    assert chunker.signature == "sentences:tokens:64:0"
+    assert chunker.signature != TextChunker(chunk_size=64, overlap=8, unit="tokens", token_counter=len).signature
+
+
+def test_long_sentences_are_split_by_token_cost():
+    text = " ".join(f"w{n}" for n in range(60))
+    chunker = TextChunker(chunk_size=10, unit="tokens", token_counter=lambda piece: len(piece.split()))
+    pieces = list(chunker._split_long(text, 0, len(text), False))
+    assert "".join(text[start:end] for start, end, _, _ in pieces) == text
+    assert all(cost == len(text[start:end].split()) <= 10 for start, end, cost, _ in pieces)
+    assert not any(ends for _, _, _, ends in pieces)
+
+
+def test_stream_skips_empty_pieces_and_joins_with_the_separator():
+    chunker = TextChunker(chunk_size=40)
+    pages = ["First page ends here.", "", "Second page.", None, "Third page is last."]
+    assert list(chunker.chunk_stream(pages, separator="\n\n")) == chunker.chunk(
+        "First page ends here.\n\nSecond page.\n\nThird page is last."
+    )
+    assert list(chunker.chunk_stream([])) == []
+
+
+def test_overlap_never_stalls_on_long_sentences():
+    text = " ".join(["Short one."] + ["A much longer sentence that fills most of the chunk by itself."] * 5)
+    chunks = TextChunker(chunk_size=70, overlap=60).chunk(text)
+    assert len(chunks) == 6
+    assert all(len(chunk) <= 70 for chunk in chunks)
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+import cli
+
+
+def test_compact_command_reports_counts(make_kb, tmp_path, capsys):
+    kb = make_kb()
+    kb.collection.add(documents=["Be kind.", "Be kind."], metadatas=[{"source": "local"}] * 2, ids=["a", "b"])
+    cli.main(["compact", "--path", str(tmp_path / "kb")])
+    assert "Scanned 2 chunks, removed 1 duplicates" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("command", [["compact"], ["maintain", "--no-vacuum"]])
+def test_maintenance_commands_open_the_configured_backend(make_kb, tmp_path, capsys, command):
+    path = str(tmp_path / "kb")
+    kb = make_kb(persist_directory=path, vector_backend="quantized")
+    kb.ingest_document(text="Listening without interrupting is a skill couples can practise.")
+    kb.enrichment_queue.shutdown()
+
+    cli.main(command + ["--path", path, "--backend", "quantized"])
+    assert "Scanned" in capsys.readouterr().out
+    # Chroma was never opened on the quantized store
+    assert not os.path.exists(os.path.join(path, "chroma.sqlite3"))
+
+
+def test_backend_defaults_to_environment(monkeypatch):
+    monkeypatch.setenv("LOVEBOT_VECTOR_BACKEND", "quantized")
+    calls = []
+    monkeypatch.setattr(cli, "cmd_compact", calls.append)
+    cli.main(["compact"])
+    assert calls[0].backend == "quantized"
+
+
+def test_rechunk_command_reports_counts(make_kb, tmp_path, capsys, monkeypatch):
+    from utils import knowledge_base
+    path = str(tmp_path / "kb")
+    make_kb(persist_directory=path, chunk_size=200, chunk_overlap=0).ingest_document(
+        text=" ".join(f"Sentence {n} is about listening to each other." for n in range(20))
+    )
+    monkeypatch.setattr(knowledge_base, "KnowledgeBaseManager", make_kb)
+    cli.main(["rechunk", "--path", path])
+    out = capsys.readouterr().out
+    assert "re-chunked 1 documents" in out
+    cli.main(["rechunk", "--path", path])
+    assert "re-chunked 0 documents (0 chunks added, 0 removed)" in capsys.readouterr().out
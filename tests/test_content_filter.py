@@ -0,0 +1,61 @@
+import pytest
+
+from utils.content_filter import ContentFilter
+
+
+def test_whole_words_only_by_default():
+    content_filter = ContentFilter()
+    assert content_filter.is_safe("She was explicitly clear about her needs.")
+    assert not content_filter.is_safe("That was explicit.")
+    assert content_filter.find_blocked("Is this NSFW?") == "nsfw"
+
+
+def test_substring_matching_can_be_enabled():
+    content_filter = ContentFilter(word_boundary=False)
+    assert content_filter.find_blocked("She was explicitly clear.") == "explicit"
+
+
+@pytest.mark.parametrize("content", ["PÓRN links", "pornoś", "ｘｘｘ site", "NsFw"])
+def test_case_width_and_accent_variants_are_blocked(content):
+    assert not ContentFilter(word_boundary=False).is_safe(content)
+
+
+def test_accents_are_kept_when_stripping_is_off():
+    assert ContentFilter(strip_accents=False).is_safe("pórn")
+    assert not ContentFilter().is_safe("pórn")
+
+
+def test_blocklist_file_adds_terms(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("# extra terms\ngambling\n\n  onlyfans  # paid content\n", encoding="utf-8")
+    content_filter = ContentFilter(blocklist_path=str(path))
+    assert content_filter.find_blocked("No gambling talk") == "gambling"
+    assert content_filter.find_blocked("my onlyfans") == "onlyfans"
+    assert content_filter.is_safe("# extra terms")
+    assert not content_filter.is_safe("xxx")
+
+
+def test_terms_sharing_a_prefix_match_the_whole_word():
+    content_filter = ContentFilter()
+    content_filter.add_terms(["cheat", "cheater", "cheating"])
+    assert content_filter.find_blocked("a cheater") == "cheater"
+    assert content_filter.find_blocked("cheating again") == "cheating"
+    assert content_filter.find_blocked("cheat") == "cheat"
+    assert content_filter.is_safe("cheats")
+
+
+def test_matches_report_the_configured_term(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("OnlyFans\nCafé Noir\n", encoding="utf-8")
+    content_filter = ContentFilter(blocklist_path=str(path))
+    assert content_filter.find_blocked("see my ONLYFANS") == "OnlyFans"
+    assert content_filter.find_blocked("meet at the cafe noir") == "Café Noir"
+    assert content_filter.find_blocked("ＸＸＸ site") == "xxx"
+    assert content_filter.is_safe("the cafe opens at noon")
+
+
+def test_explicitly_is_allowed_but_explicit_variants_are_not():
+    content_filter = ContentFilter()
+    assert content_filter.is_safe("EXPLICITLY, I said no.")
+    assert content_filter.find_blocked("Éxplícit content") == "explicit"
+    assert content_filter.find_blocked("explicit.") == "explicit"
@@ -0,0 +1,103 @@
+from utils.context_builder import ContextBuilder, truncate_to_tokens
+
+
+def words(text):
+    return len(text.split())
+
+
+def make_builder(max_tokens=100, **options):
+    options.setdefault("reserve_tokens", 0)
+    options.setdefault("tokens_per_message", 0)
+    return ContextBuilder(max_tokens=max_tokens, counter=words, **options)
+
+
+def message(n_words, role="user", tag="w"):
+    return {"role": role, "content": " ".join(f"{tag}{i}" for i in range(n_words))}
+
+
+def test_latest_message_is_kept_and_truncated_to_fit():
+    builder = make_builder(max_tokens=20)
+    packed = builder.pack(["one two three four five"], history=[message(3, tag="old"), message(30)])
+    latest = packed["history"][-1]["content"]
+    assert abs(words(latest) - 15) <= 1
+    assert latest.startswith("w0 w1")
+    assert packed["report"]["latest_message_truncated"]
+    assert packed["report"]["history_dropped"] == 1
+
+
+def test_snippets_are_ranked_by_distance_within_their_share():
+    builder = make_builder(max_tokens=100, knowledge_share=0.5)
+    snippets = [
+        {"content": "far " * 10, "distance": 0.9},
+        {"content": "unscored " * 10},
+        {"content": "near " * 10, "distance": 0.1},
+        {"content": "middle " * 10, "distance": 0.5},
+        {"content": "huge " * 60, "distance": 0.2},
+    ]
+    packed = builder.pack([], snippets=snippets)
+    assert [s["content"].split()[0] for s in packed["snippets"]] == ["near", "middle", "far", "unscored"]
+    assert packed["report"]["snippets_dropped"] == 1
+    assert packed["report"]["knowledge"] == 40
+
+
+def test_history_keeps_the_newest_messages_in_order():
+    builder = make_builder(max_tokens=30)
+    history = [message(10, tag=f"m{n}-") for n in range(5)]
+    packed = builder.pack([], history=history)
+    assert [m["content"] for m in packed["history"]] == [m["content"] for m in history[2:]]
+
+
+def test_history_stops_at_the_first_message_that_does_not_fit():
+    builder = make_builder(max_tokens=25)
+    history = [message(2, tag="a"), message(20, tag="b"), message(10, tag="c")]
+    packed = builder.pack([], history=history)
+    assert [m["content"] for m in packed["history"]] == [history[2]["content"]]
+
+
+def test_report_accounts_for_every_token():
+    builder = make_builder(max_tokens=200, reserve_tokens=50, tokens_per_message=2)
+    packed = builder.pack(["system prompt here"], snippets=[{"content": "tip", "distance": 0.3}],
+                          history=[message(4), message(5)])
+    report = packed["report"]
+    assert report["budget"] == 150
+    assert report["required"] == 3
+    assert report["latest_message"] == 7
+    assert report["knowledge"] == 3
+    assert report["history"] == 6
+    assert report["total"] == 3 + 7 + 3 + 6
+    assert report["remaining"] == 150 - report["total"]
+
+
+def test_required_parts_count_against_the_budget():
+    builder = make_builder(max_tokens=20)
+    packed = builder.pack(["system prompt", "profile " * 10, "summary " * 10], history=[message(5)])
+    assert packed["required"][0] == "system prompt"
+    assert words(packed["required"][1]) == 10
+    assert abs(words(packed["required"][2]) - 8) <= 1
+    assert packed["report"]["required_truncated"]
+    assert packed["history"][0]["content"] == ""
+    assert packed["report"]["total"] <= 21
+
+
+def test_required_parts_that_fit_are_returned_unchanged():
+    builder = make_builder(max_tokens=20)
+    required = ["system prompt", "", "profile"]
+    packed = builder.pack(required, history=[message(5)])
+    assert packed["required"] == required
+    assert not packed["report"]["required_truncated"]
+    assert packed["report"]["required"] == 3
+
+
+def test_parts_past_a_full_budget_are_emptied():
+    packed = make_builder(max_tokens=5, tokens_per_message=1).pack(["one two three four five six", "profile"],
+                                                                   history=[message(3)])
+    assert packed["required"][0].startswith("one two three")
+    assert packed["required"][1] == ""
+    assert packed["report"]["required"] <= 4
+    assert packed["report"]["remaining"] >= 0
+
+
+def test_truncate_to_tokens():
+    assert truncate_to_tokens("a b c d", 10, words) == "a b c d"
+    assert truncate_to_tokens("a b c d", 0, words) == ""
+    assert words(truncate_to_tokens("aaaa bbbb cccc dddd", 2, words)) == 2
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from tests.fakes import HashEmbeddingFunction
+from utils.embeddings import EmbeddingCache, LocalEmbeddingFunction
+
+
+class FakeModel:
+    """Records forward passes in place of the ONNX model"""
+
+    def __init__(self, download_time=0.0):
+        self.calls = []
+        self.downloads = 0
+        self.download_time = download_time
+        self.embed = HashEmbeddingFunction(dim=8)
+
+    def _download_model_if_not_exists(self):
+        self.downloads += 1
+        time.sleep(self.download_time)
+
+    def _forward(self, texts, batch_size):
+        self.calls.append((list(texts), batch_size))
+        return np.stack(self.embed(texts)).astype(np.float32)
+
+
+@pytest.fixture
+def make_embedder(tmp_path):
+    def make(cache=True, **options):
+        embedder = LocalEmbeddingFunction(
+            cache_path=str(tmp_path / "cache" / "embeddings.sqlite3") if cache else None, **options
+        )
+        embedder._model = FakeModel()
+        return embedder
+    return make
+
+
+def test_only_uncached_texts_reach_the_model(make_embedder):
+    embedder = make_embedder(batch_size=16)
+    first = embedder.embed(["trust", "listen"])
+    second = embedder.embed(["listen", "repair", "repair", "trust"])
+    assert embedder._model.calls == [(["trust", "listen"], 16), (["repair"], 16)]
+    assert second.shape == (4, 8) and second.dtype == np.float32
+    np.testing.assert_array_equal(second[0], first[1])
+    np.testing.assert_array_equal(second[1], second[2])
+    assert (embedder.cache.hits, embedder.cache.misses) == (2, 3)
+
+
+def test_cache_persists_across_instances(make_embedder):
+    make_embedder().embed(["trust", "listen"])
+    reopened = make_embedder()
+    assert reopened.cache.count() == 2
+    reopened.embed(np.array(["trust", "listen"]))
+    assert reopened._model.calls == []
+
+
+def test_cache_keys_depend_on_the_model(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    assert EmbeddingCache(path, "model-a").key("trust") != EmbeddingCache(path, "model-b").key("trust")
+
+
+def test_without_a_cache_every_call_runs_the_model(make_embedder):
+    embedder = make_embedder(cache=False)
+    embedder(["trust"])
+    embedder(["trust"])
+    assert len(embedder._model.calls) == 2
+    assert embedder.embed([]).shape == (0, 0)
+
+
+def test_background_warmup_loads_the_model_once(make_embedder):
+    embedder = make_embedder(cache=False)
+    embedder.warmup(background=True)
+    embedder.warmup(background=True)
+    embedder._warmup_thread.join(5)
+    assert embedder._model.calls == [(["warmup"], 32)]
+    assert embedder._model.downloads == 1
+
+
+def test_queries_wait_for_the_warmup_instead_of_loading_again(make_embedder):
+    embedder = make_embedder(cache=False)
+    embedder._model = FakeModel(download_time=0.2)
+    embedder.warmup(background=True)
+    results = []
+    queries = [threading.Thread(target=lambda: results.append(embedder.embed(["trust"]))) for _ in range(3)]
+    for query in queries:
+        query.start()
+    for query in queries:
+        query.join(5)
+    embedder._warmup_thread.join(5)
+    assert embedder._model.downloads == 1
+    assert len(results) == 3
+    assert sorted(texts for texts, _ in embedder._model.calls) == [["trust"]] * 3 + [["warmup"]]
+
+
+def test_cache_evicts_the_oldest_entries(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path, "model", max_entries=3)
+    cache.put_many({cache.key(text): np.ones(4) for text in ("a", "b")})
+    cache.put_many({cache.key(text): np.ones(4) for text in ("b", "c", "d")})
+    assert cache.count() == 3
+    assert cache.evictions == 1
+    assert set(cache.get_many([cache.key(text) for text in "abcd"])) == {cache.key(text) for text in "bcd"}
+    # The count is read back when the cache is reopened
+    assert EmbeddingCache(path, "model", max_entries=3).count() == 3
+
+
+def test_model_is_pinned_to_the_cpu_provider():
+    embedder = LocalEmbeddingFunction(num_threads=2)
+    assert embedder._model.num_threads == 2
+    assert embedder._model._preferred_providers == ["CPUExecutionProvider"]
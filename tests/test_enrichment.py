@@ -0,0 +1,73 @@
+import threading
+
+from utils.enrichment import EnrichmentQueue
+
+
+def test_drain_waits_for_every_query():
+    handled = []
+    queue = EnrichmentQueue(handled.append, max_workers=2)
+    for i in range(10):
+        assert queue.submit(f"query {i}")
+    assert queue.drain(timeout=5)
+    assert sorted(handled) == sorted(f"query {i}" for i in range(10))
+    assert queue.get_stats()["completed"] == 10
+    assert queue.pending() == 0
+    queue.shutdown()
+
+
+def test_pending_duplicates_are_coalesced():
+    release = threading.Event()
+    handled = []
+
+    def handler(query):
+        release.wait(5)
+        handled.append(query)
+
+    queue = EnrichmentQueue(handler, max_workers=1)
+    assert queue.submit("love languages")
+    assert queue.submit("love languages")
+    release.set()
+    assert queue.drain(timeout=5)
+    assert handled == ["love languages"]
+    assert queue.get_stats()["duplicates"] == 1
+    queue.shutdown()
+
+
+def test_full_queue_rejects_submissions():
+    release = threading.Event()
+    started = threading.Event()
+
+    def handler(query):
+        started.set()
+        release.wait(5)
+
+    queue = EnrichmentQueue(handler, max_workers=1, max_pending=1)
+    assert queue.submit("running")
+    started.wait(5)
+    assert queue.submit("queued")
+    assert not queue.submit("rejected")
+    assert not queue.drain(timeout=0.05)
+    release.set()
+    assert queue.drain(timeout=5)
+    stats = queue.get_stats()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 2
+    queue.shutdown()
+
+
+def test_handler_errors_are_counted_and_drained():
+    def handler(query):
+        raise RuntimeError("search failed")
+
+    queue = EnrichmentQueue(handler, max_workers=1)
+    queue.submit("a")
+    queue.submit("b")
+    assert queue.drain(timeout=5)
+    assert queue.get_stats()["failed"] == 2
+    queue.shutdown()
+
+
+def test_closed_queue_refuses_work():
+    queue = EnrichmentQueue(lambda query: None)
+    queue.shutdown()
+    assert not queue.submit("late")
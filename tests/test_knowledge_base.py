@@ -0,0 +1,302 @@
+import threading
+import time
+
+import pytest
+
+WORDS = "trust partner listen feelings apology boundary support honest attention".split()
+
+
+def document(n_words, seed=0):
+    return " ".join(f"{WORDS[(i * 7 + seed) % len(WORDS)]}{i}-{seed}" for i in range(n_words))
+
+
+class SlowSearch:
+    """DuckDuckGo stand-in whose searches block until released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.queries = []
+
+    def text(self, query, max_results=3):
+        self.queries.append(query)
+        self.release.wait(5)
+        return [{"title": f"About {query}", "body": f"Couples who discuss {query} openly feel closer.",
+                 "link": f"https://example.com/{i}"} for i in range(max_results)]
+
+
+class NoSearch:
+    """DuckDuckGo stand-in that finds nothing"""
+
+    def text(self, query, max_results=3):
+        return []
+
+
+def count_adds(kb):
+    calls = []
+    add = kb.collection.add
+
+    def counting_add(**kwargs):
+        calls.append(len(kwargs["ids"]))
+        return add(**kwargs)
+
+    kb.collection.add = counting_add
+    return calls
+
+
+def test_add_document_writes_chunks_in_batches(make_kb):
+    kb = make_kb(batch_size=4)
+    calls = count_adds(kb)
+    kb.add_document(text=document(1500))
+    n_chunks = kb.collection.count()
+    assert n_chunks > 4
+    assert calls == [4] * (n_chunks // 4) + ([n_chunks % 4] if n_chunks % 4 else [])
+    metadatas = kb.collection.get(include=["metadatas"])["metadatas"]
+    assert sorted(metadata["chunk_index"] for metadata in metadatas) == list(range(n_chunks))
+    assert {metadata["total_chunks"] for metadata in metadatas} == {n_chunks}
+
+
+def test_add_documents_fills_batches_across_documents(make_kb):
+    kb = make_kb(batch_size=8)
+    calls = count_adds(kb)
+    doc_ids = kb.add_documents(texts=[document(50, seed) for seed in range(10)],
+                               metadatas=[{"n": n} for n in range(10)])
+    assert len(set(doc_ids)) == 10
+    assert calls == [8, 2]
+    assert kb.collection.count() == 10
+    assert sorted(m["n"] for m in kb.collection.get(include=["metadatas"])["metadatas"]) == list(range(10))
+
+
+def test_add_documents_checks_metadata_count(make_kb):
+    kb = make_kb()
+    try:
+        kb.add_documents(texts=["a", "b"], metadatas=[{}])
+    except ValueError:
+        return
+    raise AssertionError("expected ValueError")
+
+
+@pytest.mark.parametrize("backend", ["chroma", "quantized"])
+def test_reingesting_a_document_adds_nothing(make_kb, backend):
+    kb = make_kb(vector_backend=backend)
+    text = document(400)
+    first = kb.ingest_document(text=text)
+    count = kb.collection.count()
+    second = kb.ingest_document(text=text)
+    assert first["added"] == count > 0
+    assert second == {"doc_id": first["doc_id"], "added": 0, "skipped": count}
+    assert kb.collection.count() == count
+
+
+def test_chunks_labelled_by_the_caller_match_an_upload(make_kb, tmp_path):
+    text = document(400)
+    uploaded = make_kb(persist_directory=str(tmp_path / "uploaded"))
+    uploaded.ingest_document(text=text, metadata={"filename": "notes.txt"})
+    kb = make_kb(persist_directory=str(tmp_path / "kb"))
+    chunks = kb.chunker.chunk(text)
+    ids, metadatas = kb.label_chunks(kb._content_id(text, "notes.txt"), chunks, {"filename": "notes.txt"})
+    assert kb.add_chunks(ids, chunks, metadatas) == (len(chunks), 0)
+    assert kb.add_chunks(ids, chunks, metadatas) == (0, len(chunks))
+    assert stored_chunks(kb) == stored_chunks(uploaded)
+
+
+def test_same_text_from_different_sources_is_kept(make_kb):
+    kb = make_kb()
+    result = kb.ingest_documents(texts=["Listen first.", "Listen first."],
+                                 metadatas=[{"url": "https://a.example"}, {"url": "https://b.example"}])
+    assert result["added"] == 2
+    assert result["doc_ids"][0] != result["doc_ids"][1]
+
+
+def test_compact_removes_legacy_duplicates(make_kb):
+    kb = make_kb()
+    kb.collection.add(documents=["Say sorry  sincerely.", "Say sorry sincerely.", "Say thanks."],
+                      metadatas=[{"source": "local"}] * 3, ids=["old-1", "old-2", "old-3"])
+    assert kb.compact(page_size=2) == {"scanned": 3, "removed": 1}
+    assert sorted(kb.collection.get()["ids"]) == ["old-1", "old-3"]
+
+
+SENTENCES = " ".join(f"Sentence {n} is about how partners {WORDS[n % len(WORDS)]} each day." for n in range(60))
+
+
+def stored_chunks(kb):
+    result = kb.collection.get(include=["documents", "metadatas"])
+    return {chunk_id: (document, {key: value for key, value in metadata.items() if key != "ingested_at"})
+            for chunk_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"])}
+
+
+def add_legacy_chunks(kb, text, filename, size=120):
+    """Store text the way the word-list chunker did, before chunks recorded their chunking"""
+    from utils.chunking import content_id
+    chunks, current = [], []
+    for word in text.split():
+        if current and len(" ".join(current + [word])) > size:
+            chunks.append(" ".join(current))
+            current = []
+        current.append(word)
+    chunks.append(" ".join(current))
+    doc_id = content_id(text, filename)
+    kb.collection.add(documents=chunks, ids=[content_id(chunk, filename) for chunk in chunks], metadatas=[
+        {"filename": filename, "file_type": "text", "doc_id": doc_id, "chunk_index": i, "total_chunks": len(chunks)}
+        for i in range(len(chunks))
+    ])
+
+
+def test_rechunk_migrates_legacy_chunks(make_kb, tmp_path):
+    kb = make_kb(chunk_size=200, chunk_overlap=60)
+    add_legacy_chunks(kb, SENTENCES, "notes.txt")
+    kb.ingest_documents(texts=["Web advice on trust."], metadatas=[{"source": "web", "url": "https://example.com"}])
+    web = kb.collection.get(where={"source": "web"})["ids"]
+    result = kb.rechunk(page_size=7)
+    assert result["documents"] == 1
+    assert result["removed"] > 0
+
+    fresh = make_kb(persist_directory=str(tmp_path / "fresh"), chunk_size=200, chunk_overlap=60)
+    fresh.ingest_document(text=SENTENCES, metadata={"filename": "notes.txt", "file_type": "text"})
+    migrated = {chunk_id: chunk for chunk_id, chunk in stored_chunks(kb).items() if chunk_id not in web}
+    assert migrated == stored_chunks(fresh)
+    # Web snippets are left alone, and a second run has nothing to do
+    assert set(web) <= set(stored_chunks(kb))
+    assert kb.rechunk()["documents"] == 0
+
+
+def test_rechunk_follows_changed_settings(make_kb, tmp_path):
+    path = str(tmp_path / "kb")
+    text = SENTENCES.replace(" Sentence 30", "\n\nSentence 30")
+    make_kb(persist_directory=path, chunk_size=300, chunk_overlap=120).ingest_document(text=text)
+    kb = make_kb(persist_directory=path, chunk_size=500, chunk_overlap=0)
+    kb.rechunk()
+
+    fresh = make_kb(persist_directory=str(tmp_path / "fresh"), chunk_size=500, chunk_overlap=0)
+    fresh.ingest_document(text=text)
+    assert stored_chunks(kb) == stored_chunks(fresh)
+    assert kb.search_similar("partners listen", n_results=1)[0]["metadata"]["chunking"] == "sentences:chars:500:0"
+
+
+def count_queries(kb):
+    calls = []
+    query = kb.collection.query
+
+    def counting_query(**kwargs):
+        calls.append(len(kwargs["query_embeddings"]))
+        return query(**kwargs)
+
+    kb.collection.query = counting_query
+    return calls
+
+
+def test_search_batch_sends_uncached_queries_together(make_kb):
+    kb = make_kb()
+    kb.ingest_documents(texts=["Listen without interrupting.", "Apologize specifically.", "Plan date nights."])
+    calls = count_queries(kb)
+    cached = kb.search_similar("date nights", n_results=1)
+    batch = kb.search_similar_batch(["Date  nights", "apology", "listening", "apology"], n_results=1)
+    assert calls == [1, 2]
+    assert batch[0] == cached
+    assert batch[1] == batch[3]
+
+
+def test_batch_context_merges_overlapping_hits(make_kb):
+    kb = make_kb(min_relevance=0.0)
+    kb.ingest_documents(texts=["Listen without interrupting.", "Apologize specifically."])
+    context = kb.get_relevant_context_batch(["listening", "apology"], include_web_search=False)
+    assert context.count("Listen without interrupting.") == 1
+    assert context.count("Apologize specifically.") == 1
+
+
+def test_story_context_uses_one_batched_lookup(make_kb):
+    from utils.story import StoryManager
+    kb = make_kb(ddgs_factory=NoSearch, min_relevance=0.0)
+    kb.ingest_document(text="Couples who share feelings feel closer.")
+    calls = count_queries(kb)
+    context = StoryManager().build_context("We keep arguing about chores", [], None, kb)
+    assert calls == [4]
+    assert context.count("Couples who share feelings feel closer.") == 1
+
+
+def test_background_enrichment_does_not_block_retrieval(make_kb):
+    search = SlowSearch()
+    kb = make_kb(ddgs_factory=lambda: search)
+
+    start = time.perf_counter()
+    assert kb.get_relevant_context("trust after an argument") == ""
+    assert time.perf_counter() - start < 1.0
+    assert not kb.flush_enrichment(timeout=0.05)
+
+    search.release.set()
+    assert kb.flush_enrichment(timeout=30)
+    assert search.queries == ["trust after an argument"]
+    assert "[Web Source]" in kb.get_relevant_context("trust after an argument", include_web_search=False)
+
+
+def test_web_results_keep_their_links(make_kb):
+    kb = make_kb()
+    results = kb.search_web("love languages", max_results=2)
+    assert [r["link"] for r in results] == [
+        "https://example.com/love-languages/1", "https://example.com/love-languages/2"
+    ]
+
+
+def test_strong_local_hits_skip_the_web(make_kb):
+    search = SlowSearch()
+    search.release.set()
+    kb = make_kb(ddgs_factory=lambda: search)
+    kb.ingest_document(text="Apologize specifically and name what you did.")
+    report = []
+    docs = kb.get_relevant_documents(["apologize specifically and name what you did"], background=False,
+                                     report=report)
+    assert search.queries == []
+    assert docs[0]["relevance"] > 0.9
+    assert report[0]["best_relevance"] == pytest.approx(docs[0]["relevance"], abs=1e-4)
+    assert (report[0]["web_search"], report[0]["kept"], report[0]["dropped"]) == (False, 1, 0)
+
+
+def test_weak_local_hits_go_to_the_web_and_search_again(make_kb):
+    search = SlowSearch()
+    search.release.set()
+    kb = make_kb(ddgs_factory=lambda: search)
+    kb.ingest_document(text="Plan regular date nights.")
+    report = []
+    docs = kb.get_relevant_documents(["jealousy"], background=False, report=report)
+    assert search.queries == ["jealousy"]
+    assert report[0]["web_search"] is True
+    assert report[0]["best_relevance"] < kb.web_search_threshold
+    # The second search finds the stored web results
+    assert docs and all(doc["metadata"]["source"] == "web" for doc in docs)
+
+
+def test_snippets_below_min_relevance_are_dropped(make_kb):
+    kb = make_kb(min_relevance=0.5)
+    kb.ingest_documents(texts=["Trust grows through small kept promises.", "Plan regular date nights."])
+    report = []
+    docs = kb.get_relevant_documents(["trust grows through small kept promises"], include_web_search=False,
+                                     report=report)
+    assert [doc["content"] for doc in docs] == ["Trust grows through small kept promises."]
+    assert report[0]["kept"] == 1 and report[0]["dropped"] == 1
+
+
+@pytest.mark.parametrize("space, distance, relevance", [
+    ("l2", 0.0, 1.0), ("l2", 1.0, 0.5), ("l2", 4.0, 0.0),
+    ("cosine", 0.25, 0.75), ("ip", 1.5, 0.0),
+])
+def test_relevance_follows_the_collection_space(make_kb, monkeypatch, space, distance, relevance):
+    kb = make_kb()
+    monkeypatch.setattr(type(kb), "_space", space)
+    assert kb._relevance(distance) == pytest.approx(relevance)
+    assert kb._relevance(None) == 0.0
+
+
+@pytest.mark.parametrize("backend", ["chroma", "quantized"])
+def test_search_ranks_and_filters_the_same_on_both_backends(make_kb, backend):
+    kb = make_kb(vector_backend=backend, min_relevance=0.0)
+    kb.ingest_documents(
+        texts=["Listening builds closeness.", "Apologize specifically.", "Web advice on listening."],
+        metadatas=[None, {"filename": "guide.pdf"}, {"source": "web", "url": "https://example.com"}]
+    )
+    assert kb.search_similar("listening builds closeness", n_results=1)[0]["content"] == "Listening builds closeness."
+    assert [doc["content"] for doc in kb.search_similar("listening", source="web")] == ["Web advice on listening."]
+    assert [doc["content"] for doc in kb.search_similar("apologize", filename="guide.pdf")] == ["Apologize specifically."]
+
+
+def test_unknown_backend_is_rejected(make_kb):
+    with pytest.raises(ValueError):
+        make_kb(vector_backend="faiss")
@@ -0,0 +1,172 @@
+import pytest
+
+from utils.context_builder import ContextBuilder
+from utils.knowledge_base import KnowledgeBaseManager
+from utils.lexical_index import BM25Index, tokenize
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("How do I rebuild TRUST, after it's broken?") == ["do", "rebuild", "trust", "after", "s", "broken"]
+
+
+def test_rare_terms_outrank_common_ones():
+    index = BM25Index()
+    index.add(["a", "b", "c"], ["trust trust talk", "talk talk listen", "gottman repair talk"])
+    assert [doc_id for doc_id, _ in index.search("gottman talk")] == ["c", "b", "a"]
+    assert index.search("unknown") == []
+    assert index.search("the and") == []
+
+
+def test_index_updates_incrementally():
+    index = BM25Index()
+    index.add(["a", "b"], ["trust issues", "date night ideas"])
+    index.add(["a"], ["weekly check-in"])
+    assert len(index) == 2
+    assert index.search("trust") == []
+    assert index.search("check")[0][0] == "a"
+    index.remove(["a", "missing"])
+    assert "a" not in index
+    assert index.total_length == 3
+    assert "check" not in index.postings
+
+
+def test_search_filters_on_metadata_fields():
+    index = BM25Index()
+    index.add(["w", "l", "f"], ["trust"] * 3,
+              [{"source": "web"}, None, {"filename": "guide.pdf", "source": "upload"}])
+    assert [doc_id for doc_id, _ in index.search("trust", filters={"source": "local"})] == ["l"]
+    assert [doc_id for doc_id, _ in index.search("trust", filters={"filename": "guide.pdf"})] == ["f"]
+
+
+@pytest.mark.parametrize("filters, where", [
+    ({}, None),
+    ({"source": "web"}, {"source": "web"}),
+    ({"source": "local"}, {"source": {"$ne": "web"}}),
+    ({"source": "local", "filename": "a.pdf"}, {"$and": [{"source": {"$ne": "web"}}, {"filename": "a.pdf"}]}),
+])
+def test_filters_translate_to_chroma_where(filters, where):
+    assert KnowledgeBaseManager._chroma_where(filters) == where
+
+
+def test_reciprocal_rank_fusion_order(make_kb):
+    kb = make_kb(rrf_k=60)
+    vector = [[{"id": "a", "content": "A"}, {"id": "b", "content": "B"}, {"id": "c", "content": "C"}]]
+    keyword = [[("b", 5.0), ("c", 3.0)]]
+    fused = kb._fuse(vector, keyword, n_results=3, query_embeddings=[None])[0]
+    assert [doc["id"] for doc in fused] == ["b", "c", "a"]
+    assert fused[0]["score"] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[2]["bm25"] is None
+    assert fused[1]["bm25"] == 3.0
+
+
+def test_keyword_only_hits_are_fetched_from_the_collection(make_kb):
+    kb = make_kb()
+    kb.ingest_documents(texts=["Gottman's four horsemen predict divorce."], metadatas=[{"source": "web"}])
+    chunk_id = kb.collection.get()["ids"][0]
+    query_embeddings = kb._embed_queries(["Gottman's four horsemen predict divorce."])
+    fused = kb._fuse([[]], [[(chunk_id, 2.0)]], n_results=3, query_embeddings=query_embeddings)[0]
+    assert fused[0]["content"].startswith("Gottman")
+    # Scored against the query like a vector hit would be
+    assert fused[0]["distance"] == pytest.approx(0.0, abs=1e-5)
+    assert fused[0]["metadata"]["source"] == "web"
+
+
+def test_hybrid_search_finds_exact_terms_and_respects_filters(make_kb):
+    kb = make_kb()
+    kb.ingest_documents(
+        texts=["Listening builds closeness.", "The Gottman method names four horsemen.", "Gottman on the web."],
+        metadatas=[None, {"filename": "gottman.pdf"}, {"source": "web", "url": "https://example.com"}]
+    )
+    results = kb.search_similar("gottman", n_results=3)
+    assert {"score", "distance", "bm25"} <= set(results[0])
+    assert "Gottman" in results[0]["content"]
+    assert [r["content"] for r in kb.search_similar("gottman", source="web")] == ["Gottman on the web."]
+    assert all(r["metadata"].get("source") != "web" for r in kb.search_similar("gottman", source="local"))
+    assert [r["metadata"]["filename"] for r in kb.search_similar("gottman", filename="gottman.pdf")] == ["gottman.pdf"]
+
+
+def test_persisted_index_loads_without_the_corpus(tmp_path):
+    path = str(tmp_path / "lexical.sqlite3")
+    index = BM25Index(path=path)
+    index.add(["a", "b", "c"], ["trust trust talk", "talk talk listen", "gottman repair talk"],
+              [None, {"source": "web"}, {"filename": "guide.pdf"}])
+    index.remove(["b"])
+    expected = index.search("gottman talk trust")
+    loaded = BM25Index(path=path)
+    assert loaded.stored_count() == 2
+    assert loaded.load() == 2
+    assert loaded.search("gottman talk trust") == expected
+    assert loaded.total_length == index.total_length
+    assert [doc_id for doc_id, _ in loaded.search("repair", filters={"filename": "guide.pdf"})] == ["c"]
+    loaded.clear()
+    assert BM25Index(path=path).stored_count() == 0
+
+
+def test_index_without_a_path_is_memory_only():
+    index = BM25Index()
+    index.add(["a"], ["trust"])
+    assert index.stored_count() is None
+    assert index.load() == 0
+    assert len(index) == 0
+
+
+def test_index_loads_in_the_background_then_stays_current(make_kb):
+    kb = make_kb()
+    kb.ingest_document(text="Weekly check-ins help.")
+    assert kb._lexical() is kb.lexical_index
+    assert len(kb.lexical_index) == 1
+    kb.ingest_document(text="Gratitude journals help too.")
+    assert len(kb.lexical_index) == 2
+    assert kb.lexical_index.stored_count() == 2
+    assert kb.search_similar("gratitude")[0]["bm25"] is not None
+
+
+def test_reopened_store_loads_the_persisted_index(make_kb, caplog):
+    kb = make_kb()
+    kb.ingest_documents(texts=["Weekly check-ins help.", "Gratitude journals help too."])
+    kb._lexical()
+    with caplog.at_level("INFO", logger="lovebot.kb"):
+        reopened = make_kb(persist_directory=kb.persist_directory)
+        assert len(reopened._lexical()) == 2
+    assert "Loaded BM25 index (2 chunks)" in caplog.text
+
+
+def test_out_of_sync_index_is_rebuilt_from_the_collection(make_kb, caplog):
+    kb = make_kb()
+    kb.ingest_documents(texts=["Weekly check-ins help.", "Gratitude journals help too."])
+    kb._lexical()
+    # As if the process died between the Chroma write and the index write
+    kb.lexical_index._store("DELETE FROM chunks WHERE rowid = (SELECT MIN(rowid) FROM chunks)", None)
+    with caplog.at_level("INFO", logger="lovebot.kb"):
+        reopened = make_kb(persist_directory=kb.persist_directory)
+        assert len(reopened._lexical()) == 2
+    assert "Rebuilt BM25 index (2 chunks)" in caplog.text
+    assert reopened.lexical_index.stored_count() == 2
+
+
+def test_results_cached_during_the_load_are_invalidated(make_kb):
+    kb = make_kb()
+    kb.ingest_document(text="The Gottman method names four horsemen.")
+    kb._lexical()
+    # Simulate a load that is still running
+    kb._lexical_loaded = False
+    with kb._lexical_lock:
+        during = kb.search_similar("gottman")
+    assert "bm25" not in during[0]
+    assert kb._lexical() is kb.lexical_index
+    assert kb.search_similar("gottman")[0]["bm25"] is not None
+
+
+def test_hybrid_search_can_be_disabled(make_kb):
+    kb = make_kb(hybrid_search=False)
+    kb.ingest_document(text="Weekly check-ins help.")
+    result = kb.search_similar("check-ins")[0]
+    assert kb.lexical_index is None
+    assert "score" not in result
+
+
+def test_context_builder_prefers_fused_scores():
+    builder = ContextBuilder(max_tokens=1000, reserve_tokens=0, counter=lambda text: 1)
+    snippets = [{"content": "d", "distance": 0.1}, {"content": "low", "score": 0.01},
+                {"content": "high", "score": 0.03}, {"content": "none"}]
+    assert [s["content"] for s in builder.pack([], snippets)["snippets"]] == ["high", "low", "d", "none"]
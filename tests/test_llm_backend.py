@@ -0,0 +1,192 @@
+import time
+
+import pytest
+
+from tests.fakes import DEFAULT_FAKE_RESPONSE, FakeLLMServer, MockProvider
+from utils import llm_backend, llm_client
+from utils.llm_backend import AnthropicProvider, LLMRouter, OpenAICompatibleProvider
+from utils.llm_client import LLMError
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def stats_by_name(router):
+    return {stats["provider"]: stats for stats in router.get_stats()}
+
+
+def test_complete_fails_over_to_next_provider():
+    broken = MockProvider("broken", failures=-1)
+    healthy = MockProvider("healthy", response_text="from healthy")
+    router = LLMRouter([broken, healthy])
+    assert router.complete(MESSAGES) == "from healthy"
+    stats = stats_by_name(router)
+    assert stats["broken"]["failures"] == 1
+    assert stats["broken"]["cooling_down"]
+    assert stats["healthy"]["failures"] == 0
+
+
+def test_cooling_down_provider_is_tried_last():
+    flaky = MockProvider("flaky", failures=1)
+    healthy = MockProvider("healthy")
+    router = LLMRouter([flaky, healthy], cooldown=60)
+    router.complete(MESSAGES)
+    router.complete(MESSAGES)
+    # The second request went straight to the healthy provider
+    assert len(flaky.calls) == 1
+    assert len(healthy.calls) == 2
+
+
+def test_provider_returns_after_cooldown():
+    flaky = MockProvider("flaky", failures=1)
+    router = LLMRouter([flaky, MockProvider("healthy")], cooldown=0.05)
+    router.complete(MESSAGES)
+    time.sleep(0.1)
+    assert not stats_by_name(router)["flaky"]["cooling_down"]
+
+
+def test_cooldown_doubles_with_consecutive_failures():
+    router = LLMRouter([MockProvider("broken", failures=-1)], cooldown=1.0, max_cooldown=3.0)
+    state = router._states[0]
+    durations = []
+    for _ in range(3):
+        with pytest.raises(LLMError):
+            router.complete(MESSAGES)
+        durations.append(state.cooldown_until - time.monotonic())
+    assert durations[0] == pytest.approx(1.0, abs=0.1)
+    assert durations[1] == pytest.approx(2.0, abs=0.1)
+    assert durations[2] == pytest.approx(3.0, abs=0.1)
+
+
+def test_all_providers_failing_raises():
+    router = LLMRouter([MockProvider("a", failures=-1), MockProvider("b", failures=-1)])
+    with pytest.raises(LLMError, match="All LLM providers failed"):
+        router.complete(MESSAGES)
+
+
+def test_routes_to_lowest_latency_provider():
+    slow = MockProvider("slow", latency=0.05)
+    fast = MockProvider("fast")
+    router = LLMRouter([slow, fast])
+    # The first two requests measure both providers
+    router.complete(MESSAGES)
+    router.complete(MESSAGES)
+    for _ in range(3):
+        router.complete(MESSAGES)
+    assert len(slow.calls) == 1
+    assert len(fast.calls) == 4
+
+
+def test_complete_fails_over_at_request_deadline():
+    hung = MockProvider("hung", latency=2.0)
+    router = LLMRouter([hung, MockProvider("healthy")], request_timeout=0.1)
+    start = time.perf_counter()
+    assert router.complete(MESSAGES) == DEFAULT_FAKE_RESPONSE
+    assert time.perf_counter() - start < 1.0
+    assert "No response" in stats_by_name(router)["hung"]["last_error"]
+
+
+def test_stream_fails_over_before_first_token():
+    router = LLMRouter([MockProvider("broken", failures=-1), MockProvider("healthy")])
+    assert "".join(router.stream(MESSAGES)) == DEFAULT_FAKE_RESPONSE
+
+
+def test_stream_fails_over_at_first_token_deadline():
+    hung = MockProvider("hung", latency=2.0)
+    router = LLMRouter([hung, MockProvider("healthy")], first_token_timeout=0.1)
+    start = time.perf_counter()
+    assert "".join(router.stream(MESSAGES)) == DEFAULT_FAKE_RESPONSE
+    assert time.perf_counter() - start < 1.0
+
+
+def test_stream_does_not_fail_over_after_first_token():
+    class BreaksMidStream(MockProvider):
+        def stream(self, messages, **params):
+            yield "partial "
+            raise LLMError("connection reset")
+
+    backup = MockProvider("backup")
+    router = LLMRouter([BreaksMidStream("breaks"), backup])
+    tokens = []
+    with pytest.raises(LLMError, match="connection reset"):
+        for token in router.stream(MESSAGES):
+            tokens.append(token)
+    assert tokens == ["partial "]
+    assert backup.calls == []
+
+
+def test_router_exposes_groq_client_surface():
+    router = LLMRouter([MockProvider("mock")])
+    response = router.chat.completions.create(messages=MESSAGES, model="ignored")
+    assert response.choices[0].message.content == DEFAULT_FAKE_RESPONSE
+    chunks = router.chat.completions.create(messages=MESSAGES, model="ignored", stream=True)
+    assert "".join(chunk.choices[0].delta.content for chunk in chunks) == DEFAULT_FAKE_RESPONSE
+
+
+@pytest.fixture
+def fresh_clients(monkeypatch):
+    monkeypatch.setattr(llm_client, "_clients", {})
+    monkeypatch.setattr(llm_backend, "_routers", {})
+    for name in ("GROQ_API_KEY", "ANTHROPIC_API_KEY", "OPENAI_API_KEY", "LOVEBOT_LLM_BASE_URL",
+                 "LOVEBOT_LLM_MAX_RETRIES", "LOVEBOT_ROUTED_MAX_RETRIES"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_http_providers_fail_over_without_retrying(fresh_clients):
+    with FakeLLMServer(failures=[503, 503]) as down, FakeLLMServer(response_text="from anthropic") as up:
+        openai = OpenAICompatibleProvider("openai", "key", "m", down.base_url, max_retries=0)
+        anthropic = AnthropicProvider("key", base_url=up.base_url, max_retries=0)
+        router = LLMRouter([openai, anthropic])
+        assert router.complete(MESSAGES) == "from anthropic"
+        assert "".join(router.stream(MESSAGES)) == "from anthropic"
+    assert len(down.requests) == 1
+    assert up.requests[0]["messages"] == MESSAGES
+
+
+def test_anthropic_payload_moves_system_prompt_and_merges_turns(fresh_clients):
+    provider = AnthropicProvider("key", base_url="http://127.0.0.1:9")
+    payload = provider._payload([
+        {"role": "system", "content": "Be kind."},
+        {"role": "assistant", "content": "Hi!"},
+        {"role": "user", "content": "One."},
+        {"role": "user", "content": "Two."},
+    ], {"temperature": 0.2}, stream=True)
+    assert payload["system"] == "Be kind."
+    assert payload["messages"] == [
+        {"role": "user", "content": "(conversation continues)"},
+        {"role": "assistant", "content": "Hi!"},
+        {"role": "user", "content": "One.\n\nTwo."},
+    ]
+    assert payload["temperature"] == 0.2 and payload["stream"]
+
+
+def test_shared_router_includes_providers_with_keys(fresh_clients, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "openai-key")
+    router = llm_backend.get_shared_router(groq_key="groq-key")
+    assert [provider.name for provider in router.providers] == ["groq", "openai"]
+    assert llm_backend.get_shared_router(groq_key="groq-key") is router
+    monkeypatch.delenv("OPENAI_API_KEY")
+    with pytest.raises(LLMError, match="API key not set"):
+        llm_backend.get_shared_router()
+
+
+
+def test_routed_providers_fail_fast_but_a_lone_one_retries(fresh_clients, monkeypatch):
+    monkeypatch.setenv("LOVEBOT_LLM_REQUEST_TIMEOUT", "7")
+    routed = llm_backend.get_shared_router(groq_key="groq-key", openai_key="openai-key")
+    assert [provider.client.max_retries for provider in routed.providers] == [0, 0]
+    assert routed.providers[0].client.http.timeout.read == 7.0
+    assert routed.request_timeout == 7.0
+    lone = llm_backend.get_shared_router(groq_key="other-key")
+    assert lone.providers[0].client.max_retries == 3
+    assert lone.request_timeout is None and lone.first_token_timeout is None
+
+
+def test_lone_slow_provider_is_not_cut_off_by_a_deadline(fresh_clients, monkeypatch):
+    monkeypatch.setenv("LOVEBOT_LLM_REQUEST_TIMEOUT", "0.1")
+    monkeypatch.setenv("LOVEBOT_LLM_FIRST_TOKEN_TIMEOUT", "0.1")
+    with FakeLLMServer(response_text="worth the wait", delay=0.3) as server:
+        monkeypatch.setenv("LOVEBOT_LLM_BASE_URL", server.base_url)
+        router = llm_backend.get_shared_router(groq_key="groq-key")
+        assert router.complete(MESSAGES) == "worth the wait"
+        assert "".join(router.stream(MESSAGES)) == "worth the wait"
+    assert len(server.requests) == 2
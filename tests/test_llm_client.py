@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from tests.fakes import DEFAULT_FAKE_RESPONSE, FakeLLMServer
+from utils import llm_client
+from utils.llm_client import LLMClient, LLMError, RequestLimiter, TokenBucket
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+def make_client(server, **options):
+    options.setdefault("limiter", RequestLimiter(max_concurrent=8))
+    options.setdefault("backoff_base", 0.01)
+    return LLMClient(api_key="test", base_url=server.base_url, **options)
+
+
+def test_complete_returns_content(llm_server):
+    response = make_client(llm_server).chat.completions.create(messages=MESSAGES, model="m")
+    assert response.choices[0].message.content == DEFAULT_FAKE_RESPONSE
+    assert llm_server.requests[0]["messages"] == MESSAGES
+
+
+def test_stream_yields_tokens_in_order(llm_server):
+    chunks = make_client(llm_server).chat.completions.create(messages=MESSAGES, model="m", stream=True)
+    tokens = [chunk.choices[0].delta.content for chunk in chunks]
+    assert len(tokens) > 1
+    assert "".join(tokens) == DEFAULT_FAKE_RESPONSE
+
+
+def test_retries_transient_errors_then_succeeds():
+    with FakeLLMServer(failures=[429, 503]) as server:
+        client = make_client(server, max_retries=3)
+        response = client.chat.completions.create(messages=MESSAGES, model="m")
+    assert response.choices[0].message.content == DEFAULT_FAKE_RESPONSE
+    assert len(server.requests) == 3
+    assert client.retries == 2
+
+
+def test_gives_up_after_max_retries():
+    with FakeLLMServer(failures=[503] * 5) as server:
+        client = make_client(server, max_retries=2)
+        with pytest.raises(LLMError) as error:
+            client.chat.completions.create(messages=MESSAGES, model="m")
+    assert error.value.status_code == 503
+    assert len(server.requests) == 3
+
+
+def test_client_errors_are_not_retried():
+    with FakeLLMServer(failures=[400]) as server:
+        with pytest.raises(LLMError) as error:
+            make_client(server, max_retries=3).chat.completions.create(messages=MESSAGES, model="m")
+    assert error.value.status_code == 400
+    assert len(server.requests) == 1
+
+
+def test_timeout_raises_llm_error():
+    with FakeLLMServer(delay=1.0) as server:
+        client = make_client(server, timeout=0.2, max_retries=0)
+        start = time.perf_counter()
+        with pytest.raises(LLMError):
+            client.chat.completions.create(messages=MESSAGES, model="m")
+    assert time.perf_counter() - start < 0.9
+
+
+def test_backoff_honours_retry_after_within_cap():
+    client = LLMClient(base_url="http://127.0.0.1:9", backoff_base=0.5, backoff_max=2.0)
+    assert client._backoff(0, retry_after="1.5") == 1.5
+    assert client._backoff(0, retry_after="30") == 2.0
+    # Full jitter stays within the exponential bound
+    assert all(0 <= client._backoff(3) <= 2.0 for _ in range(100))
+    client.close()
+
+
+def test_request_limiter_caps_concurrency():
+    limiter = RequestLimiter(max_concurrent=2)
+    with FakeLLMServer(delay=0.1) as server:
+        client = make_client(server, limiter=limiter)
+        threads = [threading.Thread(target=client.chat.completions.create, kwargs={"messages": MESSAGES, "model": "m"})
+                   for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert server.max_active <= 2
+    assert limiter.get_stats()["started"] == 6
+    assert limiter.get_stats()["in_flight"] == 0
+
+
+def test_request_limiter_rejects_when_no_slot_frees_up():
+    limiter = RequestLimiter(max_concurrent=1, acquire_timeout=0.05)
+    with limiter.slot():
+        with pytest.raises(LLMError):
+            with limiter.slot():
+                pass
+    assert limiter.get_stats()["rejected"] == 1
+
+
+def test_stream_holds_its_slot_until_finished(llm_server):
+    limiter = RequestLimiter(max_concurrent=1, acquire_timeout=0.05)
+    chunks = make_client(llm_server, limiter=limiter).chat.completions.create(
+        messages=MESSAGES, model="m", stream=True
+    )
+    next(chunks)
+    assert limiter.get_stats()["in_flight"] == 1
+    list(chunks)
+    assert limiter.get_stats()["in_flight"] == 0
+
+
+def test_token_bucket_allows_burst_then_paces():
+    bucket = TokenBucket(rate=20, burst=3)
+    start = time.perf_counter()
+    for _ in range(3):
+        assert bucket.acquire(timeout=0)
+    assert not bucket.acquire(timeout=0)
+    assert bucket.acquire(timeout=1)
+    assert time.perf_counter() - start >= 0.04
+
+
+def test_shared_client_is_reused_per_key_and_url(llm_server, monkeypatch):
+    monkeypatch.setattr(llm_client, "_clients", {})
+    monkeypatch.setenv("LOVEBOT_LLM_BASE_URL", llm_server.base_url)
+    client = llm_client.get_shared_client("key-a")
+    assert llm_client.get_shared_client("key-a") is client
+    assert llm_client.get_shared_client("key-b") is not client
+    assert client.base_url == llm_server.base_url
+
+
+def test_chat_manager_uses_the_shared_router(llm_server, monkeypatch):
+    from utils import llm_backend
+    from utils.chat import ChatManager
+    monkeypatch.setattr(llm_client, "_clients", {})
+    monkeypatch.setattr(llm_backend, "_routers", {})
+    monkeypatch.setenv("LOVEBOT_LLM_BASE_URL", llm_server.base_url)
+    chat = ChatManager()
+    chat.set_api_key("key")
+    assert chat.client.client is llm_backend.get_shared_router(groq_key="key")
+    assert chat.get_response("hello", MESSAGES) == DEFAULT_FAKE_RESPONSE
@@ -0,0 +1,197 @@
+import threading
+import time
+
+import pytest
+
+import cli
+from utils.maintenance import MaintenanceScheduler
+
+DAY = 86400
+
+
+def add_web(kb, texts, **times):
+    """Store web chunks and backdate their timestamps (seconds ago)"""
+    kb.ingest_documents(texts=texts, metadatas=[{"source": "web", "url": f"https://example.com/{i}"}
+                                                for i in range(len(texts))])
+    ids = web_ids(kb, texts)
+    now = time.time()
+    for field, ago in times.items():
+        values = ago if isinstance(ago, list) else [ago] * len(ids)
+        kb.collection.update(ids=ids, metadatas=[{field: now - value} for value in values])
+    return ids
+
+
+def web_ids(kb, texts):
+    found = kb.collection.get(where={"source": "web"}, include=["documents"])
+    by_text = dict(zip(found["documents"], found["ids"]))
+    return [by_text[text] for text in texts]
+
+
+def stored(kb):
+    return sorted(kb.collection.get(include=["documents"])["documents"])
+
+
+def test_old_web_chunks_are_evicted_by_age(make_kb):
+    kb = make_kb()
+    add_web(kb, ["Old advice about trust."], ingested_at=40 * DAY)
+    add_web(kb, ["Fresh advice about trust."], ingested_at=DAY)
+    report = kb.evict_web_chunks(max_age=30 * DAY)
+    assert report["evicted_age"] == 1
+    assert report["web_chunks"] == 1
+    assert stored(kb) == ["Fresh advice about trust."]
+
+
+def test_unused_web_chunks_are_evicted_when_idle(make_kb):
+    kb = make_kb()
+    add_web(kb, ["Read yesterday.", "Not read in weeks."], ingested_at=60 * DAY,
+            last_accessed_at=[DAY, 20 * DAY])
+    report = kb.evict_web_chunks(max_idle=7 * DAY)
+    assert report["evicted_idle"] == 1
+    assert stored(kb) == ["Read yesterday."]
+
+
+def test_least_recently_used_go_first_over_the_caps(make_kb):
+    kb = make_kb()
+    texts = ["Used an hour ago.", "Used a day ago.", "Used a week ago."]
+    add_web(kb, texts, last_accessed_at=[3600, DAY, 7 * DAY])
+    report = kb.evict_web_chunks(max_chunks=2)
+    assert report["evicted_size"] == 1
+    assert stored(kb) == ["Used a day ago.", "Used an hour ago."]
+    report = kb.evict_web_chunks(max_bytes=len("Used an hour ago."))
+    assert report["evicted_size"] == 1
+    assert report["web_bytes"] == len("Used an hour ago.")
+    assert stored(kb) == ["Used an hour ago."]
+
+
+def test_uploads_are_never_evicted(make_kb):
+    kb = make_kb()
+    kb.ingest_documents(
+        texts=["Uploaded guide on listening.", "Pasted note on apologies."],
+        metadatas=[{"filename": "guide.pdf", "file_type": "pdf", "source": "web"}, None]
+    )
+    kb.collection.update(ids=kb.collection.get()["ids"], metadatas=[{"ingested_at": 0.0}] * 2)
+    report = kb.evict_web_chunks(max_age=0, max_idle=0, max_bytes=0, max_chunks=0)
+    assert report["evicted_age"] == report["evicted_idle"] == report["evicted_size"] == 0
+    assert len(stored(kb)) == 2
+
+
+def test_unstamped_web_chunks_age_from_now(make_kb):
+    kb = make_kb()
+    kb.collection.add(documents=["Stored before timestamps."], metadatas=[{"source": "web"}], ids=["legacy"])
+    assert kb.evict_web_chunks(max_age=DAY)["evicted_age"] == 0
+    assert kb.collection.get(ids=["legacy"])["metadatas"][0]["ingested_at"] == pytest.approx(time.time(), abs=60)
+
+
+def test_access_counts_are_flushed_to_metadata(make_kb):
+    kb = make_kb(min_relevance=0.0)
+    [web_id] = add_web(kb, ["Couples who argue fairly stay together."])
+    kb.ingest_document(text="Couples who argue fairly stay together, says my notes.")
+    for _ in range(2):
+        kb.get_relevant_documents(["couples who argue fairly"], include_web_search=False)
+        kb.result_cache.clear()
+    assert kb.flush_access_stats() == 1
+    chunk_metadata = kb.collection.get(ids=[web_id])["metadatas"][0]
+    assert chunk_metadata["access_count"] == 2
+    assert chunk_metadata["last_accessed_at"] == pytest.approx(time.time(), abs=60)
+    # Counts accumulate across flushes, and a flush with nothing pending is a no-op
+    kb.get_relevant_documents(["couples who argue fairly"], include_web_search=False)
+    kb.flush_access_stats()
+    assert kb.flush_access_stats() == 0
+    assert kb.collection.get(ids=[web_id])["metadatas"][0]["access_count"] == 3
+
+
+def test_evicted_chunks_drop_their_pending_access(make_kb):
+    kb = make_kb(min_relevance=0.0)
+    add_web(kb, ["Stale advice on jealousy."], ingested_at=90 * DAY)
+    kb.get_relevant_documents(["jealousy"], include_web_search=False)
+    kb.evict_web_chunks(max_age=30 * DAY)
+    assert kb.flush_access_stats() == 0
+    assert kb.search_similar("jealousy") == []
+
+
+def test_run_maintenance_reports_evictions_and_duplicates(make_kb):
+    kb = make_kb(web_max_age=30 * DAY)
+    add_web(kb, ["Expired advice."], ingested_at=31 * DAY)
+    kb.collection.add(documents=["Be kind.", "Be kind."], metadatas=[{"source": "local"}] * 2, ids=["a", "b"])
+    report = kb.run_maintenance(vacuum=False)
+    assert report["evicted_age"] == 1
+    assert report["duplicates_removed"] == 1
+    assert report["vacuumed"] is False
+    assert {"bytes_before", "bytes_after", "reclaimed_bytes"} <= set(report)
+    assert stored(kb) == ["Be kind."]
+
+
+def test_maintain_command_prints_the_report(make_kb, tmp_path, capsys):
+    kb = make_kb()
+    add_web(kb, ["Expired advice."], ingested_at=31 * DAY)
+    cli.main(["maintain", "--path", str(tmp_path / "kb"), "--max-age-days", "30", "--no-vacuum"])
+    out = capsys.readouterr().out
+    assert "evicted 1 by age" in out
+    assert "(not vacuumed)" in out
+
+
+def test_scheduler_runs_the_job_until_stopped():
+    ran = threading.Event()
+    scheduler = MaintenanceScheduler(lambda: ran.set() or {"evicted": 0}, interval=0.01).start()
+    assert ran.wait(5)
+    scheduler.stop()
+    runs = scheduler.runs
+    time.sleep(0.05)
+    assert scheduler.runs == runs >= 1
+    assert scheduler.last_report == {"evicted": 0}
+
+
+def test_scheduler_survives_a_failing_run():
+    calls = []
+
+    def job():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("disk full")
+        return {"ok": True}
+
+    scheduler = MaintenanceScheduler(job, interval=60)
+    with pytest.raises(RuntimeError):
+        scheduler.run_now()
+    assert scheduler.last_error == "disk full"
+    assert scheduler.run_now() == {"ok": True}
+    assert scheduler.last_error is None
+    assert scheduler.runs == 1
+
+
+def test_scheduler_waits_for_the_initial_delay():
+    ran = threading.Event()
+    scheduler = MaintenanceScheduler(lambda: ran.set() or {}, interval=60, initial_delay=0.05).start()
+    assert not ran.is_set()
+    assert ran.wait(5)
+    scheduler.stop()
+
+
+def test_vacuum_compacts_the_store(make_kb):
+    kb = make_kb(web_max_age=0)
+    add_web(kb, [f"Web snippet {i} about trust and listening." for i in range(50)], ingested_at=DAY)
+    report = kb.run_maintenance()
+    assert report["evicted_age"] == 50
+    assert report["vacuumed"] is True
+
+
+@pytest.mark.parametrize("version", ["1.0.0", "0.4.24", "unknown"])
+def test_vacuum_is_skipped_on_untested_chromadb(make_kb, monkeypatch, caplog, version):
+    import chromadb
+    kb = make_kb()
+    monkeypatch.setattr(chromadb, "__version__", version)
+    with caplog.at_level("WARNING", logger="lovebot.kb"):
+        assert kb.vacuum() is False
+    assert f"not supported on chromadb {version}" in caplog.text
+    assert kb.run_maintenance()["vacuumed"] is False
+
+
+def test_maintenance_compacts_the_quantized_index(make_kb):
+    kb = make_kb(vector_backend="quantized", web_max_age=30 * DAY)
+    add_web(kb, ["Expired advice.", "Also expired."], ingested_at=31 * DAY)
+    kb.ingest_document(text="Uploaded notes on trust.")
+    report = kb.run_maintenance()
+    assert report["evicted_age"] == 2
+    assert report["vacuumed"] is True
+    assert kb.collection.get_stats()["vectors"] == 1
+    assert stored(kb) == ["Uploaded notes on trust."]
@@ -0,0 +1,185 @@
+import json
+import logging
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils import metrics
+from utils.enrichment import EnrichmentQueue
+from utils.metrics import BUCKETS, JsonFormatter, MetricsRegistry, request_context, request_id_var, span, timed
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+def test_samples_land_in_the_first_bucket_that_fits():
+    registry = MetricsRegistry()
+    for seconds in (0.001, 0.005, 0.007, 0.3, 100.0):
+        registry.observe("search", seconds)
+    histogram = registry._histograms["search"]
+    assert histogram.counts[BUCKETS.index(0.005)] == 2
+    assert histogram.counts[BUCKETS.index(0.01)] == 1
+    assert histogram.counts[BUCKETS.index(0.5)] == 1
+    # Slower than the last bound: only counted in +Inf
+    assert sum(histogram.counts) == 4
+    assert histogram.count == 5
+
+
+def test_summary_percentiles_cover_the_recent_window():
+    registry = MetricsRegistry(window=100)
+    for i in range(1, 201):
+        registry.observe("llm", i / 1000, error=i % 50 == 0)
+    [row] = registry.summary()
+    assert row["span"] == "llm"
+    assert row["count"] == 200
+    assert row["errors"] == 4
+    assert row["mean"] == pytest.approx(0.1005)
+    # Only samples 101..200 are still in the window
+    assert row["p50"] == pytest.approx(0.151)
+    assert row["p95"] == pytest.approx(0.196)
+
+
+def test_empty_registry_summary():
+    assert MetricsRegistry().summary() == []
+
+
+def test_prometheus_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    registry.observe("search", 0.004)
+    registry.observe("search", 0.2)
+    registry.observe("search", 60.0, error=True)
+    text = registry.render_prometheus()
+    lines = text.splitlines()
+    assert "# TYPE lovebot_span_seconds histogram" in lines
+    assert 'lovebot_span_seconds_bucket{span="search",le="0.005"} 1' in lines
+    assert 'lovebot_span_seconds_bucket{span="search",le="0.1"} 1' in lines
+    assert 'lovebot_span_seconds_bucket{span="search",le="0.25"} 2' in lines
+    assert 'lovebot_span_seconds_bucket{span="search",le="30.0"} 2' in lines
+    assert 'lovebot_span_seconds_bucket{span="search",le="+Inf"} 3' in lines
+    assert 'lovebot_span_seconds_count{span="search"} 3' in lines
+    assert 'lovebot_span_errors_total{span="search"} 1' in lines
+    assert text.endswith("\n")
+
+
+def test_span_records_successes_and_errors(registry):
+    with span("ok"):
+        pass
+    with pytest.raises(ValueError):
+        with span("broken"):
+            raise ValueError("bad")
+    rows = {row["span"]: row for row in registry.summary()}
+    assert rows["ok"]["count"] == 1 and rows["ok"]["errors"] == 0
+    assert rows["broken"]["count"] == 1 and rows["broken"]["errors"] == 1
+
+
+def test_timed_covers_functions_and_whole_generators(registry):
+    @timed("double")
+    def double(x):
+        return x * 2
+
+    @timed("count")
+    def count(n):
+        yield from range(n)
+
+    assert double(2) == 4
+    assert double.__name__ == "double"
+    stream = count(3)
+    # A generator's span only finishes once it has been consumed
+    assert [row["span"] for row in registry.summary()] == ["double"]
+    assert list(stream) == [0, 1, 2]
+    assert [row["span"] for row in registry.summary()] == ["count", "double"]
+
+
+def test_abandoned_generator_is_not_an_error(registry):
+    @timed("stream")
+    def stream():
+        yield 1
+        yield 2
+
+    tokens = stream()
+    next(tokens)
+    tokens.close()
+    [row] = registry.summary()
+    assert row["count"] == 1
+    assert row["errors"] == 0
+
+
+def test_json_log_lines_carry_the_request_id(registry):
+    records = []
+
+    class Capture(logging.Handler):
+        def emit(self, record):
+            records.append(JsonFormatter().format(record))
+
+    handler = Capture()
+    logger = logging.getLogger("lovebot")
+    previous = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    try:
+        with request_context("user/1234"):
+            with span("search", results=3):
+                pass
+        with span("outside"):
+            pass
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(previous)
+    first, second = (json.loads(line) for line in records)
+    assert first["request_id"] == "user/1234"
+    assert first["span"] == "search"
+    assert first["status"] == "ok"
+    assert first["results"] == 3
+    assert second["request_id"] is None
+
+
+def test_request_context_resets_after_the_block():
+    with request_context("outer"):
+        with request_context("inner"):
+            assert request_id_var.get() == "inner"
+        assert request_id_var.get() == "outer"
+    assert request_id_var.get() is None
+
+
+def test_enrichment_workers_inherit_the_submitting_request():
+    seen = []
+    queue = EnrichmentQueue(lambda query: seen.append((query, request_id_var.get())), max_workers=1)
+    with request_context("alice/1"):
+        queue.submit("first")
+    with request_context("bob/2"):
+        queue.submit("second")
+    queue.submit("third")
+    assert queue.drain(timeout=5)
+    queue.shutdown()
+    assert sorted(seen) == [("first", "alice/1"), ("second", "bob/2"), ("third", None)]
+
+
+def test_metrics_server_serves_prometheus_text():
+    registry = MetricsRegistry()
+    registry.observe("search", 0.01)
+    server = metrics.start_metrics_server(0, host="127.0.0.1", registry=registry)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert 'lovebot_span_seconds_count{span="search"} 1' in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"{url}/other", timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_metrics_server_listens_on_localhost_by_default():
+    server = metrics.start_metrics_server(0, registry=MetricsRegistry())
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,137 @@
+import io
+
+import pytest
+
+from utils.pdf_extract import iter_pdf_pages
+
+PAGES = [" ".join(f"page{page}word{i}" for i in range(150)) for page in range(4)]
+
+
+def write_pdf(path, pages):
+    canvas = pytest.importorskip("reportlab.pdfgen.canvas")
+    pdf = canvas.Canvas(str(path))
+    for page in pages:
+        text = pdf.beginText(40, 800)
+        for start in range(0, len(page), 90):
+            text.textLine(page[start:start + 90])
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+    return path
+
+
+class Upload(io.BytesIO):
+    """Minimal stand-in for a Streamlit UploadedFile"""
+
+    def __init__(self, path, name="guide.pdf", type="application/pdf"):
+        super().__init__(path.read_bytes())
+        self.name = name
+        self.type = type
+
+
+def words(text):
+    return " ".join(text.split())
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    return write_pdf(tmp_path / "guide.pdf", PAGES)
+
+
+def test_pages_are_yielded_in_order(pdf_path):
+    pages = list(iter_pdf_pages(str(pdf_path), workers=1))
+    assert [(index, total) for index, total, _ in pages] == [(i, 4) for i in range(4)]
+    assert [words(text).replace(" ", "") for _, _, text in pages] == [page.replace(" ", "") for page in PAGES]
+
+
+def test_process_pool_keeps_page_order(pdf_path):
+    serial = list(iter_pdf_pages(str(pdf_path), workers=1))
+    pooled = list(iter_pdf_pages(str(pdf_path), workers=2, pages_per_task=1, min_pages_for_pool=1))
+    assert pooled == serial
+
+
+def test_ingest_pdf_streams_chunks_in_batches(make_kb, pdf_path):
+    kb = make_kb(batch_size=2, pdf_workers=1)
+    progress = []
+    result = kb.ingest_document(file=Upload(pdf_path), progress_callback=lambda *p: progress.append(p))
+    assert progress == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert result["pages"] == 4
+    assert result["added"] == kb.collection.count() > 2
+
+    stored = kb.collection.get(include=["documents", "metadatas"])
+    by_index = sorted(zip(stored["metadatas"], stored["documents"]), key=lambda item: item[0]["chunk_index"])
+    assert [metadata["chunk_index"] for metadata, _ in by_index] == list(range(result["added"]))
+    assert all("total_chunks" not in metadata and metadata["doc_id"] == result["doc_id"]
+               for metadata, _ in by_index)
+    # Streaming gives the same chunks as chunking the whole text
+    full_text = "\n".join(text for _, _, text in iter_pdf_pages(str(pdf_path), workers=1))
+    assert [document for _, document in by_index] == kb._chunk_text(full_text)
+
+
+def test_reuploading_a_pdf_adds_nothing(make_kb, pdf_path):
+    kb = make_kb(pdf_workers=1)
+    first = kb.ingest_pdf(Upload(pdf_path))
+    second = kb.ingest_pdf(Upload(pdf_path))
+    assert second["doc_id"] == first["doc_id"]
+    assert second["added"] == 0
+    assert second["skipped"] == first["added"]
+
+
+def test_batch_and_single_uploads_store_the_same_pdf_chunks(make_kb, pdf_path, tmp_path):
+    def stored(kb):
+        result = kb.collection.get(include=["documents", "metadatas"])
+        return {chunk_id: (document, {key: value for key, value in metadata.items() if key != "ingested_at"})
+                for chunk_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"])}
+
+    single = make_kb(persist_directory=str(tmp_path / "single"), pdf_workers=1)
+    batch = make_kb(persist_directory=str(tmp_path / "batch"), pdf_workers=1)
+    doc_id = single.ingest_document(file=Upload(pdf_path))["doc_id"]
+    assert batch.add_documents(files=[Upload(pdf_path)]) == [doc_id]
+    assert stored(batch) == stored(single)
+    # Uploading again through either entry point adds nothing
+    assert single.ingest_documents(files=[Upload(pdf_path)])["added"] == 0
+    assert batch.ingest_document(file=Upload(pdf_path))["added"] == 0
+
+
+def test_pdf_without_text_is_rejected(make_kb, tmp_path):
+    kb = make_kb(pdf_workers=1)
+    with pytest.raises(ValueError, match="No content"):
+        kb.ingest_pdf(Upload(write_pdf(tmp_path / "blank.pdf", ["", ""])))
+
+
+def test_unreadable_pdf_is_reported(make_kb, tmp_path):
+    kb = make_kb(pdf_workers=1)
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    with pytest.raises(ValueError, match="Failed to extract text from PDF"):
+        kb.ingest_pdf(Upload(broken))
+
+
+def test_write_errors_are_not_reported_as_extraction_failures(make_kb, pdf_path, monkeypatch):
+    kb = make_kb(batch_size=2)
+
+    def failing_add(*args):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(kb, "add_chunks", failing_add)
+    with pytest.raises(RuntimeError, match="disk full"):
+        kb.ingest_pdf(Upload(pdf_path))
+
+
+def test_page_errors_are_logged_and_skipped(pdf_path, monkeypatch, caplog):
+    import PyPDF2
+    from utils import pdf_extract
+
+    extract_text = PyPDF2.PageObject.extract_text
+
+    def flaky(page):
+        if "page1word0" in extract_text(page):
+            raise ValueError("bad font")
+        return extract_text(page)
+
+    monkeypatch.setattr(PyPDF2.PageObject, "extract_text", flaky)
+    with caplog.at_level("WARNING", logger="lovebot.pdf"):
+        texts = pdf_extract.extract_page_range(str(pdf_path), 0, 4)
+    assert texts[1] == ""
+    assert all(texts[i] for i in (0, 2, 3))
+    assert "Error extracting text from page 1" in caplog.text
@@ -0,0 +1,95 @@
+from utils import knowledge_base
+from utils.knowledge_base import QueryCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(knowledge_base.time, "monotonic", clock)
+    cache = QueryCache(ttl=10)
+    cache.set("q", [1])
+    clock.now += 9
+    assert cache.get("q") == [1]
+    clock.now += 2
+    assert cache.get("q") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_no_ttl_keeps_entries(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(knowledge_base.time, "monotonic", clock)
+    cache = QueryCache(ttl=None)
+    cache.set("q", [1])
+    clock.now += 10 ** 6
+    assert cache.get("q") == [1]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_byte_cap_evicts_and_skips_oversized_values():
+    cache = QueryCache(max_bytes=10, sizeof=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "yyyy")
+    cache.set("c", "zzzz")
+    assert cache.get("a") is None
+    assert cache.get_stats()["bytes"] == 8
+    cache.set("big", "x" * 11)
+    assert cache.get("big") is None
+    assert cache.get("c") == "zzzz"
+
+
+def test_stats_report_hit_ratio():
+    cache = QueryCache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["hit_ratio"] == 2 / 3
+
+
+def test_search_results_are_cached_until_a_write(make_kb):
+    kb = make_kb()
+    kb.ingest_document(text="Weekly check-ins keep couples close.")
+    first = kb.search_similar("Weekly  CHECK-INS")
+    assert kb.search_similar("weekly check-ins") == first
+    assert kb.get_cache_stats()["results"]["hits"] == 1
+
+    kb.ingest_document(text="Shared hobbies build connection.")
+    assert kb.get_cache_stats()["results"]["entries"] == 0
+    assert len(kb.search_similar("weekly check-ins")) == 2
+    assert kb.get_cache_stats()["embeddings"]["hits"] == 1
+
+
+def test_query_racing_a_write_is_not_cached(make_kb):
+    kb = make_kb()
+    kb.ingest_document(text="Weekly check-ins keep couples close.")
+    query = kb.collection.query
+
+    def query_during_write(**kwargs):
+        results = query(**kwargs)
+        kb.collection.query = query
+        kb.ingest_document(text="Shared hobbies build connection.")
+        return results
+
+    kb.collection.query = query_during_write
+    assert len(kb.search_similar("check-ins")) == 1
+    assert kb.get_cache_stats()["results"]["entries"] == 0
+    assert len(kb.search_similar("check-ins")) == 2
@@ -0,0 +1,141 @@
+import pytest
+
+from tests.fakes import DEFAULT_FAKE_RESPONSE, FakeGroq
+from utils import response_cache
+from utils.chat import ChatManager
+from utils.response_cache import CachingClient, ResponseCache
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    def make(**options):
+        return ResponseCache(str(tmp_path / "responses.db"), **options)
+    return make
+
+
+def test_key_covers_model_messages_and_params():
+    key = ResponseCache.key("m", MESSAGES, {"temperature": 0.7, "top_p": 1})
+    assert key == ResponseCache.key("m", [dict(MESSAGES[0])], {"top_p": 1, "temperature": 0.7})
+    assert len(key) == 64
+    assert key != ResponseCache.key("other", MESSAGES, {"temperature": 0.7, "top_p": 1})
+    assert key != ResponseCache.key("m", [{"role": "user", "content": "hello!"}], {"temperature": 0.7, "top_p": 1})
+    assert key != ResponseCache.key("m", MESSAGES, {"temperature": 0.2, "top_p": 1})
+
+
+def test_entries_expire_after_ttl(make_cache, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    cache = make_cache(ttl=60)
+    cache.set("k", "answer", latency=1.0)
+    clock.now += 59
+    assert cache.get("k") == "answer"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(make_cache, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    cache = make_cache(max_entries=2)
+    for key in ("a", "b"):
+        clock.now += 1
+        cache.set(key, key, latency=0.1)
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("c", "c", latency=0.1)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" and cache.get("c") == "c"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_byte_cap_evicts_and_skips_oversized_responses(make_cache, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, "time", clock)
+    cache = make_cache(max_bytes=10)
+    for key in ("a", "b", "c"):
+        clock.now += 1
+        cache.set(key, "xxxx", latency=0.1)
+    assert cache.get("a") is None
+    assert cache.get_stats()["bytes"] == 8
+    cache.set("big", "x" * 11, latency=0.1)
+    assert cache.get("big") is None
+
+
+def test_entries_survive_reopening(make_cache):
+    make_cache().set("k", "answer", latency=0.5)
+    reopened = make_cache()
+    assert reopened.get_stats()["entries"] == 1
+    assert reopened.get("k") == "answer"
+
+
+def test_stats_report_hit_ratio_and_saved_latency(make_cache):
+    cache = make_cache()
+    cache.set("k", "answer", latency=2.0)
+    cache.get("k")
+    cache.get("missing")
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+    assert 1.9 < stats["saved_latency"] <= 2.0
+
+
+def test_caching_client_shares_entries_between_stream_and_plain_calls(make_cache):
+    fake = FakeGroq()
+    client = CachingClient(fake, make_cache())
+    streamed = "".join(chunk.choices[0].delta.content
+                       for chunk in client.chat.completions.create(messages=MESSAGES, model="m", stream=True))
+    plain = client.chat.completions.create(messages=MESSAGES, model="m")
+    replayed = list(client.chat.completions.create(messages=MESSAGES, model="m", stream=True))
+    assert streamed == plain.choices[0].message.content == DEFAULT_FAKE_RESPONSE
+    assert len(replayed) == 1 and replayed[0].choices[0].delta.content == DEFAULT_FAKE_RESPONSE
+    assert len(fake.calls) == 1
+
+
+def test_abandoned_streams_are_not_stored(make_cache):
+    cache = make_cache()
+    client = CachingClient(FakeGroq(), cache)
+    stream = client.chat.completions.create(messages=MESSAGES, model="m", stream=True)
+    next(stream)
+    stream.close()
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_cache_can_be_skipped_per_call(make_cache):
+    fake = FakeGroq()
+    chat = ChatManager(response_cache=make_cache())
+    chat.set_client(fake)
+    chat.get_response("hi", MESSAGES)
+    chat.get_response("hi", MESSAGES)
+    chat.get_response("hi", MESSAGES, use_cache=False)
+    assert len(fake.calls) == 2
+
+
+def test_chat_without_a_cache_always_asks_the_model():
+    fake = FakeGroq()
+    chat = ChatManager()
+    chat.set_client(fake)
+    chat.get_response("hi", MESSAGES)
+    chat.get_response("hi", MESSAGES)
+    assert len(fake.calls) == 2
+
+
+def test_cached_chat_reports_hits_and_entries(make_cache):
+    cache = make_cache()
+    chat = ChatManager(response_cache=cache)
+    chat.set_client(FakeGroq())
+    first = chat.get_response("hi", MESSAGES)
+    assert chat.get_response("hi", MESSAGES) == first
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+    assert stats["bytes"] == len(DEFAULT_FAKE_RESPONSE.encode("utf-8"))
@@ -0,0 +1,148 @@
+import sqlite3
+import time
+
+import pytest
+
+from utils.chat import ChatManager
+from utils.session import ConversationHistory, SessionBackend, SessionManager, SQLiteSessionBackend
+
+
+def turn(n, role="user"):
+    return {"role": role, "content": f"Message {n} is about topic {n}. More detail follows here."}
+
+
+def test_ring_buffer_keeps_the_newest_messages():
+    history = ConversationHistory(max_messages=3)
+    for n in range(5):
+        history.append(turn(n))
+    assert len(history) == 3
+    assert [m["content"] for m in history] == [turn(n)["content"] for n in (2, 3, 4)]
+    assert history[-1] == turn(4)
+    assert history[:1] == [turn(2)]
+    assert history.evicted == 2
+
+
+def test_evicted_turns_are_summarized_by_first_sentence():
+    history = ConversationHistory(max_messages=2)
+    for n in range(4):
+        history.append(turn(n, "user" if n % 2 == 0 else "assistant"))
+    assert history.summary == ("- user: Message 0 is about topic 0.\n"
+                               "- assistant: Message 1 is about topic 1.")
+
+
+def test_summary_drops_oldest_lines_past_the_cap():
+    history = ConversationHistory(max_messages=1, summary_max_chars=80)
+    for n in range(6):
+        history.append(turn(n))
+    lines = history.summary.splitlines()
+    assert len(history.summary) <= 80
+    assert lines[-1] == "- user: Message 4 is about topic 4."
+    assert "topic 0" not in history.summary
+
+
+def test_long_first_sentence_is_shortened():
+    history = ConversationHistory(max_messages=1)
+    history.append({"role": "user", "content": "x" * 500})
+    history.append(turn(1))
+    assert history.summary == "- user: " + "x" * 197 + "..."
+
+
+def test_clear_resets_messages_and_summary():
+    history = ConversationHistory(max_messages=1)
+    history.append(turn(0))
+    history.append(turn(1))
+    history.clear()
+    assert len(history) == 0
+    assert history.summary == ""
+    assert history.evicted == 0
+
+
+def test_visible_messages_page_back_through_history():
+    sessions = SessionManager(max_history=50, page_size=2)
+    history = sessions.new_history([turn(n) for n in range(5)])
+    assert sessions.visible_messages(history) == ([turn(3), turn(4)], True)
+    assert sessions.visible_messages(history, pages=3) == ([turn(n) for n in range(5)], False)
+
+
+def test_summary_is_part_of_the_system_prompt():
+    history = SessionManager(max_history=2).new_history([turn(n) for n in range(3)])
+    messages = ChatManager()._build_messages(history)
+    assert "Summary of earlier conversation:\n- user: Message 0 is about topic 0." in messages[0]["content"]
+    assert [m["content"] for m in messages[1:]] == [turn(1)["content"], turn(2)["content"]]
+
+
+def stored_messages(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+
+@pytest.fixture
+def make_backend(tmp_path):
+    backends = []
+
+    def make(**options):
+        backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), **options)
+        backends.append(backend)
+        return backend
+
+    yield make
+    for backend in backends:
+        if not backend._closed:
+            backend.close()
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SessionBackend()
+
+
+def test_writes_are_buffered_until_flushed(make_backend):
+    backend = make_backend(batch_size=100, flush_interval=60)
+    backend.append_messages("u1", [turn(0), turn(1)])
+    assert stored_messages(backend.path) == 0
+    backend.flush()
+    assert stored_messages(backend.path) == 2
+
+
+def test_full_batch_is_flushed_in_the_background(make_backend):
+    backend = make_backend(batch_size=3, flush_interval=60)
+    backend.append_messages("u1", [turn(n) for n in range(3)])
+    deadline = time.monotonic() + 5
+    while stored_messages(backend.path) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stored_messages(backend.path) == 3
+
+
+def test_sessions_survive_reopening_the_database(make_backend):
+    backend = make_backend(flush_interval=60)
+    backend.append_messages("u1", [turn(n) for n in range(4)])
+    backend.append_messages("u2", [turn(9)])
+    backend.set_state("u1", "quiz_insights", {"love_language": "Quality Time"})
+    backend.set_state("u1", "quiz_insights", {"love_language": "Words of Affirmation"})
+    backend.close()
+
+    reopened = make_backend()
+    assert reopened.load_messages("u1", limit=2) == [turn(2), turn(3)]
+    assert reopened.load_messages("u2", limit=10) == [turn(9)]
+    assert reopened.load_state("u1") == {"quiz_insights": {"love_language": "Words of Affirmation"}}
+    assert reopened.load_state("u3") == {}
+
+
+def test_restore_rebuilds_history_summary_and_state(make_backend):
+    sessions = SessionManager(max_history=2, backend=make_backend(flush_interval=60))
+    history, state = sessions.restore("u1")
+    assert len(history) == 0 and state == {}
+    for n in range(3):
+        history.append(turn(n))
+    sessions.save_state("u1", "quiz_insights", {"social_style": "Ambivert"})
+    sessions.backend.flush()
+
+    restored, state = SessionManager(max_history=2, backend=make_backend()).restore("u1")
+    assert list(restored) == [turn(1), turn(2)]
+    assert restored.summary == "- user: Message 0 is about topic 0."
+    assert state == {"quiz_insights": {"social_style": "Ambivert"}}
+
+
+def test_restore_without_backend_starts_empty():
+    history, state = SessionManager().restore("u1")
+    assert len(history) == 0 and state == {}
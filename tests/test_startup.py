@@ -0,0 +1,62 @@
+import subprocess
+import sys
+import types
+
+import pytest
+
+import cli
+from utils import startup_profile
+
+
+def loaded_after_import(module, heavy):
+    code = f"import sys, {module}; print(' '.join(name for name in {heavy!r} if name in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                          cwd=startup_profile._ROOT, check=True)
+    return proc.stdout.split()
+
+
+@pytest.mark.parametrize("module, heavy", [
+    ("utils.chat", ["groq", "chromadb"]),
+    ("utils.story", ["groq", "chromadb"]),
+    ("utils.knowledge_base", ["groq", "duckduckgo_search", "PyPDF2"]),
+])
+def test_modules_defer_heavy_imports(module, heavy):
+    assert loaded_after_import(module, heavy) == []
+
+
+def test_web_search_client_is_created_on_first_use(make_kb, monkeypatch):
+    kb = make_kb(ddgs_factory=None)
+    created = []
+    fake_module = types.ModuleType("duckduckgo_search")
+    fake_module.DDGS = lambda: created.append(True) or "client"
+    monkeypatch.setitem(sys.modules, "duckduckgo_search", fake_module)
+    assert kb.ddgs == "client"
+    assert kb.ddgs == "client"
+    assert created == [True]
+
+
+def test_profile_import_reports_heaviest_packages():
+    result = startup_profile.profile_import("json", baseline=set())
+    assert result["module"] == "json"
+    assert result["seconds"] > 0
+    assert all(seconds >= 0 for _, seconds in result["heaviest"])
+
+
+def test_profile_import_reports_failures():
+    assert "error" in startup_profile.profile_import("no_such_module_here", baseline=set())
+
+
+def test_profile_startup_command(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(startup_profile, "MODES", {"app shell": ["utils.quiz"]})
+    backends = []
+
+    def profile_managers(path, warmup=False, vector_backend="chroma"):
+        backends.append(vector_backend)
+        return [("ContentFilter", 0.01), ("QuizManager", 0.02)]
+
+    monkeypatch.setattr(startup_profile, "profile_managers", profile_managers)
+    cli.main(["profile-startup", "--path", str(tmp_path / "kb"), "--backend", "quantized"])
+    assert backends == ["quantized"]
+    out = capsys.readouterr().out
+    assert "utils.quiz" in out
+    assert "(cumulative 0.03s)" in out
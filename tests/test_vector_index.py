@@ -0,0 +1,234 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from utils.vector_index import QuantizedCollection
+
+DIM = 32
+
+
+CENTERS = np.random.default_rng(42).normal(size=(20, DIM))
+
+
+def vectors(n, seed=0):
+    """Points around a shared set of centers, like clustered text embeddings"""
+    rng = np.random.default_rng(seed)
+    return (CENTERS[rng.integers(len(CENTERS), size=n)] + 0.3 * rng.normal(size=(n, DIM))).astype(np.float32)
+
+
+def fill(collection, n, seed=0):
+    ids = [f"chunk-{i}" for i in range(n)]
+    collection.add(ids=ids, documents=[f"document {i}" for i in range(n)],
+                   metadatas=[{"source": "web" if i % 2 else "local", "n": i} for i in range(n)],
+                   embeddings=vectors(n, seed))
+    return ids
+
+
+def exact_neighbours(data, query, k):
+    return [f"chunk-{i}" for i in np.argsort(((data - query) ** 2).sum(axis=1))[:k]]
+
+
+@pytest.mark.parametrize("train_threshold", [10 ** 9, 500])
+def test_query_recall_matches_exact_search(tmp_path, train_threshold):
+    collection = QuantizedCollection(str(tmp_path), train_threshold=train_threshold, nprobe=8)
+    fill(collection, 2000)
+    data = vectors(2000)
+    queries = vectors(20, seed=1)
+    result = collection.query(query_embeddings=queries, n_results=10)
+    found = sum(len(set(ids) & set(exact_neighbours(data, query, 10)))
+                for ids, query in zip(result["ids"], queries))
+    assert found / (20 * 10) >= 0.9
+
+
+def test_where_filters(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 100)
+    result = collection.query(query_embeddings=vectors(1, seed=1), n_results=5, where={"source": "web"})
+    assert all(metadata["source"] == "web" for metadata in result["metadatas"][0])
+    assert len(collection.get(where={"$and": [{"source": "local"}, {"n": {"$lt": 10}}]})["ids"]) == 5
+    assert len(collection.get(where={"n": {"$in": [1, 2, 3]}})["ids"]) == 3
+
+
+def test_duplicate_ids_are_ignored(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 10)
+    collection.add(ids=["chunk-0", "new", "new"], documents=["a", "b", "c"], embeddings=vectors(3, seed=2))
+    assert collection.count() == 11
+    assert collection.get(ids=["new"])["documents"] == ["b"]
+
+
+def pause_training(collection):
+    """Make the collection's k-means wait until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+    kmeans = collection._kmeans
+
+    def paused(*args):
+        started.set()
+        release.wait(5)
+        return kmeans(*args)
+
+    collection._kmeans = paused
+    return started, release
+
+
+def test_training_does_not_block_adds_or_queries(tmp_path):
+    collection = QuantizedCollection(str(tmp_path), train_threshold=500)
+    started, release = pause_training(collection)
+    trainer = threading.Thread(target=fill, args=(collection, 500))
+    trainer.start()
+    assert started.wait(5)
+    collection.add(ids=["late"], documents=["late"], embeddings=vectors(1, seed=3))
+    assert collection.count() == 501
+    assert len(collection.query(query_embeddings=vectors(1, seed=1), n_results=5)["ids"][0]) == 5
+    assert collection.centroids is None
+    release.set()
+    trainer.join(5)
+    assert collection.get_stats()["trained_at"] == 501
+    # The row added while training was assigned to a list too
+    assert sum(len(rows) for rows in collection._lists) == 501
+    assert collection.query(query_embeddings=vectors(1, seed=3), n_results=1)["ids"] == [["late"]]
+
+
+def test_training_overtaken_by_a_vacuum_is_discarded(tmp_path):
+    collection = QuantizedCollection(str(tmp_path), train_threshold=500)
+    started, release = pause_training(collection)
+    trainer = threading.Thread(target=fill, args=(collection, 500))
+    trainer.start()
+    assert started.wait(5)
+    collection.delete(where={"source": "web"})
+    collection.vacuum()
+    release.set()
+    trainer.join(5)
+    # Its assignment was for the rows before renumbering
+    assert collection.centroids is None
+    assert collection.get_stats()["trained_at"] == 0
+    result = collection.query(query_embeddings=vectors(1, seed=1), n_results=5)
+    assert all(metadata["source"] == "local" for metadata in result["metadatas"][0])
+
+
+def test_reopen_keeps_chunks_and_index(tmp_path):
+    collection = QuantizedCollection(str(tmp_path), train_threshold=500)
+    fill(collection, 1000)
+    query = vectors(1, seed=1)
+    before = collection.query(query_embeddings=query, n_results=5)
+    reopened = QuantizedCollection(str(tmp_path), train_threshold=500)
+    assert reopened.count() == 1000
+    assert reopened.centroids is not None
+    assert reopened.query(query_embeddings=query, n_results=5) == before
+
+
+def test_delete_and_vacuum(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    ids = fill(collection, 200)
+    collection.delete(where={"source": "web"})
+    query = vectors(1, seed=1)
+    before = collection.query(query_embeddings=query, n_results=5)
+    assert all(metadata["source"] == "local" for metadata in before["metadatas"][0])
+
+    assert collection.vacuum()
+    assert collection.get_stats()["vectors"] == 100
+    assert collection.query(query_embeddings=query, n_results=5) == before
+    assert collection.get(ids=ids[:2])["ids"] == ["chunk-0"]
+    assert QuantizedCollection(str(tmp_path)).query(query_embeddings=query, n_results=5) == before
+
+
+class CrashOnInsert:
+    """Connection whose chunk inserts never happen, as if the process died first"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def executemany(self, sql, rows):
+        if sql.startswith("INSERT INTO chunks"):
+            raise KeyboardInterrupt
+        return self.conn.executemany(sql, rows)
+
+
+def test_crash_between_saving_vectors_and_commit(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 50)
+    collection._conn = CrashOnInsert(collection._conn)
+    with pytest.raises(KeyboardInterrupt):
+        collection.add(ids=["lost"], documents=["lost"], embeddings=vectors(1, seed=3))
+
+    reopened = QuantizedCollection(str(tmp_path))
+    assert reopened.count() == 50
+    assert int(reopened._array("live")[:reopened._meta["count"]].sum()) == 50
+    # The orphaned vector is the nearest to itself but never returned
+    result = reopened.query(query_embeddings=vectors(1, seed=3), n_results=50)
+    assert "lost" not in result["ids"][0]
+    assert len(result["ids"][0]) == 50
+    reopened.add(ids=["lost"], documents=["found"], embeddings=vectors(1, seed=3))
+    assert reopened.query(query_embeddings=vectors(1, seed=3), n_results=1)["documents"] == [["found"]]
+
+
+def test_failed_insert_leaves_no_live_rows(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 10)
+    collection._conn.execute("CREATE TRIGGER reject BEFORE INSERT ON chunks BEGIN SELECT RAISE(ABORT, 'full'); END")
+    with pytest.raises(Exception, match="full"):
+        collection.add(ids=["new"], documents=["new"], embeddings=vectors(1, seed=3))
+    assert int(collection._array("live")[:collection._meta["count"]].sum()) == 10
+
+
+def test_delete_committed_before_live_flags_saved(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 50)
+    collection.delete(ids=["chunk-0"])
+    # As if the process died before the cleared flag reached the disk
+    collection._array("live")[0] = 1
+    collection._arrays["live"].flush()
+
+    reopened = QuantizedCollection(str(tmp_path))
+    assert reopened._array("live")[0] == 0
+    assert reopened.count() == 49
+
+
+def test_rows_committed_without_vectors_are_dropped(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 20)
+    # Stores written by versions that committed before saving the vectors
+    collection._conn.execute("INSERT INTO chunks (row, id, document) VALUES (20, 'orphan', 'orphan')")
+    collection._conn.commit()
+
+    reopened = QuantizedCollection(str(tmp_path))
+    assert reopened.count() == 20
+    assert reopened.get(ids=["orphan"])["ids"] == []
+
+
+def test_vacuum_interrupted_after_commit_is_finished_on_open(tmp_path, monkeypatch):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 100)
+    collection.delete(where={"source": "web"})
+    query = vectors(1, seed=1)
+    before = collection.query(query_embeddings=query, n_results=5)
+
+    def crash(count):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(collection, "_finish_vacuum", crash)
+    with pytest.raises(KeyboardInterrupt):
+        collection.vacuum()
+
+    reopened = QuantizedCollection(str(tmp_path))
+    assert reopened.get_stats()["vectors"] == 50
+    assert reopened.query(query_embeddings=query, n_results=5) == before
+    assert not any(name.endswith(".vacuum") for name in os.listdir(tmp_path))
+
+
+def test_vacuum_interrupted_before_commit_is_discarded(tmp_path):
+    collection = QuantizedCollection(str(tmp_path))
+    fill(collection, 100)
+    query = vectors(1, seed=1)
+    before = collection.query(query_embeddings=query, n_results=5)
+    with open(os.path.join(tmp_path, "vectors.f32.vacuum"), "wb") as f:
+        f.write(b"partial")
+
+    reopened = QuantizedCollection(str(tmp_path))
+    assert reopened.query(query_embeddings=query, n_results=5) == before
+    assert not os.path.exists(os.path.join(tmp_path, "vectors.f32.vacuum"))
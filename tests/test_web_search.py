@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from tests.fakes import FakeDDGS
+from utils.llm_client import TokenBucket
+from utils.web_search import SearchCache, WebSearcher, WebSearchError
+
+
+def make_searcher(tmp_path, ddgs=None, limiter=None, **options):
+    ddgs = ddgs or FakeDDGS()
+    cache = SearchCache(str(tmp_path / "search_cache.sqlite3"))
+    searcher = WebSearcher(ddgs.text, cache=cache, limiter=limiter or TokenBucket(1000, burst=1000), **options)
+    return searcher, ddgs
+
+
+def test_repeated_query_is_served_from_cache(tmp_path):
+    searcher, ddgs = make_searcher(tmp_path)
+    first = searcher.search("Love Languages")
+    second = searcher.search("  love   languages ")
+    assert first == second
+    assert len(ddgs.queries) == 1
+    assert searcher.get_stats()["hits"] == 1
+
+
+def test_cache_survives_a_new_searcher(tmp_path):
+    make_searcher(tmp_path)[0].search("conflict styles")
+    searcher, ddgs = make_searcher(tmp_path)
+    searcher.search("conflict styles")
+    assert ddgs.queries == []
+
+
+def test_concurrent_misses_share_one_upstream_search(tmp_path):
+    searcher, ddgs = make_searcher(tmp_path, ddgs=FakeDDGS(latency=0.2))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(searcher.search("trust")))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 5
+    assert len(ddgs.queries) == 1
+    assert searcher.get_stats()["coalesced"] == 4
+
+
+def test_search_finishing_after_a_miss_is_not_repeated(tmp_path):
+    searcher, ddgs = make_searcher(tmp_path)
+    get = searcher.cache.get
+    missed, resume = threading.Event(), threading.Event()
+
+    def paused_get(*key):
+        # The first lookup stalls after missing, while another search runs start to finish
+        result = get(*key)
+        if not missed.is_set():
+            missed.set()
+            resume.wait(5)
+        return result
+
+    searcher.cache.get = paused_get
+    results = []
+    late = threading.Thread(target=lambda: results.append(searcher.search("trust")))
+    late.start()
+    assert missed.wait(5)
+    first = searcher.search("trust")
+    resume.set()
+    late.join(5)
+    assert results == [first]
+    assert len(ddgs.queries) == 1
+
+
+def test_upstream_errors_propagate_and_are_not_cached(tmp_path):
+    searcher, ddgs = make_searcher(tmp_path, ddgs=FakeDDGS(failures=1))
+    with pytest.raises(RuntimeError):
+        searcher.search("jealousy")
+    assert searcher.search("jealousy")
+    assert len(ddgs.queries) == 2
+
+
+def test_rate_limit_raises_when_no_token_frees_up(tmp_path):
+    searcher, _ = make_searcher(tmp_path, limiter=TokenBucket(0.1, burst=1), acquire_timeout=0.05)
+    searcher.search("first")
+    start = time.perf_counter()
+    with pytest.raises(WebSearchError):
+        searcher.search("second")
+    assert time.perf_counter() - start < 1.0
+    assert searcher.get_stats()["rate_limited"] == 1
+
+
+def test_expired_entries_are_fetched_again(tmp_path, monkeypatch):
+    from utils import web_search
+    now = [1000.0]
+    monkeypatch.setattr(web_search.time, "time", lambda: now[0])
+    cache = SearchCache(str(tmp_path / "search_cache.sqlite3"), ttl=60)
+    cache.set("trust", 3, [{"title": "t"}])
+    now[0] += 59
+    assert cache.get("trust", 3) == [{"title": "t"}]
+    now[0] += 2
+    assert cache.get("trust", 3) is None
+    assert cache.count() == 0
+
+
+def test_oldest_entries_are_evicted_past_the_cap(tmp_path, monkeypatch):
+    from utils import web_search
+    now = [1000.0]
+    monkeypatch.setattr(web_search.time, "time", lambda: now[0])
+    cache = SearchCache(str(tmp_path / "search_cache.sqlite3"), max_entries=2)
+    for query in ("a", "b", "c"):
+        cache.set(query, 3, [])
+        now[0] += 1
+    assert cache.count() == 2
+    assert cache.get("a", 3) is None
+    assert cache.get("c", 3) == []
+
+
+def test_knowledge_bases_share_cached_searches(make_kb, tmp_path):
+    cache_path = str(tmp_path / "shared_search.sqlite3")
+    searches = []
+
+    class CountingDDGS(FakeDDGS):
+        def text(self, query, max_results=3, **kwargs):
+            searches.append(query)
+            return super().text(query, max_results, **kwargs)
+
+    first = make_kb(persist_directory=str(tmp_path / "one"), web_search_cache_path=cache_path,
+                    ddgs_factory=CountingDDGS)
+    second = make_kb(persist_directory=str(tmp_path / "two"), web_search_cache_path=cache_path,
+                     ddgs_factory=CountingDDGS)
+    assert first.search_web("apologizing well") == second.search_web("Apologizing  well")
+    assert searches == ["apologizing well"]
+    assert second.get_cache_stats()["web_search"]["hits"] == 1
@@ -0,0 +1,233 @@
+"""
+Offline bulk ingestion of a directory tree of PDF, text and Markdown files.
+Worker processes extract and chunk whole files; the calling process is the
+only writer and adds their chunks to the knowledge base in large batches.
+Each file is appended to a JSONL checkpoint manifest once all of its chunks
+are stored, so an interrupted run resumes without re-processing them.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from utils.chunking import TextChunker, content_id
+
+logger = logging.getLogger("lovebot.ingest")
+
+# Extension -> file_type stored in chunk metadata, as the upload paths set it
+EXTENSIONS = {".pdf": "pdf", ".txt": "text", ".md": "text"}
+PAGES_PER_READ = 8
+
+
+def find_documents(root: str) -> List[str]:
+    """Supported files under root in a stable order, skipping hidden files and directories"""
+    paths = []
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+        for name in sorted(files):
+            if not name.startswith(".") and os.path.splitext(name)[1].lower() in EXTENSIONS:
+                paths.append(os.path.join(directory, name))
+    return paths
+
+
+def prepare_file(path: str, filename: str, chunk_size: int, overlap: int, unit: str) -> Dict:
+    """
+    Extract and chunk one file (runs in a worker process). IDs are derived
+    exactly as KnowledgeBaseManager.ingest_pdf and ingest_document derive them
+    for an upload named filename, so both paths store the same chunks.
+    Returns: {"doc_id", "chunks", "pages", "file_type"}; doc_id is None for empty files
+    """
+    file_type = EXTENSIONS[os.path.splitext(path)[1].lower()]
+    chunker = TextChunker(chunk_size=chunk_size, overlap=overlap, unit=unit)
+    pages = 0
+    if file_type == "pdf":
+        from utils.pdf_extract import count_pages, extract_page_range
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        pages = count_pages(path)
+
+        def page_texts():
+            for start in range(0, pages, PAGES_PER_READ):
+                yield from extract_page_range(path, start, min(pages, start + PAGES_PER_READ))
+
+        chunks = list(chunker.chunk_stream(page_texts()))
+        doc_id = content_id(digest.hexdigest(), filename)
+    else:
+        with open(path, "rb") as f:
+            text = f.read().decode("utf-8")
+        chunks = chunker.chunk(text) if text.strip() else []
+        doc_id = content_id(text, filename)
+    if not chunks:
+        return {"doc_id": None, "chunks": [], "pages": pages, "file_type": file_type}
+    return {"doc_id": doc_id, "chunks": chunks, "pages": pages, "file_type": file_type}
+
+
+class Manifest:
+    """
+    Append-only JSONL record of processed files, keyed by absolute path.
+    A file counts as done while its size and modification time are unchanged.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; the file is simply processed again
+                        continue
+                    self.entries[entry["path"]] = entry
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, path: str, size: int, mtime: float) -> bool:
+        entry = self.entries.get(path)
+        return (entry is not None and entry["status"] in ("done", "empty")
+                and entry["size"] == size and entry["mtime"] == mtime)
+
+    def record(self, entries: List[Dict]):
+        for entry in entries:
+            self.entries[entry["path"]] = entry
+            self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+def _prepare_all(tasks: List[tuple], workers: int, chunker: TextChunker) -> Iterator[tuple]:
+    """Yield (task, result, error) as files finish, keeping about workers * 2 in flight"""
+    params = (chunker.chunk_size, chunker.overlap, chunker.unit)
+    if workers <= 1:
+        for task in tasks:
+            try:
+                yield task, prepare_file(task[0], task[1], *params), None
+            except Exception as e:
+                yield task, None, e
+        return
+
+    # spawn avoids forking a process that already runs Chroma threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = iter(tasks)
+        in_flight = {}
+        try:
+            while True:
+                for task in pending:
+                    in_flight[pool.submit(prepare_file, task[0], task[1], *params)] = task
+                    if len(in_flight) >= workers * 2:
+                        break
+                if not in_flight:
+                    return
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = in_flight.pop(future)
+                    error = future.exception()
+                    yield task, None if error else future.result(), error
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+
+def ingest_directory(kb, root: str, workers: Optional[int] = None, manifest_path: Optional[str] = None,
+                     batch_chunks: int = 2048, progress_callback: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """
+    Ingest every PDF, TXT and MD file under root into kb's collection
+    Args:
+        kb: KnowledgeBaseManager to write to
+        root: Directory to walk
+        workers: Extraction processes (None = CPU count)
+        manifest_path: Checkpoint manifest (defaults to ingest_manifest.jsonl in
+            kb's persistence directory). Files already recorded as done with the
+            same size and modification time are skipped; failed ones are retried
+        batch_chunks: Chunks buffered across files before each write
+        progress_callback: Called with the running stats after each write
+    Returns: counts of files, pages and chunks plus throughput
+    """
+    root = os.path.abspath(root)
+    manifest = Manifest(manifest_path or os.path.join(kb.persist_directory, "ingest_manifest.jsonl"))
+    stats = {
+        "files": 0, "files_done": 0, "files_skipped": 0, "files_empty": 0, "files_failed": 0,
+        "pages": 0, "chunks": 0, "added": 0, "duplicates": 0,
+    }
+    tasks = []
+    for path in find_documents(root):
+        stat = os.stat(path)
+        stats["files"] += 1
+        if manifest.is_done(path, stat.st_size, stat.st_mtime):
+            stats["files_skipped"] += 1
+            continue
+        tasks.append((path, os.path.basename(path), stat.st_size, stat.st_mtime))
+
+    start = time.perf_counter()
+    buffer_ids, buffer_chunks, buffer_metadatas, buffer_entries = [], [], [], []
+
+    def flush():
+        if buffer_ids:
+            added, skipped = kb.add_chunks(buffer_ids, buffer_chunks, buffer_metadatas)
+            stats["added"] += added
+            stats["duplicates"] += skipped
+        manifest.record(buffer_entries)
+        buffer_ids.clear()
+        buffer_chunks.clear()
+        buffer_metadatas.clear()
+        buffer_entries.clear()
+        if progress_callback:
+            progress_callback(_with_rates(stats, time.perf_counter() - start))
+
+    try:
+        for (path, filename, size, mtime), result, error in _prepare_all(tasks, workers or os.cpu_count() or 1,
+                                                                          kb.chunker):
+            entry = {"path": path, "size": size, "mtime": mtime, "finished_at": time.time()}
+            if error is not None:
+                logger.warning("Failed to ingest %s: %s", path, error)
+                stats["files_failed"] += 1
+                buffer_entries.append(dict(entry, status="failed", error=str(error)))
+                continue
+            stats["pages"] += result["pages"]
+            if result["doc_id"] is None:
+                stats["files_empty"] += 1
+                buffer_entries.append(dict(entry, status="empty"))
+                continue
+            # Labelled like an upload of the same file; "path" (relative to root)
+            # only tells apart files that share a name and plays no part in IDs
+            metadata = {"path": os.path.relpath(path, root).replace(os.sep, "/"),
+                        "file_type": result["file_type"], "filename": filename}
+            ids, metadatas = kb.label_chunks(result["doc_id"], result["chunks"], metadata,
+                                             total_chunks=result["file_type"] != "pdf")
+            buffer_ids.extend(ids)
+            buffer_chunks.extend(result["chunks"])
+            buffer_metadatas.extend(metadatas)
+            buffer_entries.append(dict(entry, status="done", doc_id=result["doc_id"],
+                                       chunks=len(ids), pages=result["pages"]))
+            stats["files_done"] += 1
+            stats["chunks"] += len(ids)
+            if len(buffer_ids) >= batch_chunks:
+                flush()
+    except KeyboardInterrupt:
+        # Keep the files that were fully prepared so a resumed run skips them
+        flush()
+        raise
+    else:
+        flush()
+    finally:
+        manifest.close()
+    return _with_rates(stats, time.perf_counter() - start)
+
+
+def _with_rates(stats: Dict, seconds: float) -> Dict:
+    return dict(
+        stats,
+        seconds=seconds,
+        files_per_second=stats["files_done"] / seconds if seconds else 0.0,
+        pages_per_second=stats["pages"] / seconds if seconds else 0.0,
+        chunks_per_second=stats["chunks"] / seconds if seconds else 0.0,
+    )
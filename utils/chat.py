@@ -1,66 +1,197 @@
-from groq import Groq
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+import time
+from utils.context_builder import ContextBuilder
+from utils.metrics import timed
+from utils.response_cache import CachingClient, ResponseCache
 
 class ChatManager:
-    def __init__(self):
+    BASE_PROMPT = "You are LoveBot, an AI relationship assistant. You provide empathetic, helpful advice while maintaining appropriate boundaries. You are knowledgeable about relationship psychology and communication strategies."
+
+    def __init__(self, context_tokens: int = 8192, response_cache: Optional[ResponseCache] = None):
         self.client = None
         self.model = "mixtral-8x7b-32768"
+        self.max_tokens = 1024
+        # Prompt parts are packed into context_tokens, leaving room for the reply
+        self.context_builder = ContextBuilder(max_tokens=context_tokens, reserve_tokens=self.max_tokens)
+        # How the budget was spent on the most recent prompt
+        self.last_context_report = None
+        # Timing of recent streamed responses (ttft / total_time in seconds)
+        self.stream_metrics = deque(maxlen=100)
+        # Identical requests are answered from here when set
+        self.response_cache = response_cache
     
     def set_api_key(self, api_key):
-        self.client = Groq(api_key=api_key)
+        # Router shared with StoryManager and every other session; other
+        # providers join it when their keys are in the environment
+        from utils.llm_backend import get_shared_router
+        self.set_client(get_shared_router(groq_key=api_key))
+
+    def set_client(self, client):
+        """Use a Groq-compatible client, e.g. an LLMRouter, an LLMClient or tests.fakes.FakeGroq"""
+        self.client = CachingClient(client, self.response_cache)
     
-    def get_response(self, prompt, message_history, knowledge_context=""):
+    @timed("get_response")
+    def get_response(self, prompt, message_history, knowledge_context="", use_cache: bool = True):
         if not self.client:
             raise Exception("API key not set")
         
-        # Prepare messages
-        messages = [
-            {"role": "system", "content": self._get_system_prompt(knowledge_context)}
-        ]
-        
-        # Add message history
-        for msg in message_history[-5:]:  # Only use last 5 messages for context
-            messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
+        messages = self._build_messages(message_history, knowledge_context)
         
         try:
             chat_completion = self.client.chat.completions.create(
                 messages=messages,
                 model=self.model,
                 temperature=0.7,
-                max_tokens=1024,
+                max_tokens=self.max_tokens,
                 top_p=1,
-                stream=False
+                stream=False,
+                cache=use_cache
             )
             return chat_completion.choices[0].message.content
         except Exception as e:
-            raise Exception(f"Failed to get response from Groq: {str(e)}")
-    
-    def _get_system_prompt(self, knowledge_context=""):
-        """Generate system prompt including personality insights and knowledge context"""
-        base_prompt = "You are LoveBot, an AI relationship assistant. You provide empathetic, helpful advice while maintaining appropriate boundaries. You are knowledgeable about relationship psychology and communication strategies."
-        context_parts = [base_prompt]
+            raise Exception(f"Failed to get response from the model: {str(e)}")
+
+    @timed("stream_response")
+    def stream_response(self, prompt, message_history, knowledge_context="",
+                        metrics: Optional[Dict] = None, use_cache: bool = True) -> Iterator[str]:
+        """
+        Yield the response token by token as the model streams it back
+        Args:
+            prompt: The user's message
+            message_history: Conversation so far
+            knowledge_context: Knowledge base context (text, or search results to rank)
+            metrics: Optional dict filled with ttft, total_time, chunks and the
+                context budget report once the stream ends
+            use_cache: Set to False to always ask the model, even for a cached request
+        """
+        if not self.client:
+            raise Exception("API key not set")
+
+        messages = self._build_messages(message_history, knowledge_context)
+
+        start = time.perf_counter()
+        ttft = None
+        n_chunks = 0
+        try:
+            stream = self.client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=0.7,
+                max_tokens=self.max_tokens,
+                top_p=1,
+                stream=True,
+                cache=use_cache
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                n_chunks += 1
+                yield delta
+        except Exception as e:
+            raise Exception(f"Failed to get response from the model: {str(e)}")
+
+        record = {
+            "ttft": ttft if ttft is not None else time.perf_counter() - start,
+            "total_time": time.perf_counter() - start,
+            "chunks": n_chunks
+        }
+        self.stream_metrics.append(record)
+        if metrics is not None:
+            metrics.update(record)
+            metrics["context"] = self.last_context_report
+
+    def get_stream_stats(self) -> Dict:
+        """Average TTFT and total time over the recent streamed responses"""
+        if not self.stream_metrics:
+            return {"count": 0, "avg_ttft": 0.0, "avg_total_time": 0.0}
+        count = len(self.stream_metrics)
+        return {
+            "count": count,
+            "avg_ttft": sum(m["ttft"] for m in self.stream_metrics) / count,
+            "avg_total_time": sum(m["total_time"] for m in self.stream_metrics) / count
+        }
+
+    @timed("build_prompt")
+    def _build_messages(self, message_history, knowledge_context="") -> List[Dict]:
+        """Prepare the message list sent to the model, packed into the context budget"""
+        if isinstance(knowledge_context, str):
+            snippets = [{"content": knowledge_context}] if knowledge_context else []
+        else:
+            snippets = list(knowledge_context or [])
         
+        personality_prompt = self._get_personality_prompt()
+        # ConversationHistory keeps a summary of turns evicted from its buffer
+        summary = getattr(message_history, "summary", "")
+        summary_prompt = f"Summary of earlier conversation:\n{summary}" if summary else ""
+        required = [self.BASE_PROMPT, personality_prompt, summary_prompt]
+        if snippets:
+            required.append(self._format_knowledge(""))
+        packed = self.context_builder.pack(required, snippets, message_history)
+        self.last_context_report = packed["report"]
+        # Cut short if the base prompt left too little room for them
+        personality_prompt, summary_prompt = packed["required"][1:3]
+        
+        knowledge = ""
+        if packed["snippets"]:
+            if isinstance(knowledge_context, str):
+                knowledge = packed["snippets"][0]["content"]
+            else:
+                knowledge = "Based on available knowledge:\n\n" + "\n\n".join(
+                    f"{idx}. [Web Source] {doc['content']}"
+                    if doc.get('metadata', {}).get('source') == 'web'
+                    else f"{idx}. {doc['content']}"
+                    for idx, doc in enumerate(packed["snippets"], 1)
+                )
+        
+        messages = [
+            {"role": "system", "content": self._get_system_prompt(knowledge, personality_prompt, summary_prompt)}
+        ]
+        messages.extend(packed["history"])
+        return messages
+    
+    def _get_personality_prompt(self):
+        """Personality insights from the quiz, if the user has taken it"""
         try:
             # Get personality insights from session state if available
             import streamlit as st
             if "quiz_insights" in st.session_state:
                 insights = st.session_state.quiz_insights
-                context_parts.append(f"""
+                return f"""
 The user has completed a personality quiz with the following insights:
 - Love Language: {insights['love_language']}
 - Conflict Style: {insights['conflict_style']}
 - Social Style: {insights['social_style']}
-Please consider these personality traits when providing advice.""")
+Please consider these personality traits when providing advice."""
         except:
             pass
+        return ""
+    
+    def _format_knowledge(self, knowledge_context):
+        """Wrap knowledge base context for the system prompt"""
+        return f"""
+Relevant information from my knowledge base:
+{knowledge_context}
+Use this information to provide more detailed and accurate advice."""
+    
+    def _get_system_prompt(self, knowledge_context="", personality_prompt=None, summary_prompt=""):
+        """Generate system prompt including personality insights, conversation summary and knowledge context"""
+        context_parts = [self.BASE_PROMPT]
+        
+        if personality_prompt is None:
+            personality_prompt = self._get_personality_prompt()
+        if personality_prompt:
+            context_parts.append(personality_prompt)
+        if summary_prompt:
+            context_parts.append(summary_prompt)
         
         # Add knowledge base context if available
         if knowledge_context:
-            context_parts.append(f"""
-Relevant information from my knowledge base:
-{knowledge_context}
-Use this information to provide more detailed and accurate advice.""")
+            context_parts.append(self._format_knowledge(knowledge_context))
         
         return "\n\n".join(context_parts)
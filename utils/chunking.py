@@ -0,0 +1,181 @@
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import re
+
+# Sentence ends (punctuation, optional closing quote/bracket, whitespace) and blank lines.
+# Written to start with a single character class so the regex engine can skip ahead quickly.
+_BOUNDARY = re.compile(r"[.!?\n](?:(?<=[.!?])[.!?]*[\"')\]]*\s|(?<=\n)[ \t]*\n)\s*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def content_id(text: str, source: str) -> str:
+    """Stable ID derived from whitespace-normalized text and its source"""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{source}\0{normalized}".encode("utf-8")).hexdigest()[:32]
+
+
+class TextChunker:
+    """
+    Splits text into chunks that end on paragraph or sentence boundaries where
+    possible, with an optional sliding overlap between neighbouring chunks.
+    Works on character offsets into the original string; the only strings
+    built are the chunks themselves.
+    """
+
+    def __init__(self, chunk_size: int = 1000, overlap: int = 0, unit: str = "chars",
+                 token_counter: Optional[Callable[[str], int]] = None):
+        """
+        Args:
+            chunk_size: Maximum chunk size, in characters or tokens
+            overlap: How much of the previous chunk to repeat at the start of the next
+                (same unit), rounded to whole sentences
+            unit: "chars" or "tokens"
+            token_counter: Token counting function for unit="tokens"
+                (defaults to utils.context_builder.count_tokens)
+        """
+        if unit not in ("chars", "tokens"):
+            raise ValueError("unit must be 'chars' or 'tokens'")
+        if overlap >= chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.unit = unit
+        if unit == "tokens" and token_counter is None:
+            from utils.context_builder import count_tokens
+            token_counter = count_tokens
+        self.token_counter = token_counter
+
+    @property
+    def signature(self) -> str:
+        """
+        Identifies the chunking rules and settings, e.g. "sentences:chars:1000:150".
+        Stored with each chunk so text chunked differently can be found and re-chunked.
+        """
+        return f"sentences:{self.unit}:{self.chunk_size}:{self.overlap}"
+
+    def chunk(self, text: str) -> List[str]:
+        """Split text into chunks"""
+        return [text[start:end] for start, end in self.spans(text)]
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) offsets of each chunk, with surrounding whitespace trimmed"""
+        segments = list(self._segments(text))
+        n = len(segments)
+        first = 0
+        while first < n:
+            # Greedily take segments while they fit, remembering the last paragraph end
+            size = 0
+            last = first
+            paragraph_cut = None
+            while last < n and (last == first or size + segments[last][2] <= self.chunk_size):
+                size += segments[last][2]
+                if segments[last][3]:
+                    paragraph_cut = last
+                last += 1
+            # Prefer ending on a paragraph if that still fills at least half the chunk
+            if last < n and paragraph_cut is not None and paragraph_cut + 1 < last:
+                kept = sum(segments[i][2] for i in range(first, paragraph_cut + 1))
+                if kept * 2 >= self.chunk_size:
+                    last = paragraph_cut + 1
+
+            start = segments[first][0]
+            end = segments[last - 1][1]
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if end > start:
+                yield start, end
+            if last >= n:
+                break
+
+            # Step back over trailing segments to build the overlap, always moving
+            # forward and leaving room for at least the next new segment
+            next_first = last
+            if self.overlap:
+                budget = min(self.overlap, self.chunk_size - segments[last][2])
+                carried = 0
+                while next_first - 1 > first and carried + segments[next_first - 1][2] <= budget:
+                    next_first -= 1
+                    carried += segments[next_first][2]
+            first = next_first
+
+    def chunk_stream(self, pieces: Iterable[str], separator: str = "\n") -> Iterator[str]:
+        """
+        Chunk text that arrives in pieces (e.g. PDF pages) without holding all of it.
+        Chunks are emitted once enough text follows them that they can no longer change.
+        """
+        # Keep a few chunks' worth of text buffered before committing any
+        window = self.chunk_size * (4 if self.unit == "chars" else 16)
+        buffer = ""
+        for piece in pieces:
+            if not piece:
+                continue
+            buffer = f"{buffer}{separator}{piece}" if buffer else piece
+            if len(buffer) < window:
+                continue
+            spans = list(self.spans(buffer))
+            if len(spans) <= 2:
+                continue
+            for start, end in spans[:-2]:
+                yield buffer[start:end]
+            buffer = buffer[spans[-2][0]:]
+        for start, end in self.spans(buffer):
+            yield buffer[start:end]
+
+    def _cost(self, text: str, start: int, end: int) -> int:
+        if self.unit == "chars":
+            return end - start
+        return self.token_counter(text[start:end])
+
+    def _segments(self, text: str) -> Iterator[Tuple[int, int, int, bool]]:
+        """Yield (start, end, cost, ends_paragraph) for each sentence, splitting oversized ones"""
+        position = 0
+        length = len(text)
+        # Skip leading whitespace so chunks never start with it
+        match = _WHITESPACE.match(text)
+        if match:
+            position = match.end()
+        chars = self.unit == "chars"
+        chunk_size = self.chunk_size
+        for match in _BOUNDARY.finditer(text, position):
+            end = match.end()
+            ends_paragraph = match.group().count("\n") >= 2
+            if chars and end - position <= chunk_size:
+                # Fast path: most sentences fit in a chunk and need no further work
+                yield position, end, end - position, ends_paragraph
+            else:
+                yield from self._split_long(text, position, end, ends_paragraph)
+            position = end
+        if position < length:
+            yield from self._split_long(text, position, length, True)
+
+    def _split_long(self, text: str, start: int, end: int, ends_paragraph: bool):
+        """Yield a segment, cutting it at whitespace if it is larger than a chunk"""
+        cost = self._cost(text, start, end)
+        if cost <= self.chunk_size:
+            yield start, end, cost, ends_paragraph
+            return
+        # Characters per chunk, estimated from this segment's density for token sizing
+        step = max(1, self.chunk_size * (end - start) // cost)
+        while start < end:
+            limit = min(start + step, end)
+            if limit < end:
+                cut = text.rfind(" ", start + 1, limit + 1)
+                if cut <= start:
+                    cut = limit
+            else:
+                cut = end
+            while True:
+                # Include the space in this piece so the next starts on a word
+                piece_end = cut
+                while piece_end < end and text[piece_end].isspace():
+                    piece_end += 1
+                cost = self._cost(text, start, piece_end)
+                if cost <= self.chunk_size:
+                    break
+                # The step is an estimate, so back off a word at a time while over
+                earlier = text.rfind(" ", start + 1, cut)
+                if earlier <= start:
+                    break
+                cut = earlier
+            yield start, piece_end, cost, ends_paragraph and piece_end >= end
+            start = piece_end
@@ -1,17 +1,99 @@
+from typing import Iterable, Optional
+import re
+import unicodedata
+
 class ContentFilter:
-    def __init__(self):
+    def __init__(self, blocklist_path: Optional[str] = None, word_boundary: bool = True,
+                 strip_accents: bool = True):
+        """
+        Args:
+            blocklist_path: File with one blocked term per line ('#' starts a comment);
+                its terms are added to the built-in ones
+            word_boundary: Only match whole words, so "explicit" doesn't block "explicitly"
+            strip_accents: Match accented variants of blocked terms too
+        """
+        self.word_boundary = word_boundary
+        self.strip_accents = strip_accents
         self.blocked_words = {
             'explicit', 'nsfw', 'porn', 'xxx',
             # Add more blocked words as needed
         }
-        
+        if blocklist_path:
+            self.blocked_words |= set(self.load_blocklist(blocklist_path))
+        self._compile()
+
+    @staticmethod
+    def load_blocklist(path: str) -> Iterable[str]:
+        """Read blocked terms from a file, one per line"""
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                term = line.split("#", 1)[0].strip()
+                if term:
+                    yield term
+
+    def add_terms(self, terms: Iterable[str]):
+        """Add blocked terms and rebuild the matcher"""
+        self.blocked_words |= set(terms)
+        self._compile()
+
+    def normalize(self, text: str) -> str:
+        """Unicode-normalize and case-fold text the same way for terms and content"""
+        if text.isascii():
+            return text.lower()
+        text = unicodedata.normalize("NFKC", text).casefold()
+        if self.strip_accents:
+            text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+        return text
+
+    def find_blocked(self, content: str) -> Optional[str]:
+        """Return the first blocked term found in content, as configured, or None"""
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(self.normalize(content))
+        return self._terms[match.group(1)] if match else None
+
     def is_safe(self, content):
         """Basic content filtering"""
-        content_lower = content.lower()
-        
-        # Check for blocked words
-        for word in self.blocked_words:
-            if word in content_lower:
-                return False
-                
-        return True
+        return self.find_blocked(content) is None
+
+    def _compile(self):
+        """
+        Build a single regex for all terms. Terms are merged into a trie first, so
+        the alternation shares prefixes and matching cost barely grows with the blocklist.
+        """
+        trie = {}
+        # Normalized form -> configured term, for reporting matches
+        self._terms = {}
+        for word in sorted(self.blocked_words):
+            term = self.normalize(word).strip()
+            if not term:
+                continue
+            self._terms.setdefault(term, word.strip())
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[""] = True
+        if not trie:
+            self._pattern = None
+            return
+        pattern = f"({self._trie_to_regex(trie)})"
+        if self.word_boundary:
+            pattern = rf"(?<!\w){pattern}(?!\w)"
+        self._pattern = re.compile(pattern)
+
+    def _trie_to_regex(self, node) -> str:
+        # Iterative over single-child chains to keep recursion shallow for long terms
+        prefix = ""
+        while len(node) == 1 and "" not in node:
+            char, node = next(iter(node.items()))
+            prefix += re.escape(char)
+        terminal = "" in node
+        branches = [re.escape(char) + self._trie_to_regex(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return prefix
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            # The term may also end here; the regex tries the longer match first
+            body = f"(?:{body})?"
+        return prefix + body
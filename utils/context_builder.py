@@ -0,0 +1,142 @@
+from typing import Callable, Dict, List, Optional
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to a character estimate
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 characters per token"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int, counter: Callable[[str], int] = count_tokens) -> str:
+    """Cut text down to roughly max_tokens tokens"""
+    if max_tokens <= 0:
+        return ""
+    tokens = counter(text)
+    if tokens <= max_tokens:
+        return text
+    if _encoding is not None and counter is count_tokens:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text[:len(text) * max_tokens // tokens]
+
+
+class ContextBuilder:
+    """
+    Packs prompt parts into a token budget, in priority order:
+    required parts (system prompt, personality insights), the latest message,
+    knowledge base snippets ranked by similarity, then as much history as fits.
+    Required parts that overrun the budget on their own are truncated, later
+    parts first.
+    """
+
+    def __init__(self, max_tokens: int = 8192, reserve_tokens: int = 1024,
+                 tokens_per_message: int = 4, knowledge_share: float = 0.5,
+                 counter: Callable[[str], int] = count_tokens):
+        """
+        Args:
+            max_tokens: Model context window to fit into
+            reserve_tokens: Tokens kept free for the model's reply
+            tokens_per_message: Per-message formatting overhead
+            knowledge_share: Maximum fraction of the remaining budget given to snippets
+            counter: Token counting function
+        """
+        self.max_tokens = max_tokens
+        self.reserve_tokens = reserve_tokens
+        self.tokens_per_message = tokens_per_message
+        self.knowledge_share = knowledge_share
+        self.counter = counter
+
+    def pack(self, required: List[str], snippets: Optional[List[Dict]] = None,
+             history: Optional[List[Dict]] = None) -> Dict:
+        """
+        Select what fits in the budget
+        Args:
+            required: Text that is always included (already-formatted prompt parts),
+                most important first
+            snippets: Knowledge base results with 'content' and optional 'score' or 'distance'
+            history: Chat messages with 'role' and 'content', oldest first
+        Returns: {"required", "snippets", "history", "report"}; required parts as they
+            fit (in input order, cut short or emptied when over the budget), snippets
+            best first, history oldest first
+        """
+        snippets = snippets or []
+        history = history or []
+        budget = self.max_tokens - self.reserve_tokens
+        report = {"budget": budget}
+
+        # Leave room for the latest message's formatting, at least
+        required_budget = max(0, budget - (self.tokens_per_message if history else 0))
+        kept_required = []
+        used = 0
+        for part in required:
+            cost = self.counter(part) if part else 0
+            if used + cost > required_budget:
+                part = truncate_to_tokens(part, required_budget - used, self.counter)
+                cost = self.counter(part)
+            kept_required.append(part)
+            used += cost
+        report["required"] = used
+        report["required_truncated"] = kept_required != list(required)
+
+        # The latest message is what the model has to answer, so it always goes in
+        kept_history = []
+        if history:
+            latest = history[-1]
+            available = max(0, budget - used - self.tokens_per_message)
+            content = truncate_to_tokens(latest["content"], available, self.counter)
+            cost = self.counter(content) + self.tokens_per_message
+            kept_history.append({"role": latest["role"], "content": content})
+            used += cost
+            report["latest_message"] = cost
+            report["latest_message_truncated"] = content != latest["content"]
+
+        # Snippets, best first (highest fused score, else lowest distance), up to the knowledge share
+        ranked = sorted(enumerate(snippets), key=lambda item: self._rank_key(*item))
+        knowledge_budget = int(max(0, budget - used) * self.knowledge_share)
+        knowledge_used = 0
+        kept_snippets = []
+        for _, snippet in ranked:
+            cost = self.counter(snippet["content"]) + self.tokens_per_message
+            if knowledge_used + cost > knowledge_budget:
+                continue
+            kept_snippets.append(snippet)
+            knowledge_used += cost
+        used += knowledge_used
+        report["knowledge"] = knowledge_used
+        report["snippets_used"] = len(kept_snippets)
+        report["snippets_dropped"] = len(snippets) - len(kept_snippets)
+
+        # History, newest first, stopping at the first message that doesn't fit
+        history_used = 0
+        for msg in reversed(history[:-1]):
+            cost = self.counter(msg["content"]) + self.tokens_per_message
+            if used + history_used + cost > budget:
+                break
+            kept_history.append({"role": msg["role"], "content": msg["content"]})
+            history_used += cost
+        kept_history.reverse()
+        used += history_used
+        report["history"] = history_used
+        report["history_used"] = len(kept_history)
+        report["history_dropped"] = len(history) - len(kept_history)
+        report["total"] = used
+        report["remaining"] = budget - used
+
+        return {"required": kept_required, "snippets": kept_snippets, "history": kept_history, "report": report}
+
+    @staticmethod
+    def _rank_key(position: int, snippet: Dict):
+        """Sort key: fused scores first (higher is better), then distances, then input order"""
+        if snippet.get("score") is not None:
+            return (0, -snippet["score"], position)
+        if snippet.get("distance") is not None:
+            return (1, snippet["distance"], position)
+        return (2, 0.0, position)
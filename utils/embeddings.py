@@ -0,0 +1,163 @@
+from functools import cached_property
+from typing import Optional, Sequence
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+class _CPUMiniLM(ONNXMiniLM_L6_V2):
+    """all-MiniLM-L6-v2 pinned to the CPU provider with a fixed thread count"""
+
+    def __init__(self, num_threads: Optional[int] = None):
+        super().__init__(preferred_providers=["CPUExecutionProvider"])
+        self.num_threads = num_threads
+
+    @cached_property
+    def model(self):
+        options = self.ort.SessionOptions()
+        options.log_severity_level = 3
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+            options.inter_op_num_threads = 1
+        return self.ort.InferenceSession(
+            os.path.join(self.DOWNLOAD_PATH, self.EXTRACTED_FOLDER_NAME, "model.onnx"),
+            providers=["CPUExecutionProvider"],
+            sess_options=options
+        )
+
+class EmbeddingCache:
+    """
+    On-disk embedding store keyed by a hash of the model name and text.
+    Past max_entries the oldest entries are evicted first.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 200000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> dict:
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ):
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+            self.hits += len(found)
+            self.misses += len(set(keys)) - len(found)
+        return found
+
+    def put_many(self, items: dict):
+        with self._lock:
+            # A key stored meanwhile by another thread already has the same vector
+            self._entries += self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()]
+            ).rowcount
+            if self._entries > self.max_entries:
+                # Rows are numbered in insertion order
+                evicted = self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)",
+                    (self._entries - self.max_entries,)
+                ).rowcount
+                self._entries -= evicted
+                self.evictions += evicted
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._entries
+
+class LocalEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    CPU-only sentence embeddings (all-MiniLM-L6-v2 via ONNX Runtime, the same
+    model as Chroma's default, so existing collections stay compatible) with
+    explicit batching, thread control and a persistent cache keyed by content hash.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, batch_size: int = 32,
+                 num_threads: Optional[int] = None, cache_max_entries: int = 200000):
+        """
+        Args:
+            cache_path: SQLite file for cached embeddings; None disables the disk cache
+            batch_size: Texts per model forward pass
+            num_threads: ONNX Runtime intra-op threads (None = runtime default)
+            cache_max_entries: Cap on cached embeddings (about 1.5 KB each)
+        """
+        self.batch_size = batch_size
+        self._model = _CPUMiniLM(num_threads=num_threads)
+        self.cache = (EmbeddingCache(cache_path, _CPUMiniLM.MODEL_NAME, max_entries=cache_max_entries)
+                      if cache_path else None)
+        self._warmup_thread = None
+        # Held while the model downloads and loads, so a query racing the
+        # warmup thread waits for it instead of loading a second copy
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return list(self.embed(input))
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed a batch of texts (list or NumPy array of str) into an (n, dim) float32 array"""
+        texts = [str(text) for text in texts]
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._forward(texts)
+
+        keys = [self.cache.key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self._forward(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(computed)
+            cached.update(computed)
+        return np.stack([cached[key] for key in keys])
+
+    def warmup(self, background: bool = False):
+        """Download and load the model ahead of the first query"""
+        if background:
+            if self._warmup_thread is None:
+                self._warmup_thread = threading.Thread(
+                    target=self._forward, args=(["warmup"],), name="embedding-warmup", daemon=True
+                )
+                self._warmup_thread.start()
+            return
+        self._forward(["warmup"])
+
+    def _forward(self, texts):
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._model._download_model_if_not_exists()
+                    # The first pass builds the ONNX session and tokenizer
+                    vectors = self._model._forward(texts, batch_size=self.batch_size)
+                    self._loaded = True
+                    return vectors
+        return self._model._forward(texts, batch_size=self.batch_size)
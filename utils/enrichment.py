@@ -0,0 +1,107 @@
+import contextvars
+import logging
+import queue
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("lovebot.enrichment")
+
+class EnrichmentQueue:
+    """Bounded background queue that runs web enrichment off the request path"""
+
+    def __init__(self, handler: Callable[[str], None], max_workers: int = 2, max_pending: int = 32):
+        """
+        Args:
+            handler: Called with each queued query on a worker thread
+            max_workers: Number of worker threads (concurrency)
+            max_pending: Queue capacity; submissions beyond it are rejected (backpressure)
+        """
+        self.handler = handler
+        self.max_workers = max_workers
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "duplicates": 0}
+        self._workers = []
+        self._closed = False
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._run, name=f"kb-enrichment-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, query: str, block: bool = False, timeout: Optional[float] = None) -> bool:
+        """
+        Queue a query for enrichment
+        Args:
+            query: Search query to enrich the knowledge base with
+            block: Wait for a free slot instead of rejecting when the queue is full
+            timeout: Maximum seconds to wait when block is True
+        Returns: True if the query was queued or is already pending
+        """
+        with self._lock:
+            if self._closed:
+                return False
+            if query in self._pending:
+                self._stats["duplicates"] += 1
+                return True
+            self._pending.add(query)
+            self._in_flight += 1
+        try:
+            # Carry the caller's context (e.g. its request ID) over to the worker
+            self._queue.put((query, contextvars.copy_context()), block=block, timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(query)
+                self._in_flight -= 1
+                self._stats["rejected"] += 1
+                self._idle.notify_all()
+            return False
+        with self._lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued query has been processed. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and stop the workers once the queue is empty"""
+        with self._lock:
+            self._closed = True
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def pending(self) -> int:
+        """Number of queued or running queries"""
+        with self._lock:
+            return self._in_flight
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = self._in_flight
+        return stats
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            query, context = item
+            try:
+                context.run(self.handler, query)
+                outcome = "completed"
+            except Exception as e:
+                logger.warning("Background enrichment error: %s", e)
+                outcome = "failed"
+            with self._lock:
+                self._pending.discard(query)
+                self._in_flight -= 1
+                self._stats[outcome] += 1
+                self._idle.notify_all()
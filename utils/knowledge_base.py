@@ -1,23 +1,235 @@
 import chromadb
+import numpy as np
 import os
-from typing import List, Dict, Optional
-import uuid
-import PyPDF2
-from io import BytesIO
-from duckduckgo_search import DDGS
+from typing import Any, Callable, Iterator, List, Dict, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import tempfile
+import threading
+import logging
+import time
+from utils.chunking import TextChunker, content_id
+from utils.embeddings import LocalEmbeddingFunction
+from utils.enrichment import EnrichmentQueue
+from utils.lexical_index import BM25Index
+from utils.maintenance import MaintenanceScheduler
+from utils.metrics import REGISTRY, span, timed
+from utils.web_search import SearchCache, WebSearcher
+
+logger = logging.getLogger("lovebot.kb")
+
+# vacuum() drives chromadb's internal SqliteDB, whose API is only known to
+# match in these releases (major, minor); others skip vacuuming
+CHROMA_VACUUM_VERSIONS = {(0, 6)}
+
+def _chroma_release(version: str):
+    """(major, minor) of a chromadb version string, or None if it can't be read"""
+    parts = version.split(".")
+    try:
+        return int(parts[0]), int(parts[1])
+    except (IndexError, ValueError):
+        return None
+
+def _default_ddgs():
+    from duckduckgo_search import DDGS
+    return DDGS()
+
+class QueryCache:
+    """Thread-safe LRU cache with per-entry TTL and an approximate memory cap"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 600,
+                 max_bytes: int = 32 * 1024 * 1024, sizeof: Callable[[Any], int] = None):
+        """
+        Args:
+            max_entries: Maximum number of entries kept
+            ttl: Seconds an entry stays valid, None for no expiry
+            max_bytes: Approximate memory cap across all entries
+            sizeof: Estimates the size of a value in bytes
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: len(repr(value)))
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+    
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
 
 class KnowledgeBaseManager:
-    def __init__(self):
+    def __init__(self, enrichment_workers: int = 2, enrichment_queue_size: int = 32,
+                 batch_size: int = 64, persist_directory: str = "./knowledge_base",
+                 cache_size: int = 1024, cache_ttl: Optional[float] = 600,
+                 cache_max_bytes: int = 32 * 1024 * 1024, pdf_workers: Optional[int] = None,
+                 chunk_size: int = 1000, chunk_overlap: int = 150, chunk_unit: str = "chars",
+                 embedding_function=None, embedding_batch_size: int = 32,
+                 embedding_threads: Optional[int] = None, embedding_cache_path: Optional[str] = None,
+                 warmup_embeddings: bool = False, hybrid_search: bool = True, rrf_k: int = 60,
+                 web_search_cache_path: Optional[str] = None, web_search_ttl: Optional[float] = 86400,
+                 web_search_limiter=None, ddgs_factory: Optional[Callable[[], Any]] = None,
+                 web_search_threshold: float = 0.5, min_relevance: float = 0.3,
+                 web_max_age: Optional[float] = 30 * 86400, web_max_idle: Optional[float] = None,
+                 web_max_bytes: Optional[int] = None, web_max_chunks: Optional[int] = None,
+                 maintenance_interval: Optional[float] = None, vector_backend: str = "chroma"):
+        # Number of chunks embedded and written per collection.add call
+        self.batch_size = batch_size
+        # Sentence/paragraph-aware chunking with overlap between neighbouring chunks
+        self.chunker = TextChunker(chunk_size=chunk_size, overlap=chunk_overlap, unit=chunk_unit)
+        # Processes used to extract PDF pages (None = CPU count)
+        self.pdf_workers = pdf_workers
         # Initialize ChromaDB client with persistent storage
-        self.client = chromadb.PersistentClient(path="./knowledge_base")
-        # Create or get the collection
-        self.collection = self.client.get_or_create_collection(
-            name="relationship_knowledge",
-            metadata={"description": "Relationship advice and psychology knowledge"}
+        self.persist_directory = persist_directory
+        # Embed queries ourselves so query embeddings can be cached. The local
+        # CPU model keeps every embedding it computes in an on-disk cache
+        if embedding_function is None:
+            embedding_function = LocalEmbeddingFunction(
+                cache_path=embedding_cache_path or os.path.join(persist_directory, "embedding_cache.sqlite3"),
+                batch_size=embedding_batch_size,
+                num_threads=embedding_threads
+            )
+        self.embedding_function = embedding_function
+        if warmup_embeddings and hasattr(embedding_function, "warmup"):
+            # Load the model in the background now instead of on the first query
+            embedding_function.warmup(background=True)
+        # Create or get the collection. The "quantized" backend keeps int8
+        # vectors in memory-mapped files with an IVF index instead of Chroma's
+        # in-memory HNSW, for knowledge bases too large to hold in RAM
+        if vector_backend == "quantized":
+            from utils.vector_index import QuantizedCollection
+            self.client = None
+            self.collection = QuantizedCollection(
+                os.path.join(persist_directory, "quantized_index"),
+                embedding_function=self.embedding_function
+            )
+        elif vector_backend == "chroma":
+            self.client = chromadb.PersistentClient(path=persist_directory)
+            self.collection = self.client.get_or_create_collection(
+                name="relationship_knowledge",
+                metadata={"description": "Relationship advice and psychology knowledge"},
+                embedding_function=self.embedding_function
+            )
+        else:
+            raise ValueError(f"Unknown vector backend: {vector_backend}")
+        # Query embeddings stay valid until the embedding model changes;
+        # search results are dropped whenever the collection changes
+        self.embedding_cache = QueryCache(
+            max_entries=cache_size, ttl=None, max_bytes=cache_max_bytes // 2,
+            sizeof=lambda embedding: len(embedding) * 8
+        )
+        self.result_cache = QueryCache(
+            max_entries=cache_size, ttl=cache_ttl, max_bytes=cache_max_bytes // 2
+        )
+        # Bumped on every write so a query racing a write never caches stale results
+        self._generation = 0
+        # BM25 index over the same chunks, fused with vector results so exact
+        # terms (names, jargon from uploaded PDFs) are found too. It is persisted
+        # next to the vector store, kept current on every write, and loaded on a
+        # background thread at startup; searches are vector-only until then
+        self.lexical_index = BM25Index(
+            path=os.path.join(persist_directory, "lexical_index.sqlite3")
+        ) if hybrid_search else None
+        self._lexical_loaded = False
+        self._lexical_lock = threading.Lock()
+        if self.lexical_index is not None:
+            threading.Thread(target=self._lexical, name="bm25-load", daemon=True).start()
+        # Reciprocal-rank fusion constant; larger values flatten the rank weighting
+        self.rrf_k = rrf_k
+        # Relevance is the similarity implied by the vector distance, 0 (unrelated)
+        # to 1 (identical). Retrieval only goes to the web when a query's best
+        # local hit is below web_search_threshold, and snippets below
+        # min_relevance are left out of prompts
+        self.web_search_threshold = web_search_threshold
+        self.min_relevance = min_relevance
+        # DuckDuckGo clients are created on first use, one per thread, so
+        # concurrent sessions never share one
+        self.ddgs_factory = ddgs_factory or _default_ddgs
+        self._ddgs_local = threading.local()
+        # Web results are cached on disk by normalized query, identical searches
+        # in flight share one request, and all searches in the process share
+        # one rate limit (LOVEBOT_WEB_SEARCH_RPS)
+        self.web_searcher = WebSearcher(
+            self._search_ddgs,
+            cache=SearchCache(
+                web_search_cache_path or os.path.join(persist_directory, "web_search_cache.sqlite3"),
+                ttl=web_search_ttl
+            ),
+            limiter=web_search_limiter
+        )
+        # Web enrichment runs in the background so retrieval never waits on it
+        self.enrichment_queue = EnrichmentQueue(
+            self.enrich_knowledge_base,
+            max_workers=enrichment_workers,
+            max_pending=enrichment_queue_size
         )
-        # Initialize DuckDuckGo search
-        self.ddgs = DDGS()
+        # Retention for web chunks (uploads are never evicted): seconds since
+        # ingestion, seconds since last used in a prompt, and caps on total web
+        # text size and chunk count, enforced least recently used first
+        self.web_max_age = web_max_age
+        self.web_max_idle = web_max_idle
+        self.web_max_bytes = web_max_bytes
+        self.web_max_chunks = web_max_chunks
+        # Uses of web chunks since the last maintenance run: id -> [count, last used]
+        self._access = {}
+        self._access_lock = threading.Lock()
+        self.maintenance = MaintenanceScheduler(self.run_maintenance, maintenance_interval) if maintenance_interval else None
+        if self.maintenance is not None:
+            self.maintenance.start()
     
+    @timed("add_document")
     def add_document(self, text: str = None, file=None, metadata: Optional[Dict] = None) -> str:
         """
         Add a document to the knowledge base
@@ -27,114 +239,670 @@ class KnowledgeBaseManager:
             metadata: Additional metadata for the document
         Returns: document_id
         """
-        doc_id = str(uuid.uuid4())
-        if metadata is None:
-            metadata = {}
+        return self.ingest_document(text=text, file=file, metadata=metadata)["doc_id"]
+    
+    def ingest_document(self, text: str = None, file=None, metadata: Optional[Dict] = None,
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Add a document, skipping chunks that are already stored
+        Args:
+            progress_callback: For PDFs, called with (pages_done, total_pages)
+        Returns: {"doc_id", "added", "skipped"} with chunk counts
+        """
+        if file is not None and file.type == "application/pdf":
+            return self.ingest_pdf(file, metadata, progress_callback)
+        doc_id, ids, chunks, metadatas = self._prepare_document(text, file, metadata)
+        added, skipped = self.add_chunks(ids, chunks, metadatas)
+        return {"doc_id": doc_id, "added": added, "skipped": skipped}
+    
+    def add_documents(self, texts: Optional[List[str]] = None, files: Optional[List] = None,
+                      metadatas: Optional[List[Optional[Dict]]] = None) -> List[str]:
+        """
+        Add many documents in one pass, batching chunks across documents
+        Args:
+            texts: Direct text contents
+            files: Streamlit UploadedFile (or compatible) objects
+            metadatas: Per-document metadata, matching texts followed by files
+        Returns: document_ids in input order
+        """
+        return self.ingest_documents(texts=texts, files=files, metadatas=metadatas)["doc_ids"]
+    
+    @timed("ingest_documents")
+    def ingest_documents(self, texts: Optional[List[str]] = None, files: Optional[List] = None,
+                         metadatas: Optional[List[Optional[Dict]]] = None) -> Dict:
+        """
+        Bulk variant of ingest_document
+        Returns: {"doc_ids", "added", "skipped"} with chunk counts over all documents
+        """
+        sources = [(text, None) for text in texts or []] + [(None, file) for file in files or []]
+        if metadatas is None:
+            metadatas = [None] * len(sources)
+        if len(metadatas) != len(sources):
+            raise ValueError("metadatas must have one entry per document")
+        
+        doc_ids = []
+        added = skipped = 0
+        batch_ids, batch_chunks, batch_metadatas = [], [], []
+        for (text, file), metadata in zip(sources, metadatas):
+            doc_id, ids, chunks, chunk_metadatas = self._prepare_document(text, file, metadata)
+            doc_ids.append(doc_id)
+            batch_ids.extend(ids)
+            batch_chunks.extend(chunks)
+            batch_metadatas.extend(chunk_metadatas)
+            if len(batch_ids) >= self.batch_size:
+                batch_added, batch_skipped = self.add_chunks(batch_ids, batch_chunks, batch_metadatas)
+                added += batch_added
+                skipped += batch_skipped
+                batch_ids, batch_chunks, batch_metadatas = [], [], []
+        if batch_ids:
+            batch_added, batch_skipped = self.add_chunks(batch_ids, batch_chunks, batch_metadatas)
+            added += batch_added
+            skipped += batch_skipped
+        return {"doc_ids": doc_ids, "added": added, "skipped": skipped}
+    
+    @staticmethod
+    def _content_id(text: str, source: str) -> str:
+        """Stable ID derived from whitespace-normalized text and its source"""
+        return content_id(text, source)
+    
+    @staticmethod
+    def _source_of(metadata: Dict) -> str:
+        """Where a document came from, used to scope content hashes"""
+        return metadata.get("url") or metadata.get("filename") or metadata.get("source", "local")
+    
+    def _prepare_document(self, text: Optional[str], file, metadata: Optional[Dict]):
+        """Extract, chunk and label a document. Returns (doc_id, ids, chunks, metadatas)."""
+        metadata = dict(metadata) if metadata else {}
         
         # Process file if provided
         if file is not None:
             if file.type == "application/pdf":
-                text = self._extract_pdf_text(file)
-                metadata["file_type"] = "pdf"
-            else:
-                text = file.read().decode()
-                metadata["file_type"] = "text"
+                return self._prepare_pdf(file, metadata)
+            text = file.read().decode()
+            metadata["file_type"] = "text"
             metadata["filename"] = file.name
         
         if not text:
             raise ValueError("No content provided")
         
+        source = self._source_of(metadata)
+        doc_id = self._content_id(text, source)
+        
         # Split long documents into chunks
         chunks = self._chunk_text(text)
         
-        # Add chunks to the collection
-        for i, chunk in enumerate(chunks):
+        ids, metadatas = self.label_chunks(doc_id, chunks, metadata)
+        return doc_id, ids, chunks, metadatas
+    
+    def label_chunks(self, doc_id: str, chunks: List[str], metadata: Dict,
+                     first_index: int = 0, total_chunks: bool = True):
+        """
+        IDs and per-chunk metadata for a chunked document, derived as uploads
+        derive them, for callers that chunk documents themselves (e.g.
+        utils.bulk_ingest). Streamed documents label their chunks as they
+        arrive, starting at first_index and without total_chunks.
+        Returns: (ids, metadatas)
+        """
+        source = self._source_of(metadata)
+        ids = []
+        metadatas = []
+        for i, chunk in enumerate(chunks, first_index):
             chunk_metadata = metadata.copy()
+            chunk_metadata["doc_id"] = doc_id
             chunk_metadata["chunk_index"] = i
-            chunk_metadata["total_chunks"] = len(chunks)
-            self.collection.add(
-                documents=[chunk],
-                metadatas=[chunk_metadata],
-                ids=[f"{doc_id}_chunk_{i}"]
-            )
-        return doc_id
+            chunk_metadata["chunking"] = self.chunker.signature
+            if total_chunks:
+                chunk_metadata["total_chunks"] = len(chunks)
+            ids.append(self._content_id(chunk, source))
+            metadatas.append(chunk_metadata)
+        return ids, metadatas
+    
+    def add_chunks(self, ids: List[str], chunks: List[str], metadatas: List[Dict]):
+        """
+        Embed and write chunks to the collection in batches of batch_size,
+        skipping IDs that are already stored
+        Returns: (added, skipped) chunk counts
+        """
+        added = skipped = 0
+        now = time.time()
+        for start in range(0, len(ids), self.batch_size):
+            end = start + self.batch_size
+            # Chroma rejects repeated IDs in get, so look each one up once
+            existing = set(self.collection.get(ids=list(dict.fromkeys(ids[start:end])), include=[])["ids"])
+            new_ids, new_chunks, new_metadatas = [], [], []
+            for chunk_id, chunk, chunk_metadata in zip(ids[start:end], chunks[start:end], metadatas[start:end]):
+                if chunk_id in existing:
+                    skipped += 1
+                    continue
+                # Also catches repeats within the same batch
+                existing.add(chunk_id)
+                new_ids.append(chunk_id)
+                new_chunks.append(chunk)
+                new_metadatas.append(dict(chunk_metadata, ingested_at=now))
+            if new_ids:
+                with span("chroma_add", chunks=len(new_ids)):
+                    self.collection.add(
+                        documents=new_chunks,
+                        metadatas=new_metadatas,
+                        ids=new_ids
+                    )
+                self._index_lexical(new_ids, new_chunks, new_metadatas)
+                added += len(new_ids)
+        if added:
+            self._invalidate_results()
+        return added, skipped
+    
+    def compact(self, page_size: int = 1000) -> Dict:
+        """
+        Remove duplicate chunks (same normalized text and source) left by
+        earlier non-idempotent ingestion, keeping the first copy of each
+        Returns: {"scanned", "removed"}
+        """
+        seen = set()
+        duplicates = []
+        scanned = 0
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for chunk_id, doc, chunk_metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                key = self._content_id(doc or "", self._source_of(chunk_metadata or {}))
+                if key in seen:
+                    duplicates.append(chunk_id)
+                else:
+                    seen.add(key)
+            scanned += len(page["ids"])
+            offset += page_size
+        
+        self._delete_chunks(duplicates)
+        return {"scanned": scanned, "removed": len(duplicates)}
+    
+    def rechunk(self, page_size: int = 1000) -> Dict:
+        """
+        Re-chunk documents whose chunks were made with other chunking settings,
+        or before chunks recorded them, so they match what an upload stores now.
+        Each document's text is rebuilt from its chunks in order, dropping the
+        overlap they repeat; doc_id and metadata are kept. Web search snippets
+        are left alone.
+        Returns: {"scanned", "documents", "added", "removed"}
+        """
+        signature = self.chunker.signature
+        stale = {}  # doc_id -> [(chunk_index, id, text, metadata)]
+        scanned = 0
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for chunk_id, doc, chunk_metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                chunk_metadata = chunk_metadata or {}
+                if "doc_id" not in chunk_metadata or chunk_metadata.get("chunking") == signature:
+                    continue
+                if chunk_metadata.get("source") == "web" and not (
+                        "file_type" in chunk_metadata or "filename" in chunk_metadata):
+                    continue
+                stale.setdefault(chunk_metadata["doc_id"], []).append(
+                    (chunk_metadata.get("chunk_index", 0), chunk_id, doc or "", chunk_metadata)
+                )
+            scanned += len(page["ids"])
+            offset += len(page["ids"])
+        
+        added = 0
+        removed = []
+        for doc_id, parts in stale.items():
+            parts.sort(key=lambda part: part[0])
+            first = parts[0][3]
+            text = self._rejoin([part[2] for part in parts], first.get("chunking"))
+            chunks = self._chunk_text(text)
+            if not chunks:
+                continue
+            metadata = {key: value for key, value in first.items()
+                        if key not in ("chunk_index", "total_chunks", "chunking", "ingested_at")}
+            ids, metadatas = self.label_chunks(doc_id, chunks, metadata, total_chunks="total_chunks" in first)
+            # New chunks go in before the old ones go, so a failed run loses nothing;
+            # chunks whose text is unchanged keep their ID and just get relabelled
+            old_ids = {part[1] for part in parts}
+            added += self.add_chunks(ids, chunks, metadatas)[0]
+            kept = [(chunk_id, chunk_metadata) for chunk_id, chunk_metadata in zip(ids, metadatas)
+                    if chunk_id in old_ids]
+            for start in range(0, len(kept), self.batch_size):
+                batch = kept[start:start + self.batch_size]
+                self.collection.update(ids=[chunk_id for chunk_id, _ in batch],
+                                       metadatas=[chunk_metadata for _, chunk_metadata in batch])
+            removed.extend(old_ids - set(ids))
+        
+        self._delete_chunks(removed)
+        return {"scanned": scanned, "documents": len(stale), "added": added, "removed": len(removed)}
+    
+    @staticmethod
+    def _rejoin(chunks: List[str], signature: Optional[str]) -> str:
+        """
+        Text of a document rebuilt from its chunks. Chunks from before chunking
+        was recorded never overlap; later ones may start with whole trailing
+        sentences of the chunk before, which are dropped.
+        """
+        overlap = int(signature.rsplit(":", 1)[1]) if signature else 0
+        text = chunks[0]
+        for previous, chunk in zip(chunks, chunks[1:]):
+            carried = 0
+            if overlap:
+                # Longest start of this chunk, ending at whitespace, that ends the previous one
+                for end in range(min(len(previous), len(chunk)) - 1, 0, -1):
+                    if chunk[end].isspace() and not chunk[end - 1].isspace() and previous.endswith(chunk[:end]):
+                        carried = end
+                        break
+            text += chunk[carried:] if carried else " " + chunk
+        return text
+    
+    def _record_access(self, results: List[Dict]):
+        """Count uses of web chunks; written to their metadata by the next maintenance run"""
+        now = time.time()
+        with self._access_lock:
+            for doc in results:
+                if doc['metadata'].get('source') == 'web':
+                    entry = self._access.setdefault(doc['id'], [0, now])
+                    entry[0] += 1
+                    entry[1] = now
     
-    def _extract_pdf_text(self, file) -> str:
-        """Extract text content from PDF file"""
+    def flush_access_stats(self) -> int:
+        """Add pending uses to each chunk's access_count and last_accessed_at. Returns chunks updated."""
+        with self._access_lock:
+            pending, self._access = self._access, {}
+        ids = list(pending)
+        updated = 0
+        for start in range(0, len(ids), self.batch_size):
+            found = self.collection.get(ids=ids[start:start + self.batch_size], include=["metadatas"])
+            if not found['ids']:
+                continue
+            # Metadata updates are merged into the stored metadata
+            self.collection.update(ids=found['ids'], metadatas=[{
+                "access_count": (chunk_metadata or {}).get("access_count", 0) + pending[chunk_id][0],
+                "last_accessed_at": pending[chunk_id][1]
+            } for chunk_id, chunk_metadata in zip(found['ids'], found['metadatas'])])
+            updated += len(found['ids'])
+        return updated
+    
+    def evict_web_chunks(self, max_age: Optional[float] = None, max_idle: Optional[float] = None,
+                         max_bytes: Optional[int] = None, max_chunks: Optional[int] = None,
+                         page_size: int = 1000) -> Dict:
+        """
+        Delete web chunks that are older than max_age seconds or unused for
+        max_idle seconds, then the least recently used ones until the rest fit
+        in max_bytes of text and max_chunks. Uploaded documents are never touched.
+        Web chunks stored before timestamps existed are stamped now and age from there.
+        Returns: {"scanned", "evicted_age", "evicted_idle", "evicted_size", "web_chunks", "web_bytes"}
+        """
+        now = time.time()
+        candidates = []  # (last used, size, id)
+        expired = idle = 0
+        doomed = []
+        unstamped = []
+        scanned = 0
+        offset = 0
+        while True:
+            page = self.collection.get(where={"source": "web"}, include=["documents", "metadatas"],
+                                       limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+            for chunk_id, doc, chunk_metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                chunk_metadata = chunk_metadata or {}
+                if "file_type" in chunk_metadata or "filename" in chunk_metadata:
+                    continue
+                ingested_at = chunk_metadata.get("ingested_at")
+                if ingested_at is None:
+                    unstamped.append(chunk_id)
+                    ingested_at = now
+                last_used = chunk_metadata.get("last_accessed_at", ingested_at)
+                if max_age is not None and now - ingested_at > max_age:
+                    doomed.append(chunk_id)
+                    expired += 1
+                elif max_idle is not None and now - last_used > max_idle:
+                    doomed.append(chunk_id)
+                    idle += 1
+                else:
+                    candidates.append((last_used, len((doc or "").encode("utf-8")), chunk_id))
+            scanned += len(page["ids"])
+            offset += len(page["ids"])
+        
+        for start in range(0, len(unstamped), self.batch_size):
+            batch = unstamped[start:start + self.batch_size]
+            self.collection.update(ids=batch, metadatas=[{"ingested_at": now}] * len(batch))
+        
+        # Over a cap: least recently used go first
+        candidates.sort()
+        total_bytes = sum(size for _, size, _ in candidates)
+        over_size = 0
+        while candidates and ((max_bytes is not None and total_bytes > max_bytes) or
+                              (max_chunks is not None and len(candidates) - over_size > max_chunks)):
+            _, size, chunk_id = candidates[over_size]
+            doomed.append(chunk_id)
+            total_bytes -= size
+            over_size += 1
+            if over_size == len(candidates):
+                break
+        
+        self._delete_chunks(doomed)
+        return {
+            "scanned": scanned,
+            "evicted_age": expired,
+            "evicted_idle": idle,
+            "evicted_size": over_size,
+            "web_chunks": len(candidates) - over_size,
+            "web_bytes": total_bytes
+        }
+    
+    def _delete_chunks(self, ids: List[str]):
+        for start in range(0, len(ids), self.batch_size):
+            self.collection.delete(ids=ids[start:start + self.batch_size])
+        with self._access_lock:
+            for chunk_id in ids:
+                self._access.pop(chunk_id, None)
+        self._unindex_lexical(ids)
+        if ids:
+            self._invalidate_results()
+    
+    def vacuum(self) -> bool:
+        """
+        Drop Chroma's already-applied write-ahead log and VACUUM its SQLite
+        file (or compact the quantized index) so deleted chunks give disk
+        space back. Returns False when the store doesn't support it.
+        """
         try:
-            pdf_content = BytesIO(file.read())
-            reader = PyPDF2.PdfReader(pdf_content)
-            text = []
-            for page in reader.pages:
+            if hasattr(self.collection, "vacuum"):
+                return self.collection.vacuum()
+            if _chroma_release(chromadb.__version__) not in CHROMA_VACUUM_VERSIONS:
+                logger.warning("Vacuum skipped: not supported on chromadb %s", chromadb.__version__)
+                return False
+            from chromadb.db.impl.sqlite import SqliteDB
+            db = self.client._system.instance(SqliteDB)
+            db.purge_log(collection_id=self.collection.id)
+            db.vacuum()
+            return True
+        except Exception as e:
+            logger.warning("Vacuum failed: %s", e)
+            return False
+    
+    def disk_usage(self) -> int:
+        """Bytes used by the persistence directory"""
+        total = 0
+        for root, _, files in os.walk(self.persist_directory):
+            for name in files:
                 try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text.append(page_text)
-                except Exception as e:
-                    print(f"Error extracting text from page: {e}")
-                    continue
-            return "\n".join(text)
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    
+    @timed("maintenance")
+    def run_maintenance(self, vacuum: bool = True) -> Dict:
+        """
+        Flush access counters, evict web chunks under the retention settings,
+        remove duplicates and vacuum the store if anything was deleted
+        Returns: eviction counts plus "duplicates_removed", "bytes_before",
+            "bytes_after" and "reclaimed_bytes"
+        """
+        bytes_before = self.disk_usage()
+        self.flush_access_stats()
+        report = self.evict_web_chunks(
+            max_age=self.web_max_age,
+            max_idle=self.web_max_idle,
+            max_bytes=self.web_max_bytes,
+            max_chunks=self.web_max_chunks
+        )
+        report["duplicates_removed"] = self.compact()["removed"]
+        removed = (report["evicted_age"] + report["evicted_idle"] + report["evicted_size"]
+                   + report["duplicates_removed"])
+        # VACUUM blocks every read and write while it runs, so skip it when nothing was deleted
+        report["vacuumed"] = self.vacuum() if vacuum and removed else False
+        report["bytes_before"] = bytes_before
+        report["bytes_after"] = self.disk_usage()
+        report["reclaimed_bytes"] = bytes_before - report["bytes_after"]
+        return report
+    
+    @timed("ingest_pdf")
+    def ingest_pdf(self, file, metadata: Optional[Dict] = None,
+                   progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        Stream a PDF into the knowledge base. Pages are extracted in parallel
+        worker processes and chunked as they arrive, and chunks are written
+        batch_size at a time, so peak memory follows the batch size rather
+        than the document size. Chunks carry chunk_index but no total_chunks.
+        Args:
+            file: Streamlit UploadedFile (or any object with read() and name)
+            metadata: Additional metadata for the document
+            progress_callback: Called with (pages_done, total_pages)
+        Returns: {"doc_id", "added", "skipped", "pages"}
+        """
+        metadata = dict(metadata) if metadata else {}
+        metadata["file_type"] = "pdf"
+        metadata["filename"] = file.name
+        
+        added = skipped = 0
+        chunk_index = 0
+        pages = 0
+        batch_ids, batch_chunks, batch_metadatas = [], [], []
+        
+        def queue_chunk(chunk):
+            nonlocal chunk_index
+            ids, metadatas = self.label_chunks(doc_id, [chunk], metadata, chunk_index, total_chunks=False)
+            chunk_index += 1
+            batch_ids.extend(ids)
+            batch_chunks.append(chunk)
+            batch_metadatas.extend(metadatas)
+        
+        def on_page(pages_done, total_pages):
+            nonlocal pages
+            pages = total_pages
+            if progress_callback:
+                progress_callback(pages_done, total_pages)
+        
+        with self._spool_to_disk(file) as (path, digest):
+            doc_id = self._content_id(digest, self._source_of(metadata))
+            # Chunks come out as soon as enough following text has been extracted
+            for chunk in self.chunker.chunk_stream(self._pdf_page_texts(path, on_page)):
+                queue_chunk(chunk)
+                if len(batch_ids) >= self.batch_size:
+                    batch_added, batch_skipped = self.add_chunks(batch_ids, batch_chunks, batch_metadatas)
+                    added += batch_added
+                    skipped += batch_skipped
+                    batch_ids, batch_chunks, batch_metadatas = [], [], []
+        
+        if chunk_index == 0:
+            raise ValueError("No content provided")
+        if batch_ids:
+            batch_added, batch_skipped = self.add_chunks(batch_ids, batch_chunks, batch_metadatas)
+            added += batch_added
+            skipped += batch_skipped
+        return {"doc_id": doc_id, "added": added, "skipped": skipped, "pages": pages}
+    
+    @contextmanager
+    def _spool_to_disk(self, file):
+        """Copy an upload to a temporary file for the extraction workers. Yields (path, sha256)."""
+        if hasattr(file, "seek"):
+            file.seek(0)
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    block = file.read(1 << 20)
+                    if not block:
+                        break
+                    digest.update(block)
+                    out.write(block)
+            yield path, digest.hexdigest()
+        finally:
+            os.remove(path)
+    
+    def _pdf_page_texts(self, path: str,
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> Iterator[str]:
+        """Page texts of a spooled PDF, extracted in parallel worker processes"""
+        from utils.pdf_extract import iter_pdf_pages
+        # Only extraction errors are reported as such; errors raised by the
+        # consumer between pages propagate unchanged
+        try:
+            for page_index, total_pages, page_text in iter_pdf_pages(path, self.pdf_workers):
+                if progress_callback:
+                    progress_callback(page_index + 1, total_pages)
+                yield page_text
         except Exception as e:
-            raise ValueError(f"Failed to extract text from PDF: {str(e)}")
+            raise ValueError(f"Failed to extract text from PDF: {str(e)}") from e
+    
+    def _prepare_pdf(self, file, metadata: Dict):
+        """
+        _prepare_document for a PDF, with the same doc_id, chunks and chunk
+        metadata that ingest_pdf stores for it
+        """
+        metadata["file_type"] = "pdf"
+        metadata["filename"] = file.name
+        with self._spool_to_disk(file) as (path, digest):
+            doc_id = self._content_id(digest, self._source_of(metadata))
+            chunks = list(self.chunker.chunk_stream(self._pdf_page_texts(path)))
+        if not chunks:
+            raise ValueError("No content provided")
+        ids, metadatas = self.label_chunks(doc_id, chunks, metadata, total_chunks=False)
+        return doc_id, ids, chunks, metadatas
     
-    def _chunk_text(self, text: str, chunk_size: int = 1000) -> List[str]:
+    def _chunk_text(self, text: str) -> List[str]:
         """Split text into smaller chunks"""
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        for word in words:
-            current_size += len(word) + 1  # +1 for space
-            if current_size > chunk_size:
-                chunks.append(" ".join(current_chunk))
-                current_chunk = [word]
-                current_size = len(word)
-            else:
-                current_chunk.append(word)
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-        return chunks
+        return self.chunker.chunk(text)
+    
+    @property
+    def ddgs(self):
+        """This thread's DuckDuckGo client"""
+        client = getattr(self._ddgs_local, "client", None)
+        if client is None:
+            client = self._ddgs_local.client = self.ddgs_factory()
+        return client
+    
+    def _search_ddgs(self, query: str, max_results: int) -> List[Dict]:
+        results = []
+        for r in self.ddgs.text(query, max_results=max_results):
+            results.append({
+                'title': r['title'],
+                'body': r['body'],
+                # Current duckduckgo_search releases call it href, older ones link
+                'link': r.get('href') or r.get('link')
+            })
+        return results
     
+    @timed("search_web")
     def search_web(self, query: str, max_results: int = 3) -> List[Dict]:
-        """Search the web using DuckDuckGo"""
+        """Search the web using DuckDuckGo, through the shared cache and rate limit"""
         try:
-            results = []
-            for r in self.ddgs.text(query, max_results=max_results):
-                results.append({
-                    'title': r['title'],
-                    'body': r['body'],
-                    'link': r['link']
-                })
-            return results
+            return self.web_searcher.search(query, max_results)
         except Exception as e:
-            print(f"Web search error: {e}")
+            logger.warning("Web search error: %s", e)
             return []
     
+    @timed("enrich_knowledge_base")
     def enrich_knowledge_base(self, query: str):
         """Enrich knowledge base with web search results"""
         web_results = self.search_web(query)
-        for result in web_results:
-            try:
-                self.add_document(
-                    text=f"{result['title']}\n\n{result['body']}",
-                    metadata={
-                        "source": "web",
-                        "url": result['link'],
-                        "query": query
-                    }
-                )
-            except Exception as e:
-                print(f"Error adding web result to knowledge base: {e}")
+        if not web_results:
+            return
+        try:
+            # One batched write for all results instead of one add per result
+            self.ingest_documents(
+                texts=[f"{result['title']}\n\n{result['body']}" for result in web_results],
+                metadatas=[{
+                    "source": "web",
+                    "url": result['link'],
+                    "query": query
+                } for result in web_results]
+            )
+        except Exception as e:
+            logger.warning("Error adding web result to knowledge base: %s", e)
     
-    def get_relevant_context(self, query: str, include_web_search: bool = True) -> str:
-        """Get relevant context for a query"""
-        if include_web_search:
-            try:
-                self.enrich_knowledge_base(query)
-            except Exception as e:
-                print(f"Error enriching knowledge base: {e}")
+    def get_relevant_context(self, query: str, include_web_search: bool = True,
+                             background: bool = True) -> str:
+        """
+        Get relevant context for a query
+        Args:
+            query: Search query
+            include_web_search: Enrich the knowledge base with web results for this query
+            background: Queue the enrichment so results land for later turns instead of
+                blocking this one; set to False to wait for it
+        """
+        return self.get_relevant_context_batch([query], include_web_search, background)
+    
+    def get_relevant_context_batch(self, queries: List[str], include_web_search: bool = True,
+                                   background: bool = True, n_results: int = 3) -> str:
+        """
+        Get combined context for several queries with a single vector query
+        Args:
+            queries: Search queries
+            include_web_search: Enrich the knowledge base with web results for these queries
+            background: Queue the enrichment instead of waiting for it; when False the
+                web lookups run concurrently and retrieval waits for all of them
+            n_results: Results per query before deduplication
+        """
+        return self.format_context(
+            self.get_relevant_documents(queries, include_web_search, background, n_results)
+        )
+    
+    # get_relevant_context and get_relevant_context_batch both end up here
+    @timed("get_relevant_context")
+    def get_relevant_documents(self, queries: List[str], include_web_search: bool = True,
+                               background: bool = True, n_results: int = 3,
+                               report: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Like get_relevant_context_batch, but returns the merged results instead of text.
+        The local collection is searched first and the web is only used for queries
+        whose best hit is below web_search_threshold; results below min_relevance
+        are dropped.
+        Args:
+            report: If given, one entry per query is appended with the gate decision:
+                {"query", "best_relevance", "web_search", "kept", "dropped"}
+        """
+        results = self.search_similar_batch(queries, n_results)
+        best = [max((doc['relevance'] for doc in docs), default=0.0) for docs in results]
+        to_enrich = [i for i, score in enumerate(best) if score < self.web_search_threshold] if include_web_search else []
         
-        results = self.search_similar(query)
+        if to_enrich:
+            if background:
+                # Results land in the knowledge base for later turns
+                for i in to_enrich:
+                    if not self.enrichment_queue.submit(queries[i]):
+                        logger.warning("Enrichment queue full, skipping web search for: %s", queries[i])
+            else:
+                with ThreadPoolExecutor(max_workers=len(to_enrich)) as pool:
+                    for future in [pool.submit(self.enrich_knowledge_base, queries[i]) for i in to_enrich]:
+                        try:
+                            future.result()
+                        except Exception as e:
+                            logger.warning("Error enriching knowledge base: %s", e)
+                # Search again now that the web results are stored
+                for i, docs in zip(to_enrich, self.search_similar_batch([queries[i] for i in to_enrich], n_results)):
+                    results[i] = docs
+        
+        # Merge hits across queries, keeping the first occurrence of each chunk
+        seen = set()
+        merged = []
+        enriched = set(to_enrich)
+        for i, (query, docs) in enumerate(zip(queries, results)):
+            kept = [doc for doc in docs if doc['relevance'] >= self.min_relevance]
+            decision = {
+                "query": query,
+                "best_relevance": round(best[i], 4),
+                "web_search": i in enriched,
+                "kept": len(kept),
+                "dropped": len(docs) - len(kept)
+            }
+            REGISTRY.increment("retrieval_web" if i in enriched else "retrieval_local")
+            logger.info("retrieval gate", extra={"fields": decision})
+            if report is not None:
+                report.append(decision)
+            for doc in kept:
+                if doc['id'] not in seen:
+                    seen.add(doc['id'])
+                    merged.append(doc)
+        self._record_access(merged)
+        return merged
+    
+    def format_context(self, results: List[Dict]) -> str:
+        """Render search results as a numbered context block"""
         if not results:
             return ""
         
@@ -147,18 +915,233 @@ class KnowledgeBaseManager:
                 context += f"{idx}. {doc['content']}\n\n"
         return context.strip()
     
-    def search_similar(self, query: str, n_results: int = 3) -> List[Dict]:
-        """Search for similar content"""
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results
-        )
-        # Format results
-        documents = []
-        for idx, doc in enumerate(results['documents'][0]):
-            documents.append({
-                'content': doc,
-                'metadata': results['metadatas'][0][idx] if results['metadatas'] else {},
-                'id': results['ids'][0][idx]
-            })
-        return documents
+    def flush_enrichment(self, timeout: Optional[float] = None) -> bool:
+        """Wait for queued web enrichment to finish. Returns False on timeout."""
+        return self.enrichment_queue.drain(timeout=timeout)
+    
+    def search_similar(self, query: str, n_results: int = 3, source: Optional[str] = None,
+                       filename: Optional[str] = None) -> List[Dict]:
+        """
+        Search for similar content
+        Args:
+            source: Only return "web" or "local" (uploaded) chunks
+            filename: Only return chunks from this uploaded file
+        Returns: results best first, each with 'score' (fused rank score), 'distance'
+            (vector distance), 'relevance' (0-1 similarity derived from the distance)
+            and 'bm25' (None for vector-only hits)
+        """
+        return self.search_similar_batch([query], n_results, source, filename)[0]
+    
+    @timed("search_similar")
+    def search_similar_batch(self, queries: List[str], n_results: int = 3, source: Optional[str] = None,
+                             filename: Optional[str] = None) -> List[List[Dict]]:
+        """Search for several queries at once; uncached queries share one collection.query call"""
+        normalized = [" ".join(query.lower().split()) for query in queries]
+        filters = {}
+        if source is not None:
+            filters["source"] = source
+        if filename is not None:
+            filters["filename"] = filename
+        cache_scope = (n_results, tuple(sorted(filters.items())))
+        results_by_query = {}
+        missing = []
+        for query in normalized:
+            if query in results_by_query or query in missing:
+                continue
+            cached = self.result_cache.get((query, cache_scope))
+            if cached is not None:
+                results_by_query[query] = cached
+            else:
+                missing.append(query)
+        
+        if missing:
+            generation = self._generation
+            lexical = self._lexical(wait=False)
+            # Fetch deeper candidate lists when they are going to be fused
+            candidates = n_results * 4 if lexical is not None else n_results
+            query_embeddings = self._embed_queries(missing)
+            with span("vector_query", queries=len(missing)):
+                results = self.collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=candidates,
+                    where=self._chroma_where(filters)
+                )
+            vector_hits = []
+            for q_idx in range(len(missing)):
+                # Format results
+                documents = []
+                for idx, doc in enumerate(results['documents'][q_idx]):
+                    documents.append({
+                        'content': doc,
+                        'metadata': (results['metadatas'][q_idx][idx] if results['metadatas'] else None) or {},
+                        'id': results['ids'][q_idx][idx],
+                        'distance': results['distances'][q_idx][idx] if results.get('distances') else None
+                    })
+                vector_hits.append(documents)
+            
+            if lexical is not None:
+                with span("bm25_query", queries=len(missing)):
+                    keyword_hits = [lexical.search(query, candidates, filters) for query in missing]
+                fused = self._fuse(vector_hits, keyword_hits, n_results, query_embeddings)
+            else:
+                fused = [documents[:n_results] for documents in vector_hits]
+            for documents in fused:
+                for doc in documents:
+                    doc['relevance'] = self._relevance(doc['distance'])
+            
+            for query, documents in zip(missing, fused):
+                results_by_query[query] = documents
+                if generation == self._generation:
+                    self.result_cache.set((query, cache_scope), documents)
+        
+        return [[dict(doc) for doc in results_by_query[query]] for query in normalized]
+    
+    def _fuse(self, vector_hits: List[List[Dict]], keyword_hits: List[List], n_results: int,
+              query_embeddings: List) -> List[List[Dict]]:
+        """Merge vector and BM25 rankings per query with reciprocal-rank fusion"""
+        known = {doc['id'] for documents in vector_hits for doc in documents}
+        # Keyword-only hits still need their text, metadata and embedding (for their
+        # distance to the query); fetch them in one call
+        keyword_only = list({doc_id for hits in keyword_hits for doc_id, _ in hits if doc_id not in known})
+        fetched = {}
+        embeddings = {}
+        if keyword_only:
+            found = self.collection.get(ids=keyword_only, include=["documents", "metadatas", "embeddings"])
+            for doc_id, doc, chunk_metadata, embedding in zip(found['ids'], found['documents'],
+                                                              found['metadatas'], found['embeddings']):
+                fetched[doc_id] = {'content': doc, 'metadata': chunk_metadata or {}, 'id': doc_id}
+                embeddings[doc_id] = embedding
+        
+        fused = []
+        for documents, hits, query_embedding in zip(vector_hits, keyword_hits, query_embeddings):
+            merged = {}
+            for rank, doc in enumerate(documents):
+                merged[doc['id']] = dict(doc, bm25=None, score=1.0 / (self.rrf_k + rank + 1))
+            for rank, (doc_id, bm25) in enumerate(hits):
+                if doc_id in merged:
+                    merged[doc_id]['bm25'] = bm25
+                    merged[doc_id]['score'] += 1.0 / (self.rrf_k + rank + 1)
+                elif doc_id in fetched:
+                    merged[doc_id] = dict(fetched[doc_id], bm25=bm25, score=1.0 / (self.rrf_k + rank + 1),
+                                          distance=self._distance(query_embedding, embeddings[doc_id]))
+            fused.append(sorted(merged.values(), key=lambda doc: -doc['score'])[:n_results])
+        return fused
+    
+    @property
+    def _space(self) -> str:
+        return (self.collection.metadata or {}).get("hnsw:space", "l2")
+    
+    def _distance(self, a, b) -> float:
+        """The distance Chroma would report between two embeddings"""
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        if self._space == "cosine":
+            return float(1.0 - a.dot(b) / ((np.linalg.norm(a) * np.linalg.norm(b)) or 1.0))
+        if self._space == "ip":
+            return float(1.0 - a.dot(b))
+        return float(((a - b) ** 2).sum())
+    
+    def _relevance(self, distance: Optional[float]) -> float:
+        """0-1 similarity for a distance; squared L2 between unit vectors is 2 - 2 * cosine"""
+        if distance is None:
+            return 0.0
+        similarity = 1.0 - distance / 2 if self._space == "l2" else 1.0 - distance
+        return min(1.0, max(0.0, similarity))
+    
+    @staticmethod
+    def _chroma_where(filters: Dict) -> Optional[Dict]:
+        """Translate search filters to a Chroma where clause; chunks without a source are local"""
+        clauses = []
+        for field, value in filters.items():
+            if field == "source" and value == "local":
+                clauses.append({"source": {"$ne": "web"}})
+            else:
+                clauses.append({field: value})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    
+    def _lexical(self, wait: bool = True) -> Optional[BM25Index]:
+        """
+        The BM25 index, loaded from its on-disk copy the first time it is needed
+        Args:
+            wait: Block until it is loaded; otherwise None while a load is running
+        """
+        if self.lexical_index is None:
+            return None
+        if not self._lexical_loaded:
+            if not self._lexical_lock.acquire(blocking=wait):
+                return None
+            try:
+                if not self._lexical_loaded:
+                    self._load_lexical()
+                    self._lexical_loaded = True
+            finally:
+                self._lexical_lock.release()
+            # Results cached while the index was loading are vector-only
+            self._invalidate_results()
+        return self.lexical_index
+    
+    def _load_lexical(self):
+        """Load the persisted index, rebuilding it from the collection when it is out of sync"""
+        start = time.perf_counter()
+        if self.lexical_index.stored_count() == self.collection.count():
+            loaded = self.lexical_index.load()
+            logger.info("Loaded BM25 index (%d chunks) in %.1fs", loaded, time.perf_counter() - start)
+            return
+        self.lexical_index.clear()
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=1000, offset=offset)
+            if not page["ids"]:
+                break
+            self.lexical_index.add(page["ids"], page["documents"], page["metadatas"])
+            offset += len(page["ids"])
+        logger.info("Rebuilt BM25 index (%d chunks) in %.1fs", offset, time.perf_counter() - start)
+    
+    def _index_lexical(self, ids: List[str], chunks: List[str], metadatas: List[Dict]):
+        # Always written, so the on-disk copy stays in sync; a load in progress
+        # holds the lock and already covers everything written before it
+        if self.lexical_index is None:
+            return
+        with self._lexical_lock:
+            self.lexical_index.add(ids, chunks, metadatas)
+    
+    def _unindex_lexical(self, ids: List[str]):
+        if self.lexical_index is None or not ids:
+            return
+        with self._lexical_lock:
+            self.lexical_index.remove(ids)
+    
+    def _embed_queries(self, normalized_queries: List[str]) -> List:
+        """Embed normalized queries in one call, reusing cached embeddings"""
+        embeddings = [self.embedding_cache.get(query) for query in normalized_queries]
+        missing = [query for query, embedding in zip(normalized_queries, embeddings) if embedding is None]
+        if missing:
+            computed = dict(zip(missing, self.embedding_function(missing)))
+            for query, embedding in computed.items():
+                self.embedding_cache.set(query, embedding)
+            embeddings = [computed[query] if embedding is None else embedding
+                          for query, embedding in zip(normalized_queries, embeddings)]
+        return embeddings
+    
+    def _invalidate_results(self):
+        """Drop cached search results after the collection changed"""
+        self._generation += 1
+        self.result_cache.clear()
+    
+    def get_cache_stats(self) -> Dict:
+        """Hit/miss counters for the query embedding, result, on-disk embedding and web search caches"""
+        stats = {
+            "embeddings": self.embedding_cache.get_stats(),
+            "results": self.result_cache.get_stats(),
+            "web_search": self.web_searcher.get_stats()
+        }
+        disk_cache = getattr(self.embedding_function, "cache", None)
+        if disk_cache is not None:
+            stats["embedding_store"] = {
+                "hits": disk_cache.hits,
+                "misses": disk_cache.misses,
+                "entries": disk_cache.count()
+            }
+        return stats
@@ -0,0 +1,192 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import heapq
+import json
+import math
+import re
+import sqlite3
+import threading
+
+_TOKEN = re.compile(r"\w+")
+# Very common words carry almost no BM25 weight but have the longest posting lists
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in into is it its me my "
+    "of on or our so that the their them they this to was we what when which who why "
+    "will with you your".split()
+)
+
+# Metadata fields kept per chunk so lexical results can be filtered like vector ones
+FILTER_FIELDS = ("source", "filename")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incremental in-memory inverted index with Okapi BM25 scoring. Chunks can
+    be added and removed one batch at a time; document frequencies and the
+    average length are kept up to date, so nothing is rebuilt on write.
+    With a path, every chunk's term counts are also written to SQLite, so a
+    new process can load() the index without re-reading and re-tokenizing
+    the corpus.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, path: Optional[str] = None):
+        self.k1 = k1
+        self.b = b
+        self._conn = None
+        self._store_lock = threading.Lock()
+        if path is not None:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, terms TEXT NOT NULL, fields TEXT NOT NULL)"
+            )
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_fields: Dict[str, Dict] = {}
+        # Terms per chunk, so removal only touches that chunk's posting lists
+        self.doc_terms: Dict[str, Tuple[str, ...]] = {}
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def add(self, ids: List[str], texts: List[str], metadatas: Optional[List[Dict]] = None):
+        """Index chunks; IDs that are already indexed are replaced"""
+        metadatas = metadatas if metadatas is not None else [None] * len(ids)
+        # Tokenize outside the lock so searches aren't blocked on it
+        prepared = [
+            (doc_id, Counter(tokenize(text or "")), self._fields(metadata))
+            for doc_id, text, metadata in zip(ids, texts, metadatas)
+        ]
+        self._insert(prepared)
+        self._store(
+            "INSERT OR REPLACE INTO chunks (id, terms, fields) VALUES (?, ?, ?)",
+            [(doc_id, json.dumps(counts), json.dumps(fields)) for doc_id, counts, fields in prepared]
+        )
+
+    def remove(self, ids: Iterable[str]):
+        ids = list(ids)
+        with self._lock:
+            for doc_id in ids:
+                if doc_id in self.doc_lengths:
+                    self._remove(doc_id)
+        self._store("DELETE FROM chunks WHERE id = ?", [(doc_id,) for doc_id in ids])
+
+    def clear(self):
+        with self._lock:
+            self.postings.clear()
+            self.doc_lengths.clear()
+            self.doc_fields.clear()
+            self.doc_terms.clear()
+            self.total_length = 0
+        self._store("DELETE FROM chunks", None)
+
+    def stored_count(self) -> Optional[int]:
+        """Chunks in the on-disk copy (None without a path)"""
+        if self._conn is None:
+            return None
+        with self._store_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def load(self, batch_size: int = 10000) -> int:
+        """Replace the in-memory index with the on-disk copy. Returns the chunk count."""
+        with self._lock:
+            self.postings.clear()
+            self.doc_lengths.clear()
+            self.doc_fields.clear()
+            self.doc_terms.clear()
+            self.total_length = 0
+        if self._conn is None:
+            return 0
+        with self._store_lock:
+            cursor = self._conn.execute("SELECT id, terms, fields FROM chunks")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                self._insert([(doc_id, json.loads(terms), json.loads(fields)) for doc_id, terms, fields in rows])
+        return len(self)
+
+    def _insert(self, prepared: List[Tuple[str, Dict[str, int], Dict]]):
+        with self._lock:
+            for doc_id, counts, fields in prepared:
+                if doc_id in self.doc_lengths:
+                    self._remove(doc_id)
+                for term, count in counts.items():
+                    self.postings.setdefault(term, {})[doc_id] = count
+                length = sum(counts.values())
+                self.doc_lengths[doc_id] = length
+                self.doc_fields[doc_id] = fields
+                self.doc_terms[doc_id] = tuple(counts)
+                self.total_length += length
+
+    def _store(self, sql: str, rows: Optional[List[Tuple]]):
+        if self._conn is None:
+            return
+        with self._store_lock:
+            if rows is None:
+                self._conn.execute(sql)
+            else:
+                self._conn.executemany(sql, rows)
+            self._conn.commit()
+
+    def search(self, query: str, n_results: int = 10,
+               filters: Optional[Dict[str, str]] = None) -> List[Tuple[str, float]]:
+        """
+        Rank indexed chunks for a query
+        Args:
+            filters: Field values chunks must match, e.g. {"source": "web"};
+                chunks without a source count as "local"
+        Returns: [(doc_id, bm25_score)] best first
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            count = len(self.doc_lengths)
+            if not count or not terms:
+                return []
+            average_length = self.total_length / count
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            if filters:
+                scores = {doc_id: score for doc_id, score in scores.items()
+                          if self._matches(self.doc_fields[doc_id], filters)}
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+    @staticmethod
+    def _fields(metadata: Optional[Dict]) -> Dict:
+        metadata = metadata or {}
+        fields = {field: metadata[field] for field in FILTER_FIELDS if field in metadata}
+        fields.setdefault("source", "local")
+        return fields
+
+    @staticmethod
+    def _matches(fields: Dict, filters: Dict[str, str]) -> bool:
+        return all(fields.get(field) == value for field, value in filters.items())
+
+    def _remove(self, doc_id: str):
+        """Drop one chunk; caller holds the lock"""
+        for term in self.doc_terms.pop(doc_id, ()):
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        self.doc_fields.pop(doc_id, None)
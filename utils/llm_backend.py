@@ -0,0 +1,381 @@
+"""
+Provider-agnostic LLM backend. Each provider adapts one API to the same
+complete/stream interface; LLMRouter sends every request to the provider
+that has recently been fastest and fails over to the next one on errors
+or timeouts. The router also exposes the Groq SDK's
+client.chat.completions.create(...) surface, so it can be used anywhere a
+Groq client is.
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from types import SimpleNamespace
+from typing import Callable, Dict, Iterator, List, Optional
+import contextvars
+import logging
+import os
+import threading
+import time
+import httpx
+from utils.llm_client import GROQ_BASE_URL, LLMError, get_shared_client, iter_sse
+
+logger = logging.getLogger("lovebot.llm")
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+ANTHROPIC_BASE_URL = "https://api.anthropic.com/v1"
+ANTHROPIC_VERSION = "2023-06-01"
+
+
+class Provider(ABC):
+    """
+    One model behind one API
+    Subclasses implement complete() and stream(); params are sampling
+    parameters such as temperature, max_tokens and top_p. HTTP providers take
+    timeout and max_retries for their client (None = the LLMClient defaults);
+    behind a router they should fail fast and leave retrying to failover.
+    """
+    name = "provider"
+    model = None
+
+    @abstractmethod
+    def complete(self, messages: List[Dict], **params) -> str:
+        ...
+
+    @abstractmethod
+    def stream(self, messages: List[Dict], **params) -> Iterator[str]:
+        ...
+
+
+class OpenAICompatibleProvider(Provider):
+    """Any API that speaks OpenAI's /chat/completions (OpenAI, Groq, local servers)"""
+
+    def __init__(self, name: str, api_key: str, model: str, base_url: str,
+                 timeout: Optional[float] = None, max_retries: Optional[int] = None):
+        self.name = name
+        self.model = model
+        self.client = get_shared_client(api_key, base_url, timeout=timeout, max_retries=max_retries)
+
+    def complete(self, messages: List[Dict], **params) -> str:
+        response = self.client.chat.completions.create(messages=messages, model=self.model, **params)
+        return response.choices[0].message.content
+
+    def stream(self, messages: List[Dict], **params) -> Iterator[str]:
+        for chunk in self.client.chat.completions.create(messages=messages, model=self.model, stream=True, **params):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class GroqProvider(OpenAICompatibleProvider):
+    def __init__(self, api_key: str, model: str = "mixtral-8x7b-32768", base_url: Optional[str] = None,
+                 timeout: Optional[float] = None, max_retries: Optional[int] = None):
+        super().__init__("groq", api_key, model, base_url or os.environ.get("LOVEBOT_LLM_BASE_URL") or GROQ_BASE_URL,
+                         timeout=timeout, max_retries=max_retries)
+
+
+class OpenAIProvider(OpenAICompatibleProvider):
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", base_url: str = OPENAI_BASE_URL,
+                 timeout: Optional[float] = None, max_retries: Optional[int] = None):
+        super().__init__("openai", api_key, model, base_url, timeout=timeout, max_retries=max_retries)
+
+
+class AnthropicProvider(Provider):
+    """Anthropic's Messages API, over the same pooled, rate-limited HTTP client"""
+    name = "anthropic"
+
+    def __init__(self, api_key: str, model: str = "claude-3-5-haiku-latest",
+                 base_url: str = ANTHROPIC_BASE_URL, timeout: Optional[float] = None,
+                 max_retries: Optional[int] = None):
+        self.model = model
+        self.client = get_shared_client(
+            None, base_url, headers={"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION},
+            timeout=timeout, max_retries=max_retries
+        )
+
+    def complete(self, messages: List[Dict], **params) -> str:
+        with self.client.limiter.slot():
+            response = self.client.post(self._payload(messages, params, stream=False), stream=False, path="/messages")
+            try:
+                data = response.json()
+            finally:
+                response.close()
+        return "".join(block.get("text", "") for block in data.get("content", []) if block.get("type") == "text")
+
+    def stream(self, messages: List[Dict], **params) -> Iterator[str]:
+        with self.client.limiter.slot():
+            response = self.client.post(self._payload(messages, params, stream=True), stream=True, path="/messages")
+            try:
+                for event in iter_sse(response):
+                    if event.get("type") == "content_block_delta":
+                        text = event.get("delta", {}).get("text")
+                        if text:
+                            yield text
+                    elif event.get("type") == "message_stop":
+                        break
+                    elif event.get("type") == "error":
+                        raise LLMError(f"Anthropic stream error: {event.get('error')}")
+            except httpx.HTTPError as e:
+                raise LLMError(f"Stream interrupted: {e}")
+            finally:
+                response.close()
+
+    def _payload(self, messages: List[Dict], params: Dict, stream: bool) -> Dict:
+        # System prompts go in their own field, and turns must alternate
+        # starting with the user, so consecutive same-role messages are merged
+        system = "\n\n".join(msg["content"] for msg in messages if msg["role"] == "system")
+        turns = []
+        for msg in messages:
+            if msg["role"] == "system":
+                continue
+            if turns and turns[-1]["role"] == msg["role"]:
+                turns[-1]["content"] += "\n\n" + msg["content"]
+            else:
+                turns.append({"role": msg["role"], "content": msg["content"]})
+        if turns and turns[0]["role"] != "user":
+            turns.insert(0, {"role": "user", "content": "(conversation continues)"})
+        payload = {"model": self.model, "messages": turns, "max_tokens": params.get("max_tokens", 1024)}
+        if system:
+            payload["system"] = system
+        for key in ("temperature", "top_p"):
+            if key in params:
+                payload[key] = params[key]
+        if stream:
+            payload["stream"] = True
+        return payload
+
+
+_END = object()
+
+
+def _call_with_deadline(fn: Callable, timeout: Optional[float], on_abandon: Optional[Callable] = None):
+    """
+    fn() on a helper thread, raising LLMError if it hasn't returned within
+    timeout seconds. An abandoned call keeps running until its own HTTP
+    timeout; on_abandon is called once it finishes.
+    """
+    if timeout is None:
+        return fn()
+    future = Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+
+    # Keep the request ID and other context variables on the helper thread
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(run,), name="llm-deadline", daemon=True).start()
+    try:
+        return future.result(timeout)
+    except FutureTimeoutError:
+        if on_abandon is not None:
+            future.add_done_callback(lambda _: on_abandon())
+        raise LLMError(f"No response within {timeout:g}s")
+
+
+class _ProviderState:
+    def __init__(self, provider: Provider, index: int):
+        self.provider = provider
+        self.index = index
+        self.latency = {}  # EWMA seconds per request kind ("complete", "stream")
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error = None
+
+
+class _RouterCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, messages: List[Dict], model: str = None, stream: bool = False, **params):
+        # The model is chosen per provider; the requested name is only a label
+        if stream:
+            return self.owner._stream_chunks(messages, params)
+        content = self.owner.complete(messages, **params)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class LLMRouter:
+    """
+    Routes each request to the provider with the lowest recent latency and
+    fails over down the list on errors or timeouts. A failing provider sits
+    out for a cooldown that doubles with each consecutive failure.
+    Args:
+        providers: Candidates, in order of preference until latencies are known
+        ewma_alpha: Weight of the newest latency sample
+        cooldown: Seconds a provider sits out after its first failure
+        max_cooldown: Upper bound on the cooldown
+        request_timeout: Seconds to wait for a complete() response before
+            failing over (None = wait for the provider's own timeout)
+        first_token_timeout: Seconds to wait for a stream's first token
+            before failing over (None = wait for the provider's own timeout)
+    """
+
+    def __init__(self, providers: List[Provider], ewma_alpha: float = 0.3,
+                 cooldown: float = 5.0, max_cooldown: float = 300.0,
+                 request_timeout: Optional[float] = 20.0, first_token_timeout: Optional[float] = 10.0):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.ewma_alpha = ewma_alpha
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.request_timeout = request_timeout
+        self.first_token_timeout = first_token_timeout
+        self._states = [_ProviderState(provider, i) for i, provider in enumerate(providers)]
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=_RouterCompletions(self))
+
+    @property
+    def providers(self) -> List[Provider]:
+        return [state.provider for state in self._states]
+
+    def complete(self, messages: List[Dict], **params) -> str:
+        errors = []
+        for state in self._ranked("complete"):
+            start = time.perf_counter()
+            try:
+                content = _call_with_deadline(
+                    lambda: state.provider.complete(messages, **params), self.request_timeout
+                )
+            except Exception as e:
+                self._record_failure(state, e)
+                errors.append(f"{state.provider.name}: {e}")
+                continue
+            self._record_success(state, "complete", time.perf_counter() - start)
+            return content
+        raise LLMError("All LLM providers failed: " + "; ".join(errors))
+
+    def stream(self, messages: List[Dict], **params) -> Iterator[str]:
+        """Stream from the fastest provider; fails over only until the first token has been sent"""
+        errors = []
+        for state in self._ranked("stream"):
+            start = time.perf_counter()
+            started = False
+            try:
+                tokens = iter(state.provider.stream(messages, **params))
+                # A provider that hasn't produced a token by the deadline is
+                # treated as failed; the abandoned stream is closed once its
+                # pending read returns
+                first = _call_with_deadline(
+                    lambda: next(tokens, _END), self.first_token_timeout,
+                    on_abandon=getattr(tokens, "close", None)
+                )
+                if first is not _END:
+                    started = True
+                    # Time to first token is what a user waiting on a stream notices
+                    self._record_success(state, "stream", time.perf_counter() - start)
+                    yield first
+                    for token in tokens:
+                        yield token
+            except Exception as e:
+                self._record_failure(state, e)
+                if started:
+                    raise
+                errors.append(f"{state.provider.name}: {e}")
+                continue
+            if not started:
+                self._record_success(state, "stream", time.perf_counter() - start)
+            return
+        raise LLMError("All LLM providers failed: " + "; ".join(errors))
+
+    def get_stats(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "provider": state.provider.name,
+                "model": state.provider.model,
+                "latency": dict(state.latency),
+                "requests": state.requests,
+                "failures": state.failures,
+                "cooling_down": state.cooldown_until > now,
+                "last_error": state.last_error
+            } for state in self._states]
+
+    def _stream_chunks(self, messages: List[Dict], params: Dict) -> Iterator:
+        for token in self.stream(messages, **params):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    def _ranked(self, kind: str) -> List[_ProviderState]:
+        """Healthy providers by latency, then cooling-down ones as a last resort"""
+        now = time.monotonic()
+        with self._lock:
+            # Providers without a sample yet rank first so each gets measured
+            return sorted(self._states, key=lambda state: (
+                state.cooldown_until > now, state.latency.get(kind, 0.0), state.index
+            ))
+
+    def _record_success(self, state: _ProviderState, kind: str, latency: float):
+        with self._lock:
+            state.requests += 1
+            state.consecutive_failures = 0
+            state.cooldown_until = 0.0
+            previous = state.latency.get(kind)
+            state.latency[kind] = latency if previous is None else (
+                self.ewma_alpha * latency + (1 - self.ewma_alpha) * previous
+            )
+
+    def _record_failure(self, state: _ProviderState, error: Exception):
+        logger.warning("LLM provider %s failed: %s", state.provider.name, error)
+        with self._lock:
+            state.requests += 1
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.last_error = str(error)
+            state.cooldown_until = time.monotonic() + min(
+                self.max_cooldown, self.cooldown * 2 ** (state.consecutive_failures - 1)
+            )
+
+
+_routers: Dict = {}
+_routers_lock = threading.Lock()
+
+
+def get_shared_router(groq_key: Optional[str] = None, anthropic_key: Optional[str] = None,
+                      openai_key: Optional[str] = None) -> LLMRouter:
+    """
+    One router per set of API keys for the whole process, so latency history
+    is shared by every session. Keys default to GROQ_API_KEY,
+    ANTHROPIC_API_KEY and OPENAI_API_KEY; providers without a key are left out.
+    With more than one provider, each fails after one attempt
+    (LOVEBOT_ROUTED_MAX_RETRIES, default 0) within LOVEBOT_LLM_REQUEST_TIMEOUT
+    (20s), or LOVEBOT_LLM_FIRST_TOKEN_TIMEOUT (10s) for streams, and the
+    router fails over instead of waiting on retries. A lone provider has
+    nothing to fail over to, so it keeps the client's retries and timeouts
+    and the router sets no deadline of its own.
+    """
+    keys = (
+        groq_key or os.environ.get("GROQ_API_KEY"),
+        anthropic_key or os.environ.get("ANTHROPIC_API_KEY"),
+        openai_key or os.environ.get("OPENAI_API_KEY"),
+    )
+    with _routers_lock:
+        router = _routers.get(keys)
+        if router is None:
+            request_timeout = float(os.environ.get("LOVEBOT_LLM_REQUEST_TIMEOUT", "20"))
+            first_token_timeout = float(os.environ.get("LOVEBOT_LLM_FIRST_TOKEN_TIMEOUT", "10"))
+            client_options = {}
+            if sum(1 for key in keys if key) > 1:
+                # Failover replaces retries
+                client_options = {
+                    "max_retries": int(os.environ.get("LOVEBOT_ROUTED_MAX_RETRIES", "0")),
+                    "timeout": request_timeout
+                }
+            else:
+                # A router deadline would cut the client's retries short and
+                # turn a slow but successful request into an error
+                request_timeout = first_token_timeout = None
+            providers = []
+            if keys[0]:
+                providers.append(GroqProvider(keys[0], **client_options))
+            if keys[1]:
+                providers.append(AnthropicProvider(keys[1], **client_options))
+            if keys[2]:
+                providers.append(OpenAIProvider(keys[2], **client_options))
+            if not providers:
+                raise LLMError("API key not set")
+            router = _routers[keys] = LLMRouter(
+                providers, request_timeout=request_timeout, first_token_timeout=first_token_timeout
+            )
+        return router
@@ -0,0 +1,281 @@
+"""
+Shared HTTP client for OpenAI-compatible chat completion APIs (Groq by default).
+It exposes the same client.chat.completions.create(...) surface as the Groq SDK,
+so ChatManager, StoryManager and the offline fakes are interchangeable.
+"""
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+import json
+import os
+import random
+import threading
+import time
+import httpx
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class RequestLimiter:
+    """
+    Process-wide cap on LLM traffic: at most max_concurrent requests in
+    flight (streams hold their slot until they finish) and, optionally,
+    a token-bucket limit on how fast new requests start
+    """
+
+    def __init__(self, max_concurrent: int = 8, requests_per_second: Optional[float] = None,
+                 burst: int = 4, acquire_timeout: Optional[float] = 60.0):
+        self.max_concurrent = max_concurrent
+        self.acquire_timeout = acquire_timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._bucket = TokenBucket(requests_per_second, burst) if requests_per_second else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.started = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+
+    @contextmanager
+    def slot(self):
+        start = time.perf_counter()
+        if not self._semaphore.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise LLMError("Too many concurrent LLM requests")
+        try:
+            if self._bucket is not None and not self._bucket.acquire(timeout=self.acquire_timeout):
+                with self._lock:
+                    self.rejected += 1
+                raise LLMError("LLM request rate limit exceeded")
+            with self._lock:
+                self.in_flight += 1
+                self.started += 1
+                self.wait_time += time.perf_counter() - start
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+        finally:
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "started": self.started,
+                "rejected": self.rejected,
+                "avg_wait": self.wait_time / self.started if self.started else 0.0
+            }
+
+
+def _env_float(name: str) -> Optional[float]:
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+# Shared by every client in the process, so the cap holds across all sessions
+DEFAULT_LIMITER = RequestLimiter(
+    max_concurrent=int(os.environ.get("LOVEBOT_LLM_MAX_CONCURRENCY", "8")),
+    requests_per_second=_env_float("LOVEBOT_LLM_RPS"),
+    burst=int(os.environ.get("LOVEBOT_LLM_BURST", "4"))
+)
+
+
+def iter_sse(response: httpx.Response) -> Iterator[Dict]:
+    """Decoded JSON payloads of a server-sent event stream, up to [DONE]"""
+    for line in response.iter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        yield json.loads(data)
+
+
+class _Completions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, messages: List[Dict], model: str, stream: bool = False, **params):
+        if stream:
+            return self.owner._stream(messages, model, params)
+        return self.owner._complete(messages, model, params)
+
+
+class LLMClient:
+    """
+    Pooled chat completion client with timeouts, retries and request limits
+    Args:
+        api_key: Bearer token for the API
+        base_url: API root, e.g. a local fake server in tests
+        timeout: Seconds to wait for a response (or between streamed chunks)
+        connect_timeout: Seconds to wait for a connection
+        max_retries: Retries on timeouts, connection errors, 429 and 5xx
+        backoff_base: First retry waits up to this long; doubles per attempt
+        backoff_max: Upper bound on a single retry wait
+        max_connections: Connection pool size
+        limiter: Concurrency/rate limiter (defaults to the process-wide one)
+        headers: Extra headers sent with every request (e.g. non-bearer auth)
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = GROQ_BASE_URL,
+                 timeout: float = 30.0, connect_timeout: float = 5.0, max_retries: int = 3,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, max_connections: int = 20,
+                 limiter: Optional[RequestLimiter] = None, headers: Optional[Dict] = None):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = limiter or DEFAULT_LIMITER
+        headers = dict(headers or {})
+        if api_key:
+            headers["Authorization"] = f"Bearer {api_key}"
+        self.http = httpx.Client(
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.retries = 0
+        self.chat = SimpleNamespace(completions=_Completions(self))
+
+    def close(self):
+        self.http.close()
+
+    def _complete(self, messages: List[Dict], model: str, params: Dict):
+        payload = {"model": model, "messages": messages, **params}
+        with self.limiter.slot():
+            response = self.post(payload, stream=False)
+            try:
+                data = response.json()
+            finally:
+                response.close()
+        message = data["choices"][0]["message"]
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=message.get("content")))],
+            usage=data.get("usage")
+        )
+
+    def _stream(self, messages: List[Dict], model: str, params: Dict) -> Iterator:
+        payload = {"model": model, "messages": messages, "stream": True, **params}
+        with self.limiter.slot():
+            # Retries only cover the request itself; once tokens have been
+            # yielded a failure is raised rather than replayed
+            response = self.post(payload, stream=True)
+            try:
+                for event in iter_sse(response):
+                    yield SimpleNamespace(choices=[
+                        SimpleNamespace(delta=SimpleNamespace(content=choice.get("delta", {}).get("content")))
+                        for choice in event.get("choices", [])
+                    ])
+            except httpx.HTTPError as e:
+                raise LLMError(f"Stream interrupted: {e}")
+            finally:
+                response.close()
+
+    def post(self, payload: Dict, stream: bool, path: str = "/chat/completions") -> httpx.Response:
+        """
+        POST a request, retrying transient failures with jittered backoff.
+        Callers hold a limiter slot and close the response.
+        """
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                request = self.http.build_request("POST", url, json=payload)
+                response = self.http.send(request, stream=stream)
+            except httpx.TransportError as e:
+                error = LLMError(f"Request failed: {e}")
+            else:
+                if response.status_code < 400:
+                    return response
+                response.read()
+                error = LLMError(
+                    f"HTTP {response.status_code}: {response.text[:200]}", response.status_code
+                )
+                retry_after = response.headers.get("retry-after")
+                response.close()
+                if response.status_code not in RETRY_STATUS:
+                    raise error
+            if attempt == self.max_retries:
+                raise error
+            self.retries += 1
+            time.sleep(self._backoff(attempt, retry_after))
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        # Honour the server's Retry-After when it sends one, within backoff_max
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        # "Full jitter": spreads retries from many sessions instead of synchronizing them
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+_clients: Dict = {}
+_clients_lock = threading.Lock()
+
+
+def get_shared_client(api_key: Optional[str], base_url: Optional[str] = None,
+                      headers: Optional[Dict] = None, timeout: Optional[float] = None,
+                      max_retries: Optional[int] = None) -> LLMClient:
+    """
+    One pooled client per (api_key, base_url, headers, timeout, max_retries)
+    for the whole process. base_url defaults to LOVEBOT_LLM_BASE_URL, then the
+    Groq API; timeout and max_retries to LOVEBOT_LLM_TIMEOUT (30s) and
+    LOVEBOT_LLM_MAX_RETRIES (3)
+    """
+    base_url = base_url or os.environ.get("LOVEBOT_LLM_BASE_URL") or GROQ_BASE_URL
+    if timeout is None:
+        timeout = _env_float("LOVEBOT_LLM_TIMEOUT") or 30.0
+    if max_retries is None:
+        max_retries = int(os.environ.get("LOVEBOT_LLM_MAX_RETRIES", "3"))
+    key = (api_key, base_url, tuple(sorted((headers or {}).items())), timeout, max_retries)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = LLMClient(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=timeout,
+                max_retries=max_retries,
+                headers=headers
+            )
+        return client
@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("lovebot.maintenance")
+
+class MaintenanceScheduler:
+    """Runs a maintenance job every interval seconds on a daemon thread"""
+
+    def __init__(self, job: Callable[[], Dict], interval: float, initial_delay: Optional[float] = None):
+        """
+        Args:
+            job: Called on the scheduler thread; returns a report dict
+            interval: Seconds between the end of one run and the start of the next
+            initial_delay: Seconds before the first run (defaults to interval)
+        """
+        self.job = job
+        self.interval = interval
+        self.initial_delay = interval if initial_delay is None else initial_delay
+        self.last_report: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+        self.runs = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kb-maintenance", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join()
+
+    def run_now(self) -> Dict:
+        """Run the job on the calling thread, serialized with scheduled runs"""
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                report = self.job()
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            self.runs += 1
+            self.last_report = report
+            self.last_error = None
+            logger.info("maintenance finished in %.1fs: %s", time.perf_counter() - start, report)
+            return report
+
+    def _run(self):
+        delay = self.initial_delay
+        while not self._stop.wait(delay):
+            try:
+                self.run_now()
+            except Exception as e:
+                logger.warning("Scheduled maintenance failed: %s", e)
+            delay = self.interval
@@ -0,0 +1,241 @@
+"""
+In-process metrics and structured logging for the hot paths. Spans time a
+block of code into a latency histogram (Prometheus text format via
+render_prometheus / start_metrics_server) and a window of recent samples
+for percentiles; each finished span is also logged as one JSON line
+tagged with the current request ID.
+"""
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+
+# Upper bounds in seconds, from cache hits to slow LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+logger = logging.getLogger("lovebot")
+# Span records reach the app's handlers once configure_logging() has run;
+# until then they are dropped rather than printed by logging's fallback
+span_logger = logging.getLogger("lovebot.span")
+span_logger.addHandler(logging.NullHandler())
+
+
+class _Histogram:
+    def __init__(self, window: int):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+
+
+class MetricsRegistry:
+    """Thread-safe latency histograms and error counts keyed by span name, plus event counters"""
+
+    def __init__(self, window: int = 1000):
+        """
+        Args:
+            window: Recent samples kept per span for percentiles
+        """
+        self.window = window
+        self._histograms: Dict[str, _Histogram] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram(self.window)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram.counts[i] += 1
+                    break
+            histogram.count += 1
+            histogram.total += seconds
+            histogram.recent.append(seconds)
+            if error:
+                histogram.errors += 1
+
+    def increment(self, name: str, amount: int = 1):
+        """Count an event, e.g. a cache hit"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(sorted(self._counters.items()))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def summary(self) -> List[Dict]:
+        """Per span: count, errors, mean, p50 and p95 (seconds, over the recent window)"""
+        with self._lock:
+            items = [(name, h.count, h.errors, h.total, sorted(h.recent)) for name, h in self._histograms.items()]
+        rows = []
+        for name, count, errors, total, recent in sorted(items):
+            rows.append({
+                "span": name,
+                "count": count,
+                "errors": errors,
+                "mean": total / count if count else 0.0,
+                "p50": _percentile(recent, 50),
+                "p95": _percentile(recent, 95)
+            })
+        return rows
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format"""
+        lines = [
+            "# HELP lovebot_span_seconds Time spent in instrumented code paths",
+            "# TYPE lovebot_span_seconds histogram",
+        ]
+        errors = [
+            "# HELP lovebot_span_errors_total Instrumented calls that raised",
+            "# TYPE lovebot_span_errors_total counter",
+        ]
+        events = [
+            "# HELP lovebot_events_total Counted events such as cache hits",
+            "# TYPE lovebot_events_total counter",
+        ]
+        with self._lock:
+            for name, h in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.counts):
+                    cumulative += count
+                    lines.append(f'lovebot_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'lovebot_span_seconds_bucket{{span="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'lovebot_span_seconds_sum{{span="{name}"}} {h.total}')
+                lines.append(f'lovebot_span_seconds_count{{span="{name}"}} {h.count}')
+                errors.append(f'lovebot_span_errors_total{{span="{name}"}} {h.errors}')
+            for name, count in sorted(self._counters.items()):
+                events.append(f'lovebot_events_total{{event="{name}"}} {count}')
+        return "\n".join(lines + errors + events) + "\n"
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+REGISTRY = MetricsRegistry()
+
+
+@contextmanager
+def span(name: str, **fields):
+    """Time a block into REGISTRY and log it; extra fields are added to the log line"""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        REGISTRY.observe(name, seconds, error=error is not None)
+        record = {"span": name, "duration_ms": round(seconds * 1000, 2), "status": "error" if error else "ok", **fields}
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+            span_logger.warning("span", extra={"fields": record})
+        else:
+            span_logger.info("span", extra={"fields": record})
+
+
+def timed(name: str):
+    """Decorator form of span(); for generators the span covers the whole iteration"""
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with span(name):
+                    yield from func(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def request_context(request_id: str):
+    """Tag every span and log line inside the block with request_id"""
+    token = request_id_var.set(request_id)
+    try:
+        yield
+    finally:
+        request_id_var.reset(token)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request_id, message and span fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": request_id_var.get(),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = "INFO"):
+    """Send the app's logs to stderr as JSON lines (idempotent)"""
+    if any(isinstance(handler.formatter, JsonFormatter) for handler in logger.handlers):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1",
+                         registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """
+    Serve GET /metrics in Prometheus text format from a daemon thread.
+    Listens on localhost only unless host says otherwise (e.g. "0.0.0.0"
+    for a scraper on another machine); the endpoint has no authentication.
+    """
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,70 @@
+"""
+Page-streaming PDF text extraction. Kept free of heavy imports so process
+pool workers start quickly.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+import logging
+import multiprocessing
+import os
+import PyPDF2
+
+logger = logging.getLogger("lovebot.pdf")
+
+
+def count_pages(path: str) -> int:
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def extract_page_range(path: str, start: int, end: int) -> List[str]:
+    """Extract text for pages [start, end); pages that fail to extract become empty strings"""
+    reader = PyPDF2.PdfReader(path)
+    texts = []
+    for index in range(start, end):
+        try:
+            texts.append(reader.pages[index].extract_text() or "")
+        except Exception as e:
+            logger.warning("Error extracting text from page %d of %s: %s", index, path, e)
+            texts.append("")
+    return texts
+
+
+def iter_pdf_pages(path: str, workers: Optional[int] = None, pages_per_task: int = 8,
+                   min_pages_for_pool: int = 16) -> Iterator[Tuple[int, int, str]]:
+    """
+    Yield (page_index, total_pages, text) in page order
+    Args:
+        path: PDF file on disk
+        workers: Extraction processes; defaults to the CPU count
+        pages_per_task: Pages extracted per worker task
+        min_pages_for_pool: Smaller documents are extracted in-process
+    Only about workers * 2 tasks are in flight at once, so memory depends on
+    the window size rather than on the document size.
+    """
+    total = count_pages(path)
+    workers = workers or os.cpu_count() or 1
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+
+    if workers <= 1 or total < min_pages_for_pool:
+        for start, end in ranges:
+            for offset, text in enumerate(extract_page_range(path, start, end)):
+                yield start + offset, total, text
+        return
+
+    # spawn avoids forking a process that already runs Streamlit and Chroma threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        in_flight = deque()
+        pending = iter(ranges)
+        for start, end in pending:
+            in_flight.append((start, pool.submit(extract_page_range, path, start, end)))
+            if len(in_flight) >= workers * 2:
+                break
+        while in_flight:
+            start, future = in_flight.popleft()
+            texts = future.result()
+            next_range = next(pending, None)
+            if next_range is not None:
+                in_flight.append((next_range[0], pool.submit(extract_page_range, path, *next_range)))
+            for offset, text in enumerate(texts):
+                yield start + offset, total, text
@@ -0,0 +1,193 @@
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of LLM responses keyed by a hash of the model, messages
+    and sampling parameters. Entries expire after ttl seconds; past max_bytes
+    or max_entries the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str = "./response_cache.db", ttl: Optional[float] = 86400,
+                 max_bytes: int = 64 * 1024 * 1024, max_entries: int = 10000):
+        """
+        Args:
+            path: SQLite file
+            ttl: Seconds an entry stays valid (None = no expiry)
+            max_bytes: Cap on stored response text
+            max_entries: Cap on the number of responses
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+            "latency REAL NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._lock = threading.Lock()
+        self._entries, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_latency = 0.0
+
+    @staticmethod
+    def key(model: str, messages: List[Dict], params: Dict) -> str:
+        payload = json.dumps({"model": model, "messages": messages, "params": params},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        start = time.perf_counter()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, latency, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is not None and self.ttl is not None and now - row[2] > self.ttl:
+                self._delete([key])
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            # What the original call cost, minus the lookup we did instead
+            self.saved_latency += max(0.0, row[1] - (time.perf_counter() - start))
+            return row[0]
+
+    def set(self, key: str, content: str, latency: float):
+        """Store a response along with how long the model took to produce it"""
+        size = len(content.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._delete([key])
+            self._conn.execute(
+                "INSERT INTO responses (key, content, size, latency, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, content, size, latency, now, now)
+            )
+            self._entries += 1
+            self._bytes += size
+            self._evict()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._entries = self._bytes = 0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "saved_latency": self.saved_latency,
+                "evictions": self.evictions,
+                "entries": self._entries,
+                "bytes": self._bytes
+            }
+
+    def _delete(self, keys: List[str]):
+        """Remove entries; caller holds the lock"""
+        for key in keys:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._entries -= 1
+                self._bytes -= row[0]
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under the caps; caller holds the lock"""
+        if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+            return
+        if self.ttl is not None:
+            expired = [key for (key,) in self._conn.execute(
+                "SELECT key FROM responses WHERE created_at < ?", (time.time() - self.ttl,)
+            )]
+            self._delete(expired)
+            self.evictions += len(expired)
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            oldest = [key for (key,) in self._conn.execute(
+                "SELECT key FROM responses ORDER BY accessed_at LIMIT 64"
+            )]
+            if not oldest:
+                break
+            for key in oldest:
+                if self._entries <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
+                self._delete([key])
+                self.evictions += 1
+
+
+class _CachedCompletions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, messages: List[Dict], model: str, stream: bool = False, cache: bool = True, **params):
+        return self.owner._create(messages, model, stream, cache, params)
+
+
+class CachingClient:
+    """
+    Wraps a Groq-compatible client so identical requests are answered from a
+    ResponseCache. Pass cache=False to create() to skip the cache for one call.
+    Streamed requests share entries with non-streamed ones; a hit is replayed
+    as a single chunk.
+    """
+
+    def __init__(self, client, cache: Optional[ResponseCache] = None):
+        self.client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=_CachedCompletions(self))
+
+    def _create(self, messages: List[Dict], model: str, stream: bool, use_cache: bool, params: Dict):
+        create = self.client.chat.completions.create
+        if self.cache is None or not use_cache:
+            return create(messages=messages, model=model, stream=stream, **params)
+        key = ResponseCache.key(model, messages, params)
+        content = self.cache.get(key)
+        if content is not None:
+            if stream:
+                return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+        start = time.perf_counter()
+        if stream:
+            return self._stream_and_store(create(messages=messages, model=model, stream=True, **params), key, start)
+        response = create(messages=messages, model=model, stream=False, **params)
+        content = response.choices[0].message.content
+        if content:
+            self.cache.set(key, content, time.perf_counter() - start)
+        return response
+
+    def _stream_and_store(self, stream, key: str, start: float) -> Iterator:
+        parts = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        # Only streams that ran to completion are stored
+        if parts:
+            self.cache.set(key, "".join(parts), time.perf_counter() - start)
@@ -1,9 +1,280 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("lovebot.session")
+
+class ConversationHistory:
+    """
+    Message history capped at max_messages. Messages pushed out of the ring
+    buffer are folded into a rolling extractive summary so the model still
+    sees what happened earlier in long conversations.
+    """
+
+    def __init__(self, max_messages: int = 50, summary_max_chars: int = 2000,
+                 on_append: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            max_messages: Ring buffer capacity
+            summary_max_chars: Cap on the rolling summary
+            on_append: Called with every newly appended message (e.g. to persist it)
+        """
+        self.messages = deque(maxlen=max_messages)
+        self.summary_lines = deque()
+        self.summary_chars = 0
+        self.summary_max_chars = summary_max_chars
+        self.evicted = 0
+        self.on_append = on_append
+
+    def append(self, message: Dict):
+        self._push(message)
+        if self.on_append is not None:
+            self.on_append(message)
+
+    def _push(self, message: Dict):
+        if len(self.messages) == self.messages.maxlen:
+            self._summarize(self.messages[0])
+        self.messages.append(message)
+
+    def clear(self):
+        self.messages.clear()
+        self.summary_lines.clear()
+        self.summary_chars = 0
+        self.evicted = 0
+
+    @property
+    def summary(self) -> str:
+        """Summary of the turns that no longer fit in the buffer"""
+        return "\n".join(self.summary_lines)
+
+    def recent(self, count: int) -> List[Dict]:
+        """The last count messages, oldest first"""
+        if count <= 0:
+            return []
+        start = max(0, len(self.messages) - count)
+        return [self.messages[i] for i in range(start, len(self.messages))]
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self.messages)[index]
+        return self.messages[index]
+
+    def _summarize(self, message: Dict):
+        """Fold an evicted message into the summary, dropping the oldest lines past the cap"""
+        content = " ".join(message["content"].split())
+        # Keep the first sentence; it usually carries the topic of the turn
+        first_sentence = re.split(r"(?<=[.!?])\s", content, maxsplit=1)[0]
+        if len(first_sentence) > 200:
+            first_sentence = first_sentence[:197] + "..."
+        line = f"- {message['role']}: {first_sentence}"
+        self.summary_lines.append(line)
+        self.summary_chars += len(line) + 1
+        while self.summary_chars > self.summary_max_chars and len(self.summary_lines) > 1:
+            self.summary_chars -= len(self.summary_lines.popleft()) + 1
+        self.evicted += 1
+
+class SessionBackend(ABC):
+    """
+    Persistence interface for per-user session data. Implementations must be
+    safe to share across threads and app replicas; a Redis store would map
+    append_messages to RPUSH, load_messages to LRANGE and the state methods
+    to a hash per user.
+    """
+
+    @abstractmethod
+    def append_messages(self, user_id: str, messages: List[Dict]):
+        ...
+
+    @abstractmethod
+    def load_messages(self, user_id: str, limit: int) -> List[Dict]:
+        """The last limit messages for user_id, oldest first"""
+
+    @abstractmethod
+    def set_state(self, user_id: str, key: str, value: Any):
+        """Store a JSON-serializable value (e.g. quiz insights)"""
+
+    @abstractmethod
+    def load_state(self, user_id: str) -> Dict[str, Any]:
+        ...
+
+    def flush(self):
+        """Write out anything buffered"""
+
+    def close(self):
+        self.flush()
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    SQLite session store in WAL mode, so several app processes can share one
+    database file. Messages are append-only rows; writes are buffered and
+    committed in batches by a background thread.
+    """
+
+    def __init__(self, path: str = "./sessions.db", batch_size: int = 100,
+                 flush_interval: float = 0.5):
+        """
+        Args:
+            path: Database file
+            batch_size: Pending writes that trigger an immediate flush
+            flush_interval: Maximum seconds a write stays buffered
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, content TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id, seq)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "user_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (user_id, key))"
+        )
+        self._db_lock = threading.Lock()
+        self._buffer_lock = threading.Lock()
+        self._pending_messages = []
+        self._pending_state = {}
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._run, name="session-flusher", daemon=True)
+        self._flusher.start()
+
+    def append_messages(self, user_id: str, messages: List[Dict]):
+        now = time.time()
+        with self._buffer_lock:
+            self._pending_messages.extend(
+                (user_id, message["role"], message["content"], now) for message in messages
+            )
+            pending = len(self._pending_messages) + len(self._pending_state)
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def set_state(self, user_id: str, key: str, value: Any):
+        with self._buffer_lock:
+            self._pending_state[(user_id, key)] = json.dumps(value)
+        self._wake.set()
+
+    def load_messages(self, user_id: str, limit: int) -> List[Dict]:
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE user_id = ? ORDER BY seq DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def load_state(self, user_id: str) -> Dict[str, Any]:
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT key, value FROM state WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def flush(self):
+        # Hold the database lock while taking the buffer so batches commit in order
+        with self._db_lock:
+            with self._buffer_lock:
+                messages, self._pending_messages = self._pending_messages, []
+                state, self._pending_state = self._pending_state, {}
+            if not messages and not state:
+                return
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO messages (user_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                    messages
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO state (user_id, key, value) VALUES (?, ?, ?)",
+                    [(user_id, key, value) for (user_id, key), value in state.items()]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        self._conn.close()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Session flush error: %s", e)
+
 class SessionManager:
-    def __init__(self):
-        self.max_history = 50  # Maximum number of messages to keep in history
-        
+    def __init__(self, max_history: int = 50, page_size: int = 20, summary_max_chars: int = 2000,
+                 backend: Optional[SessionBackend] = None):
+        self.max_history = max_history  # Maximum number of messages to keep in history
+        self.page_size = page_size  # Messages rendered per "load older" page
+        self.summary_max_chars = summary_max_chars
+        # Optional persistence so sessions survive restarts and move between replicas
+        self.backend = backend
+
     def trim_history(self, messages):
         """Trim message history to prevent session from growing too large"""
         if len(messages) > self.max_history:
             return messages[-self.max_history:]
         return messages
+
+    def new_history(self, messages: List[Dict] = None, user_id: Optional[str] = None) -> ConversationHistory:
+        """
+        Create a capped history for a session, optionally seeded with existing messages.
+        With a backend and user_id, newly appended messages are persisted.
+        """
+        on_append = None
+        if self.backend is not None and user_id is not None:
+            on_append = lambda message: self.backend.append_messages(user_id, [message])
+        history = ConversationHistory(self.max_history, self.summary_max_chars, on_append)
+        for message in messages or []:
+            history._push(message)
+        return history
+
+    def restore(self, user_id: str) -> Tuple[ConversationHistory, Dict[str, Any]]:
+        """
+        Rebuild a user's history and saved state from the backend.
+        A few extra older messages are replayed so the rolling summary is rebuilt too.
+        """
+        if self.backend is None:
+            return self.new_history(user_id=user_id), {}
+        messages = self.backend.load_messages(user_id, self.max_history * 2)
+        return self.new_history(messages, user_id=user_id), self.backend.load_state(user_id)
+
+    def save_state(self, user_id: str, key: str, value: Any):
+        """Persist a piece of session state, such as quiz insights"""
+        if self.backend is not None:
+            self.backend.set_state(user_id, key, value)
+
+    def visible_messages(self, history, pages: int = 1) -> Tuple[List[Dict], bool]:
+        """
+        The window of messages to render
+        Returns: (messages, has_older) where has_older means another page can be loaded
+        """
+        count = self.page_size * max(1, pages)
+        return history.recent(count), len(history) > count
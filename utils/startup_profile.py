@@ -0,0 +1,121 @@
+"""
+Import-time and startup profiling for the app's subsystems. Each import is
+measured in a fresh interpreter with -X importtime, so a module that an
+earlier measurement already loaded doesn't look free.
+"""
+from typing import Callable, Dict, List, Tuple
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# Modules each part of the app imports; the shell is what every page load pays for
+MODES = {
+    "app shell": ["streamlit", "utils.content_filter", "utils.session", "utils.quiz"],
+    "chat": ["utils.chat"],
+    "story": ["utils.story"],
+    "knowledge base": ["utils.knowledge_base"],
+}
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_importtime(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=_ROOT
+    )
+
+
+def interpreter_baseline() -> set:
+    """Modules every interpreter loads at startup (site, encodings, ...)"""
+    return {match.group(4) for match in map(_IMPORTTIME.match, _run_importtime("pass").stderr.splitlines()) if match}
+
+
+def profile_import(module: str, top: int = 5, baseline: set = None) -> Dict:
+    """
+    Import a module in a fresh interpreter
+    Args:
+        baseline: Module names to leave out of "heaviest" (defaults to interpreter startup modules)
+    Returns: {"module", "seconds", "heaviest": [(package, seconds)]} or {"module", "error"}
+    """
+    if baseline is None:
+        baseline = interpreter_baseline()
+    proc = _run_importtime(f"import {module}")
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        return {"module": module, "error": lines[-1] if lines else f"exit code {proc.returncode}"}
+
+    seconds = 0.0
+    packages = {}
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if not match:
+            continue
+        cumulative = int(match.group(2)) / 1e6
+        name = match.group(4)
+        if name == module:
+            seconds = cumulative
+        elif "." not in name and name not in baseline and not module.startswith(name + "."):
+            # Top-level packages pulled in along the way, e.g. chromadb or numpy
+            packages[name] = max(packages.get(name, 0.0), cumulative)
+    heaviest = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {"module": module, "seconds": seconds, "heaviest": heaviest}
+
+
+def profile_managers(persist_directory: str, warmup: bool = False,
+                     vector_backend: str = "chroma") -> List[Tuple[str, float]]:
+    """
+    Construct each manager in this process, cheapest first, timing each
+    step including its imports
+    Returns: [(step, seconds)]
+    """
+    session_dir = tempfile.mkdtemp()
+
+    def content_filter():
+        from utils.content_filter import ContentFilter
+        return ContentFilter()
+
+    def session_manager():
+        from utils.session import SessionManager, SQLiteSessionBackend
+        return SessionManager(backend=SQLiteSessionBackend(os.path.join(session_dir, "sessions.db")))
+
+    def quiz_manager():
+        from utils.quiz import QuizManager
+        return QuizManager()
+
+    def chat_manager():
+        from utils.chat import ChatManager
+        return ChatManager()
+
+    def story_manager():
+        from utils.story import StoryManager
+        return StoryManager()
+
+    built = {}
+
+    def kb_manager():
+        from utils.knowledge_base import KnowledgeBaseManager
+        built["kb"] = KnowledgeBaseManager(persist_directory=persist_directory, vector_backend=vector_backend)
+        return built["kb"]
+
+    steps: List[Tuple[str, Callable]] = [
+        ("ContentFilter", content_filter),
+        ("SessionManager", session_manager),
+        ("QuizManager", quiz_manager),
+        ("ChatManager", chat_manager),
+        ("StoryManager", story_manager),
+        ("KnowledgeBaseManager", kb_manager),
+    ]
+    if warmup:
+        steps.append(("embedding warmup", lambda: built["kb"].embedding_function.warmup()))
+
+    timings = []
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        timings.append((name, time.perf_counter() - start))
+    return timings
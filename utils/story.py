@@ -1,8 +1,32 @@
 from typing import Dict, List, Optional
+import logging
 import random
+from utils.context_builder import ContextBuilder
+from utils.metrics import timed
+from utils.response_cache import CachingClient, ResponseCache
+
+logger = logging.getLogger("lovebot.story")
 
 class StoryManager:
-    def __init__(self):
+    SYSTEM_PROMPT = """You are a skilled storyteller and relationship advisor. 
+Using the provided context about the user's personality, relationship history, and knowledge base,
+continue their story in a way that:
+1. Maintains consistency with their personality traits and communication style
+2. Incorporates relevant relationship insights
+3. Provides meaningful character development
+4. Offers subtle guidance while staying engaging
+Keep the continuation natural and personal, weaving in elements from their profile and history."""
+
+    def __init__(self, context_tokens: int = 8192, response_cache: Optional[ResponseCache] = None):
+        self.max_tokens = 1000
+        # Context is packed into context_tokens, leaving room for the continuation
+        self.context_builder = ContextBuilder(max_tokens=context_tokens, reserve_tokens=self.max_tokens)
+        # How the budget was spent on the most recent continuation
+        self.last_context_report = None
+        # Groq-compatible client; defaults to the shared router over the providers with keys set
+        self.client = None
+        # Identical story requests are answered from here when set
+        self.response_cache = response_cache
         self.scenarios = [
             {
                 "id": "communication",
@@ -19,7 +43,7 @@ class StoryManager:
     
     def build_context(self, user_story: str, chat_history: List[Dict], 
                      personality_data: Optional[Dict], knowledge_base_manager) -> str:
-        """Build context from available data sources"""
+        """Build context from available data sources, packed into the context budget"""
         context_parts = []
         
         # Add the user's story
@@ -34,15 +58,13 @@ Personal Profile:
 - Social Style: {personality_data.get('social_style', 'Unknown')}
 """)
         
-        # Add relevant chat history
-        if chat_history:
-            recent_chats = chat_history[-5:]  # Get last 5 interactions
-            chat_context = "\nRecent Interactions:\n"
-            for msg in recent_chats:
-                chat_context += f"- {msg['role']}: {msg['content'][:100]}...\n"
-            context_parts.append(chat_context)
+        # Add the summary of turns evicted from a ConversationHistory
+        summary = getattr(chat_history, "summary", "")
+        if summary:
+            context_parts.append(f"\nEarlier Conversation:\n{summary}\n")
         
         # Get relevant knowledge base information
+        documents = []
         if knowledge_base_manager:
             try:
                 search_terms = [
@@ -51,49 +73,64 @@ Personal Profile:
                     "communication patterns",
                     user_story[:100]  # Use start of story for context
                 ]
-                kb_contexts = []
-                for term in search_terms:
-                    context = knowledge_base_manager.get_relevant_context(term)
-                    if context:
-                        kb_contexts.append(context)
-                if kb_contexts:
-                    context_parts.append("\nRelevant Knowledge:\n" + "\n".join(kb_contexts))
+                # One vector query for all terms, with overlapping hits merged
+                documents = knowledge_base_manager.get_relevant_documents(search_terms)
             except Exception as e:
-                print(f"Error getting knowledge base context: {e}")
+                logger.warning("Error getting knowledge base context: %s", e)
+        
+        # Chat history and snippets get whatever the system prompt, story and profile leave over
+        history = [
+            {"role": msg["role"], "content": f"- {msg['role']}: {msg['content']}"}
+            for msg in chat_history or []
+        ]
+        packed = self.context_builder.pack(
+            [self.SYSTEM_PROMPT] + context_parts + ["\nRecent Interactions:\n", "\nRelevant Knowledge:\n"],
+            documents,
+            history
+        )
+        self.last_context_report = packed["report"]
+        # Story, profile and summary as they fit alongside the system prompt
+        context_parts = packed["required"][1:1 + len(context_parts)]
+        
+        # Add relevant chat history
+        if packed["history"]:
+            context_parts.append("\nRecent Interactions:\n" + "\n".join(msg["content"] for msg in packed["history"]))
+        
+        if packed["snippets"]:
+            context_parts.append("\nRelevant Knowledge:\n" + knowledge_base_manager.format_context(packed["snippets"]))
         
         return "\n".join(context_parts)
     
+    @timed("continue_user_story")
     def continue_user_story(self, user_story: str, chat_history: List[Dict], 
                           personality_data: Optional[Dict] = None, 
-                          knowledge_base_manager=None) -> str:
-        """Generate personalized story continuation"""
+                          knowledge_base_manager=None, use_cache: bool = True) -> str:
+        """Generate personalized story continuation; use_cache=False always asks the model"""
         context = self.build_context(user_story, chat_history, personality_data, knowledge_base_manager)
         try:
-            from groq import Groq
-            import os
-            client = Groq(api_key=os.environ["GROQ_API_KEY"])
-            system_prompt = """You are a skilled storyteller and relationship advisor. 
-Using the provided context about the user's personality, relationship history, and knowledge base,
-continue their story in a way that:
-1. Maintains consistency with their personality traits and communication style
-2. Incorporates relevant relationship insights
-3. Provides meaningful character development
-4. Offers subtle guidance while staying engaging
-Keep the continuation natural and personal, weaving in elements from their profile and history."""
+            client = self.client
+            if client is None:
+                from utils.llm_backend import get_shared_router
+                client = get_shared_router()
             messages = [
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": self.SYSTEM_PROMPT},
                 {"role": "user", "content": f"Context:\n{context}\n\nPlease continue this story..."}
             ]
-            response = client.chat.completions.create(
+            response = CachingClient(client, self.response_cache).chat.completions.create(
                 messages=messages,
                 model="mixtral-8x7b-32768",
                 temperature=0.7,
-                max_tokens=1000
+                max_tokens=self.max_tokens,
+                cache=use_cache
             )
             return response.choices[0].message.content
         except Exception as e:
             return f"I apologize, but I encountered an error generating the story continuation: {str(e)}"
     
+    def set_client(self, client):
+        """Use a Groq-compatible client, e.g. an LLMRouter, an LLMClient or tests.fakes.FakeGroq"""
+        self.client = client
+    
     def get_story_prompts(self, personality_data: Optional[Dict] = None) -> List[str]:
         """Generate personalized story prompts"""
         base_prompts = [
@@ -0,0 +1,584 @@
+"""
+Compact on-disk vector index for large knowledge bases, an alternative to
+Chroma's in-memory HNSW. Each vector is kept in memory-mapped NumPy files
+three ways: int8 codes with one scale per vector, scanned to find
+candidates; the float32 original, read only to re-rank the best candidates
+exactly; and its squared norm. Once the index is big enough, an IVF coarse
+quantizer (k-means centroids, one inverted list each) limits the scan to
+the lists nearest the query. Documents and metadata live in SQLite next to
+the vectors.
+
+QuantizedCollection implements the part of Chroma's Collection API that
+KnowledgeBaseManager uses, so it can stand in for a Chroma collection.
+
+SQLite is the record of which rows exist. Vectors reach the disk before
+SQLite refers to them and deletes are committed to SQLite first, so a crash
+can only leave the vector files with extra rows; they are cleared on the
+next open.
+"""
+from typing import Dict, List, Optional, Sequence
+import json
+import logging
+import os
+import sqlite3
+import threading
+import numpy as np
+
+logger = logging.getLogger("lovebot.index")
+
+# Array name -> (file name, dtype, one value per dimension)
+ARRAY_FILES = {
+    "vectors": ("vectors.f32", np.float32, True),
+    "codes": ("codes.i8", np.int8, True),
+    "scales": ("scales.f32", np.float32, False),
+    "norms": ("norms.f32", np.float32, False),
+    "lists": ("lists.i32", np.int32, False),
+    "live": ("live.u1", np.uint8, False),
+}
+
+
+class _GrowableArray:
+    """Memory-mapped array of rows that doubles its file when it runs out of room"""
+
+    def __init__(self, path: str, dtype, width: int, capacity: int):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.width = width
+        self.data = None
+        self._open(capacity)
+
+    def _open(self, capacity: int):
+        nbytes = capacity * self.width * self.dtype.itemsize
+        with open(self.path, "ab"):
+            pass
+        if os.path.getsize(self.path) != nbytes:
+            with open(self.path, "r+b") as f:
+                f.truncate(nbytes)
+        shape = (capacity, self.width) if self.width > 1 else (capacity,)
+        self.data = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=shape)
+        self.capacity = capacity
+
+    def ensure(self, length: int):
+        if length > self.capacity:
+            self.resize(max(length, self.capacity * 2))
+
+    def resize(self, capacity: int):
+        self.data.flush()
+        self.data = None
+        self._open(capacity)
+
+    def flush(self):
+        self.data.flush()
+
+
+def _where_sql(where: Dict):
+    """Translate a Chroma where filter into a SQL condition on the JSON metadata column"""
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(clause) for clause in value]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+        op, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+        field = "json_extract(metadata, ?)"
+        path = f'$."{key}"'
+        if op == "$eq":
+            clauses.append(f"{field} = ?")
+            params += [path, operand]
+        elif op == "$ne":
+            # Like Chroma, chunks without the field match $ne
+            clauses.append(f"({field} IS NULL OR {field} != ?)")
+            params += [path, path, operand]
+        elif op in ("$in", "$nin"):
+            placeholders = ", ".join("?" * len(operand))
+            if op == "$in":
+                clauses.append(f"{field} IN ({placeholders})")
+                params += [path, *operand]
+            else:
+                clauses.append(f"({field} IS NULL OR {field} NOT IN ({placeholders}))")
+                params += [path, path, *operand]
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            symbol = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}[op]
+            clauses.append(f"{field} {symbol} ?")
+            params += [path, operand]
+        else:
+            raise ValueError(f"Unsupported where operator: {op}")
+    return " AND ".join(clauses) or "1", params
+
+
+class QuantizedCollection:
+    """
+    Chroma-compatible collection backed by int8 codes, exact re-ranking and IVF
+    Args:
+        path: Directory for the index files
+        embedding_function: Embeds documents passed to add() without embeddings
+        nprobe: Inverted lists scanned per query once the IVF is trained
+        rerank: Candidates re-ranked exactly per query, as a multiple of n_results
+        train_threshold: Vectors needed before the IVF is trained; until then
+            every int8 code is scanned
+        n_lists: Inverted lists (None = about the square root of the size at training)
+    """
+    name = "relationship_knowledge"
+
+    def __init__(self, path: str, embedding_function=None, nprobe: int = 16, rerank: int = 8,
+                 train_threshold: int = 20000, n_lists: Optional[int] = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.train_threshold = train_threshold
+        self.fixed_n_lists = n_lists
+        self.metadata = {"hnsw:space": "l2"}
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, document TEXT, metadata TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value)")
+        self._version = 0
+        # Bumped whenever a vacuum renumbers the rows
+        self._layout = 0
+        self._training = False
+        self._mask_cache = {}
+        meta_path = os.path.join(path, "meta.json")
+        self._meta = {"dim": None, "count": 0, "trained_count": 0}
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self._meta = json.load(f)
+        self._arrays = None
+        self.centroids = None
+        self._lists: List[np.ndarray] = []
+        if self._meta["dim"] is not None:
+            self._open_arrays(self._meta["dim"], max(self._meta["count"], 1024))
+            centroids_path = os.path.join(path, "centroids.npy")
+            if self._meta["trained_count"] and os.path.exists(centroids_path):
+                self.centroids = np.load(centroids_path)
+        self._recover()
+        if self.centroids is not None:
+            self._rebuild_lists()
+
+    # --- storage -----------------------------------------------------------
+
+    def _open_arrays(self, dim: int, capacity: int):
+        self._arrays = {
+            name: _GrowableArray(os.path.join(self.path, filename), dtype, dim if per_dimension else 1, capacity)
+            for name, (filename, dtype, per_dimension) in ARRAY_FILES.items()
+        }
+
+    def _array(self, name: str) -> np.ndarray:
+        return self._arrays[name].data
+
+    def _save_meta(self):
+        for array in self._arrays.values():
+            array.flush()
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    def _recover(self):
+        """Finish an interrupted vacuum, then clear rows that SQLite doesn't know about"""
+        pending = self._conn.execute("SELECT value FROM state WHERE key = 'vacuum_count'").fetchone()
+        if pending is not None:
+            logger.warning("Finishing an interrupted vacuum of %s", self.path)
+            self._finish_vacuum(pending[0])
+        else:
+            # A vacuum that stopped before its commit leaves the old files in place
+            for filename, _, _ in ARRAY_FILES.values():
+                leftover = os.path.join(self.path, filename + ".vacuum")
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+        count = self._meta["count"]
+        stored, last = self._conn.execute("SELECT COUNT(*), MAX(row) FROM chunks").fetchone()
+        if last is not None and last >= count:
+            # Rows committed before their vectors were saved (only stores
+            # written by older versions, which committed first)
+            removed = self._conn.execute("DELETE FROM chunks WHERE row >= ?", (count,)).rowcount
+            self._conn.commit()
+            logger.warning("Removed %d chunks without vectors from %s", removed, self.path)
+            stored -= removed
+        if self._arrays is None:
+            return
+        live = self._array("live")
+        if int(live[:count].sum()) == stored:
+            return
+        # Vectors added or deleted without a matching commit
+        logger.warning("Reconciling %s: %d live vectors, %d stored chunks", self.path,
+                       int(live[:count].sum()), stored)
+        live[:count] = 0
+        live[np.fromiter((row for (row,) in self._conn.execute("SELECT row FROM chunks")), dtype=np.int64)] = 1
+        self._save_meta()
+
+    @staticmethod
+    def _quantize(vectors: np.ndarray):
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    # --- IVF -----------------------------------------------------------------
+
+    def _nearest_centroids(self, vectors: np.ndarray, centroids: Optional[np.ndarray] = None,
+                           batch: int = 16384) -> np.ndarray:
+        centroids = self.centroids if centroids is None else centroids
+        centroid_norms = (centroids ** 2).sum(axis=1)
+        out = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch):
+            block = np.asarray(vectors[start:start + batch], dtype=np.float32)
+            out[start:start + len(block)] = np.argmin(centroid_norms - 2 * block @ centroids.T, axis=1)
+        return out
+
+    def _kmeans(self, sample: np.ndarray, n_lists: int, iterations: int, rng) -> np.ndarray:
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._nearest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            sizes = np.bincount(assignment, minlength=n_lists)
+            filled = sizes > 0
+            centroids[filled] = sums[filled] / sizes[filled, None]
+        return centroids
+
+    def _train(self, iterations: int = 8, sample_size: int = 50000):
+        """
+        k-means on a sample of the stored vectors, then assign every vector to
+        a list. The sample is copied under the lock, but clustering and
+        assignment run without it, so adds and queries carry on (with the old
+        lists, or a full scan) until the new centroids are swapped in.
+        """
+        with self._lock:
+            if self._training:
+                return
+            count = self._meta["count"]
+            live_rows = np.flatnonzero(self._array("live")[:count])
+            if not len(live_rows):
+                return
+            n_lists = self.fixed_n_lists or int(np.clip(np.sqrt(len(live_rows)), 16, 4096))
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(live_rows, min(len(live_rows), max(sample_size, n_lists)),
+                                             replace=False))
+            sample = np.asarray(self._array("vectors")[sample_rows], dtype=np.float32)
+            # Rows below count are never rewritten, only renumbered by a vacuum
+            vectors = self._array("vectors")
+            layout = self._layout
+            self._training = True
+        try:
+            centroids = self._kmeans(sample, min(n_lists, len(sample)), iterations, rng)
+            assignment = np.empty(count, dtype=np.int32)
+            for start in range(0, count, 65536):
+                end = min(count, start + 65536)
+                assignment[start:end] = self._nearest_centroids(vectors[start:end], centroids)
+            with self._lock:
+                if self._layout != layout:
+                    # A vacuum renumbered the rows; the next add trains again
+                    return
+                end = self._meta["count"]
+                lists = self._array("lists")
+                lists[:count] = assignment
+                # Rows added while training
+                lists[count:end] = self._nearest_centroids(self._array("vectors")[count:end], centroids)
+                np.save(os.path.join(self.path, "centroids.npy"), centroids)
+                self.centroids = centroids
+                self._meta["trained_count"] = end
+                self._rebuild_lists()
+                self._save_meta()
+        finally:
+            self._training = False
+
+    def _rebuild_lists(self):
+        count = self._meta["count"]
+        lists = np.asarray(self._array("lists")[:count])
+        order = np.argsort(lists, kind="stable")
+        bounds = np.searchsorted(lists[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(len(self.centroids))]
+
+    # --- Chroma Collection API ----------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, ids: List[str], documents: Optional[List[str]] = None,
+            metadatas: Optional[List[Dict]] = None, embeddings: Optional[Sequence] = None):
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [None] * len(ids)
+        with self._lock:
+            seen = set(self.get(ids=list(ids), include=[])["ids"])
+            keep = []
+            for i, chunk_id in enumerate(ids):
+                # Later repeats of an ID in the same batch are ignored, as Chroma does
+                if chunk_id not in seen:
+                    seen.add(chunk_id)
+                    keep.append(i)
+            if not keep:
+                return
+            vectors = vectors[keep]
+            if self._arrays is None:
+                self._meta["dim"] = vectors.shape[1]
+                self._open_arrays(vectors.shape[1], 1024)
+            start = self._meta["count"]
+            end = start + len(keep)
+            for array in self._arrays.values():
+                array.ensure(end)
+            codes, scales = self._quantize(vectors)
+            self._array("vectors")[start:end] = vectors
+            self._array("codes")[start:end] = codes
+            self._array("scales")[start:end] = scales
+            self._array("norms")[start:end] = (vectors ** 2).sum(axis=1)
+            self._array("live")[start:end] = 1
+            if self.centroids is not None:
+                assignment = self._nearest_centroids(vectors)
+                self._array("lists")[start:end] = assignment
+                rows = np.arange(start, end)
+                for list_id in np.unique(assignment):
+                    self._lists[list_id] = np.concatenate([self._lists[list_id], rows[assignment == list_id]])
+            else:
+                self._array("lists")[start:end] = -1
+            self._meta["count"] = end
+            # Train once there is enough data, and retrain whenever the index has grown 4x
+            trained = self._meta["trained_count"]
+            train = (not trained and end >= self.train_threshold) or (trained and end >= 4 * trained)
+            # The vectors are on disk before SQLite refers to them
+            self._save_meta()
+            try:
+                self._conn.executemany(
+                    "INSERT INTO chunks (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [(start + n, ids[i], documents[i], json.dumps(metadatas[i]) if metadatas[i] else None)
+                     for n, i in enumerate(keep)]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                self._array("live")[start:end] = 0
+                self._save_meta()
+                raise
+            finally:
+                self._version += 1
+        if train:
+            self._train()
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict:
+        with self._lock:
+            if ids is not None:
+                rows = []
+                unique = list(dict.fromkeys(ids))
+                for start in range(0, len(unique), 500):
+                    batch = unique[start:start + 500]
+                    rows += self._conn.execute(
+                        f"SELECT row, id, document, metadata FROM chunks WHERE id IN ({', '.join('?' * len(batch))}) "
+                        "ORDER BY row", batch
+                    ).fetchall()
+            else:
+                sql, params = _where_sql(where) if where else ("1", [])
+                query = f"SELECT row, id, document, metadata FROM chunks WHERE {sql} ORDER BY row"
+                if limit is not None or offset:
+                    query += " LIMIT ? OFFSET ?"
+                    params = params + [-1 if limit is None else limit, offset or 0]
+                rows = self._conn.execute(query, params).fetchall()
+            return self._format(rows, include)
+
+    def _format(self, rows, include) -> Dict:
+        result = {"ids": [chunk_id for _, chunk_id, _, _ in rows]}
+        if "documents" in include:
+            result["documents"] = [document for _, _, document, _ in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(metadata) if metadata else None for _, _, _, metadata in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [np.array(self._array("vectors")[row]) for row, _, _, _ in rows]
+        return result
+
+    def query(self, query_embeddings: Optional[Sequence] = None, query_texts: Optional[List[str]] = None,
+              n_results: int = 10, where: Optional[Dict] = None,
+              include: Sequence[str] = ("documents", "metadatas", "distances")) -> Dict:
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            allowed = self._allowed_rows(where) if where else None
+            for query in np.asarray(query_embeddings, dtype=np.float32):
+                rows, distances = self._search(query, n_results, allowed)
+                found = {row: (row, chunk_id, document, metadata) for row, chunk_id, document, metadata in
+                         self._conn.execute(
+                             f"SELECT row, id, document, metadata FROM chunks WHERE row IN ({', '.join('?' * len(rows))})",
+                             [int(row) for row in rows]
+                         )} if len(rows) else {}
+                formatted = self._format([found[row] for row in rows if row in found], include)
+                result["ids"].append(formatted["ids"])
+                result["documents"].append(formatted.get("documents", []))
+                result["metadatas"].append(formatted.get("metadatas", []))
+                result["distances"].append([float(d) for row, d in zip(rows, distances) if row in found])
+        return result
+
+    def update(self, ids: List[str], metadatas: Optional[List[Dict]] = None,
+               documents: Optional[List[str]] = None, embeddings: Optional[Sequence] = None):
+        """Merge metadata into existing chunks (a None value removes the key)"""
+        if documents is not None or embeddings is not None:
+            raise ValueError("QuantizedCollection only supports metadata updates; delete and re-add instead")
+        if metadatas is None:
+            return
+        with self._lock:
+            current = self.get(ids=ids, include=["metadatas"])
+            stored = dict(zip(current["ids"], current["metadatas"]))
+            updates = []
+            for chunk_id, changes in zip(ids, metadatas):
+                if chunk_id not in stored:
+                    continue
+                merged = dict(stored[chunk_id] or {})
+                for key, value in (changes or {}).items():
+                    if value is None:
+                        merged.pop(key, None)
+                    else:
+                        merged[key] = value
+                updates.append((json.dumps(merged), chunk_id))
+            self._conn.executemany("UPDATE chunks SET metadata = ? WHERE id = ?", updates)
+            self._conn.commit()
+            self._version += 1
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None):
+        with self._lock:
+            rows = [row for row in self._matching_rows(ids, where)]
+            if not rows:
+                return
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                self._conn.execute(f"DELETE FROM chunks WHERE row IN ({', '.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            # SQLite first: a crash before this is saved leaves live rows that _recover clears
+            self._array("live")[rows] = 0
+            self._version += 1
+            self._save_meta()
+
+    def _matching_rows(self, ids, where) -> List[int]:
+        if ids is not None:
+            rows = []
+            unique = list(dict.fromkeys(ids))
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows += [row for (row,) in self._conn.execute(
+                    f"SELECT row FROM chunks WHERE id IN ({', '.join('?' * len(batch))})", batch
+                )]
+            return rows
+        sql, params = _where_sql(where or {})
+        return [row for (row,) in self._conn.execute(f"SELECT row FROM chunks WHERE {sql}", params)]
+
+    # --- search ----------------------------------------------------------------
+
+    def _allowed_rows(self, where: Dict) -> np.ndarray:
+        """Rows matching a where filter, cached until the next write"""
+        key = (json.dumps(where, sort_keys=True), self._version)
+        rows = self._mask_cache.get(key)
+        if rows is None:
+            sql, params = _where_sql(where)
+            rows = np.fromiter((row for (row,) in self._conn.execute(
+                f"SELECT row FROM chunks WHERE {sql}", params
+            )), dtype=np.int64)
+            self._mask_cache = {key: rows}
+        return rows
+
+    def _search(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray]):
+        """(rows, squared L2 distances) of the k nearest live vectors"""
+        count = self._meta["count"]
+        if not count or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if allowed is not None and len(allowed) <= max(50000, k * self.rerank):
+            # Selective filters (one uploaded file, say) are cheaper to scan exhaustively
+            rows = allowed
+        elif self.centroids is not None:
+            centroid_distances = (self.centroids ** 2).sum(axis=1) - 2 * self.centroids @ query
+            probe = np.argsort(centroid_distances)[:self.nprobe]
+            rows = np.concatenate([self._lists[list_id] for list_id in probe])
+            if allowed is not None:
+                rows = rows[np.isin(rows, allowed, assume_unique=True)]
+                if len(rows) < k:
+                    rows = allowed
+        else:
+            rows = np.arange(count) if allowed is None else allowed
+        rows = rows[self._array("live")[rows] == 1]
+        if not len(rows):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        # Approximate distances from the int8 codes...
+        approx = (self._array("norms")[rows] - 2 * (self._array("codes")[rows].astype(np.float32) @ query)
+                  * self._array("scales")[rows])
+        candidates = min(len(rows), k * self.rerank)
+        if candidates < len(rows):
+            rows = rows[np.argpartition(approx, candidates - 1)[:candidates]]
+        # ...then exact ones for the shortlist, read from the float32 file
+        rows = np.sort(rows)
+        exact = ((np.asarray(self._array("vectors")[rows]) - query) ** 2).sum(axis=1)
+        order = np.argsort(exact)[:k]
+        return rows[order], exact[order]
+
+    # --- maintenance -----------------------------------------------------------
+
+    def vacuum(self) -> bool:
+        """
+        Drop deleted vectors from the files and renumber the rest. The live rows
+        are copied to new files, and committing the renumbered rows to SQLite
+        switches over to them; a vacuum interrupted after that commit is
+        finished on the next open.
+        """
+        with self._lock:
+            count = self._meta["count"]
+            if self._arrays is None:
+                return True
+            live_rows = np.flatnonzero(self._array("live")[:count])
+            n = len(live_rows)
+            if n < count:
+                for array in self._arrays.values():
+                    compacted = _GrowableArray(array.path + ".vacuum", array.dtype, array.width, max(n, 1024))
+                    for start in range(0, n, 65536):
+                        block = live_rows[start:start + 65536]
+                        compacted.data[start:start + len(block)] = array.data[block]
+                    compacted.flush()
+                self._conn.execute("UPDATE chunks SET row = -row - 1")
+                self._conn.executemany(
+                    "UPDATE chunks SET row = ? WHERE row = ?",
+                    [(new, -int(old) - 1) for new, old in enumerate(live_rows)]
+                )
+                self._conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('vacuum_count', ?)", (n,))
+                self._conn.commit()
+                self._finish_vacuum(n)
+                if self.centroids is not None:
+                    self._rebuild_lists()
+            self._conn.execute("VACUUM")
+            return True
+
+    def _finish_vacuum(self, count: int):
+        """Swap in the compacted files once their renumbering is committed"""
+        self._arrays = None
+        for filename, _, _ in ARRAY_FILES.values():
+            compacted = os.path.join(self.path, filename + ".vacuum")
+            if os.path.exists(compacted):
+                os.replace(compacted, os.path.join(self.path, filename))
+        self._meta["count"] = count
+        self._open_arrays(self._meta["dim"], max(count, 1024))
+        self._version += 1
+        self._layout += 1
+        self._save_meta()
+        self._conn.execute("DELETE FROM state WHERE key = 'vacuum_count'")
+        self._conn.commit()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            count = self._meta["count"]
+            return {
+                "vectors": count,
+                "live": self.count(),
+                "dim": self._meta["dim"],
+                "lists": 0 if self.centroids is None else len(self.centroids),
+                "trained_at": self._meta["trained_count"],
+                "bytes": sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+            }
@@ -0,0 +1,213 @@
+"""
+Web search shared by every session. Results are cached on disk by
+normalized query, identical searches already in flight share one upstream
+request (single-flight), and upstream requests go through a process-wide
+rate limiter so a burst of sessions can't get the app throttled.
+"""
+from typing import Callable, Dict, List, Optional
+import json
+import os
+import sqlite3
+import threading
+import time
+from utils.llm_client import TokenBucket
+from utils.metrics import REGISTRY
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+# Shared by every KnowledgeBaseManager in the process
+DEFAULT_SEARCH_LIMITER = TokenBucket(
+    rate=float(os.environ.get("LOVEBOT_WEB_SEARCH_RPS", "1")),
+    burst=int(os.environ.get("LOVEBOT_WEB_SEARCH_BURST", "3"))
+)
+
+
+class WebSearchError(Exception):
+    pass
+
+
+class SearchCache:
+    """
+    SQLite store of search results keyed by (normalized query, max_results).
+    Entries expire after ttl seconds; past max_entries the oldest are evicted.
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = 86400, max_entries: int = 10000):
+        """
+        Args:
+            path: SQLite file
+            ttl: Seconds results stay valid (None = no expiry)
+            max_entries: Cap on stored searches
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            "query TEXT NOT NULL, max_results INTEGER NOT NULL, results TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (query, max_results))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS searches_created ON searches (created_at)")
+        self._lock = threading.Lock()
+
+    def get(self, query: str, max_results: int) -> Optional[List[Dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, created_at FROM searches WHERE query = ? AND max_results = ?",
+                (query, max_results)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and time.time() - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM searches WHERE query = ? AND max_results = ?", (query, max_results))
+                self._conn.commit()
+                return None
+        return json.loads(row[0])
+
+    def set(self, query: str, max_results: int, results: List[Dict]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (query, max_results, results, created_at) VALUES (?, ?, ?, ?)",
+                (query, max_results, json.dumps(results), time.time())
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+            if count > self.max_entries and self.ttl is not None:
+                # Expired entries go first
+                count -= self._conn.execute(
+                    "DELETE FROM searches WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM searches WHERE rowid IN "
+                    "(SELECT rowid FROM searches ORDER BY created_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM searches")
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM searches").fetchone()[0]
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class WebSearcher:
+    """
+    Cache, single-flight and rate limiting in front of a search function
+    Args:
+        search: Upstream search, called as search(query, max_results)
+        cache: Results cache (None = every search goes upstream)
+        limiter: Rate limit on upstream searches (defaults to the process-wide one)
+        acquire_timeout: Seconds to wait for the rate limiter before giving up
+    """
+
+    def __init__(self, search: Callable[[str, int], List[Dict]], cache: Optional[SearchCache] = None,
+                 limiter: Optional[TokenBucket] = None, acquire_timeout: float = 30.0):
+        self._search = search
+        self.cache = cache
+        self.limiter = limiter or DEFAULT_SEARCH_LIMITER
+        self.acquire_timeout = acquire_timeout
+        self._inflight: Dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.limiter_wait = 0.0
+
+    def search(self, query: str, max_results: int = 3) -> List[Dict]:
+        """Results for query, raising WebSearchError (or the upstream error) on failure"""
+        key = (normalize_query(query), max_results)
+        if self.cache is not None:
+            cached = self.cache.get(*key)
+            if cached is not None:
+                self._count("hits", "web_search_cache_hit")
+                return cached
+        self._count("misses", "web_search_cache_miss")
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            REGISTRY.increment("web_search_coalesced")
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return [dict(result) for result in flight.results]
+
+        try:
+            # A flight that finished between our cache miss and taking the
+            # lead has already stored its results
+            cached = self.cache.get(*key) if self.cache is not None else None
+            if cached is not None:
+                flight.results = cached
+            else:
+                flight.results = self._fetch(*key)
+                if self.cache is not None:
+                    self.cache.set(*key, flight.results)
+            return [dict(result) for result in flight.results]
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.done.set()
+
+    def _fetch(self, query: str, max_results: int) -> List[Dict]:
+        start = time.perf_counter()
+        acquired = self.limiter.acquire(timeout=self.acquire_timeout)
+        with self._lock:
+            self.limiter_wait += time.perf_counter() - start
+        if not acquired:
+            self._count("rate_limited", "web_search_rate_limited")
+            raise WebSearchError("Web search rate limit exceeded")
+        self._count("upstream", "web_search_upstream")
+        try:
+            return list(self._search(query, max_results))
+        except Exception:
+            self._count("errors", "web_search_error")
+            raise
+
+    def _count(self, attribute: str, event: str):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + 1)
+        REGISTRY.increment(event)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "coalesced": self.coalesced,
+                "upstream": self.upstream,
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "limiter_wait": self.limiter_wait
+            }
+        stats["entries"] = self.cache.count() if self.cache is not None else 0
+        return stats